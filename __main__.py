@@ -1,11 +1,20 @@
-from logger_default import Logger
+import sys
 from multiprocessing import freeze_support
-from src.resources.gui_texts import app
-from src.view.window import Window
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))  # Allow "python -m cut_videos" from the parent directory
 
 if __name__ == "__main__":
+    freeze_support()
+    if len(sys.argv) > 1:
+        from src.cli import main
+        sys.exit(main())
+
+    from logger_default import Logger
+    from src.view.style import app
+    from src.view.window import Window
+
     with Logger(debug=True):
-        freeze_support()
         frame = Window()
         frame.Show()
         app.MainLoop()
@@ -0,0 +1,529 @@
+import json
+import logging
+from argparse import ArgumentParser, ArgumentTypeError
+from dataclasses import asdict
+from datetime import datetime
+from glob import glob
+from os import cpu_count, getenv
+from socket import gethostname
+from pathlib import Path
+from sys import stdout
+from time import sleep
+from threading import Lock, BoundedSemaphore, Thread, Event
+
+from src.model.capabilities import get_capabilities, check_job, suggestions, select_encoders, encoder_names
+from src.model.file_index import FileIndex
+from src.model.frame_export import sampling_arguments
+from src.model.governor import policies, batch_class
+from src.model.job_store import JobStore, cli_owner, watch_owner, pending_state, running_state, done_state, failed_state
+from src.model.scenes import scene_threshold
+from src.model.scheduler import get_scheduler
+from src.model.task import Task
+from src.model.telemetry import configure_telemetry
+from src.model.time_format import normalize_time, parse_range, zero_time
+from src.model.watch_folder import FolderWatcher, load_preset
+from src.resources.commands import video_options, audio_options, image_types, encoder_tiers, frame_formats
+from src.resources.gui_texts import webm_text, original_audio, balanced_text
+from src.resources.paths import ffprobe_path
+
+_output_lock = Lock()
+
+
+def _write(line: str):
+    with _output_lock:
+        stdout.write(line + '\n')
+        stdout.flush()
+
+
+class TextProgress:
+    """
+    Print progress of a task as text lines, one line per percent
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._percent = None
+
+    def set_progress(self, progress):
+        percent = int(progress.fraction * 100)
+        if percent != self._percent:
+            self._percent = percent
+            _write(f'{self.name}: {progress.summary()}')
+
+    def finish(self, error):
+        _write(f'{self.name}: {"FAILED " + str(error) if error else "done"}')
+
+
+class JsonProgress(TextProgress):
+    """
+    Print progress of a task as json lines, at most about 10 per second
+    """
+
+    def set_progress(self, progress):
+        _write(json.dumps({'event': 'progress', 'task': self.name, **progress.to_dict()}))
+
+    def finish(self, error):
+        _write(json.dumps({'event': 'failed' if error else 'done', 'task': self.name,
+                           'error': str(error) if error else None}))
+
+
+progress_types = {'text': TextProgress, 'json': JsonProgress}
+
+
+def time_argument(value: str) -> str:
+    try:
+        return normalize_time(value)
+    except ValueError as e:
+        raise ArgumentTypeError(str(e))
+
+
+def range_argument(value: str) -> tuple:
+    try:
+        return parse_range(value)
+    except ValueError as e:
+        raise ArgumentTypeError(str(e))
+
+
+def sampling_argument(value: str) -> str:
+    try:
+        sampling_arguments(value)
+    except ValueError as e:
+        raise ArgumentTypeError(str(e))
+    return value
+
+
+def expand_inputs(inputs: list) -> list:
+    """
+    Expand globs, the windows shell does not do it
+    :param inputs: Files or glob patterns
+    :return: Existing files
+    """
+    files = []
+    for pattern in inputs:
+        matches = sorted(glob(pattern, recursive=True)) or [pattern]
+        files += [Path(match) for match in matches if Path(match).is_file()]
+    return files
+
+
+def group_inputs(files: list) -> list:
+    """
+    Make one group per video, and one group of all images per directory (image sequence)
+    :param files: Input files
+    :return: List of (directory, file names)
+    """
+    groups = []
+    frames = {}
+    for file in files:
+        if file.suffix in image_types:
+            frames.setdefault(file.parent, []).append(file.name)
+        else:
+            groups.append((file.parent, [file.name]))
+    return groups + list(frames.items())
+
+
+def add_cut_options(parser: ArgumentParser):
+    """
+    Options of cut jobs, shared by cut and watch
+    """
+    parser.add_argument('-s', '--start', type=time_argument, default=zero_time, help='Start [[HH:]MM:]SS[.fff]')
+    parser.add_argument('-e', '--end', type=time_argument, default=zero_time, help='End, cut to the end by default')
+    parser.add_argument('-r', '--range', type=range_argument, action='append', dest='ranges',
+                        help='START-END, repeat to cut several ranges from one decode, replaces --start and --end')
+    parser.add_argument('--scenes', type=float, nargs='?', const=scene_threshold, default=0, dest='scene_threshold',
+                        metavar='THRESHOLD', help=f'Split into clips at scene changes, threshold {scene_threshold} '
+                                                  f'by default, lower finds more scenes')
+    parser.add_argument('--min-clip', type=float, default=0, help='Seconds, shorter scenes are joined')
+    parser.add_argument('--max-clip', type=float, default=0, help='Seconds, longer scenes are split')
+    parser.add_argument('--video', choices=list(video_options), default=[webm_text], nargs='+',
+                        help='Output formats, written from one decode')
+    parser.add_argument('--audio', choices=list(audio_options), default=original_audio, help='Audio codec')
+    parser.add_argument('--crf', default='36', help='webm quality')
+    parser.add_argument('--width', default='', help='Output width')
+    parser.add_argument('--height', default='', help='Output height')
+    parser.add_argument('--framerate', default='', help='Input frame rate of image sequences')
+    parser.add_argument('--hardsub', action='store_true', help='Burn in subtitles')
+    parser.add_argument('--segments', type=int, default=0,
+                        help='Encode each file in this many parallel segments (webm, mp4). By default ranges '
+                             'longer than 5 minutes are encoded in segments that a stopped job continues from, '
+                             '1 turns segments off')
+    parser.add_argument('--frame-sampling', type=sampling_argument, default='',
+                        help='Frames format: keyframes, N for every Nth frame or Xfps, all frames by default')
+    parser.add_argument('--frame-format', choices=list(frame_formats), default='png', help='Frames format image type')
+    parser.add_argument('--tier', choices=list(encoder_tiers), default=balanced_text,
+                        help='Encoder speed/quality, threads are chosen from the resolution')
+    parser.add_argument('-j', '--jobs', type=int, default=0, help='Files encoded at once, core count by default')
+    parser.add_argument('--priority', type=int, default=0, help='Higher priorities start first')
+    parser.add_argument('--job-class', choices=list(policies), default=batch_class,
+                        help='Resource policy, batch jobs run with lower cpu and io priority on pinned cores')
+
+
+def create_parser() -> ArgumentParser:
+    parser = ArgumentParser(prog='cut_videos', description='Cut and encode videos without the GUI')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Log ffmpeg commands')
+    parser.add_argument('--metrics-file', help='Prometheus textfile, updated after each job')
+    parser.add_argument('--profile', metavar='DIRECTORY', help='Write a cProfile file per job stage')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    cut = commands.add_parser('cut', help='Cut and encode files')
+    cut.add_argument('inputs', nargs='+', help='Input files or glob patterns')
+    add_cut_options(cut)
+    cut.add_argument('--progress', choices=list(progress_types), default='text', help='Progress output')
+    cut.set_defaults(function=cut_command)
+
+    watch = commands.add_parser('watch', help='Convert files that are added to folders until stopped')
+    watch.add_argument('folders', nargs='+', help='Watched folders, a cut_videos.json in a folder overrides options')
+    watch.add_argument('--interval', type=float, default=2.0, help='Seconds between checks')
+    watch.add_argument('--settle', type=float, default=5.0,
+                       help='Seconds a file has to stay unchanged before it is converted')
+    watch.add_argument('--existing', action='store_true', help='Also convert the files that are already there')
+    watch.add_argument('--queue', type=int, default=0, help='Files converted or waiting at once, core count by default')
+    add_cut_options(watch)
+    watch.add_argument('--progress', choices=list(progress_types), default='text', help='Progress output')
+    watch.set_defaults(function=watch_command)
+
+    serve = commands.add_parser('serve', help='Hand out cut jobs to workers on other machines')
+    serve.add_argument('inputs', nargs='*', help='Input files or glob patterns, workers need the same paths')
+    serve.add_argument('--host', default='127.0.0.1', help='Listening address, 0.0.0.0 for workers on other machines')
+    serve.add_argument('--token', help='Shared secret of the server and its workers, CUT_VIDEOS_TOKEN by default, '
+                                       'a random token is printed if neither is set')
+    serve.add_argument('--port', type=int, default=8765, help='Listening port')
+    serve.add_argument('--lease', type=float, default=60,
+                       help='Seconds until the job of a worker that stopped reporting is handed out again')
+    serve.add_argument('--until-done', action='store_true', help='Exit when all jobs are finished')
+    serve.add_argument('--progress', choices=list(progress_types), default='text', help='Progress output')
+    add_cut_options(serve)
+    serve.set_defaults(function=serve_command)
+
+    work = commands.add_parser('work', help='Run cut jobs of a job server until stopped')
+    work.add_argument('server', help='Job server url like http://host:8765')
+    work.add_argument('--name', default=gethostname(), help='Worker name shown by the server')
+    work.add_argument('--token', help='Token of the server, CUT_VIDEOS_TOKEN by default')
+    work.add_argument('--slots', type=int, default=1, help='Jobs run at once')
+    work.add_argument('--progress', choices=list(progress_types), default='text', help='Progress output')
+    work.set_defaults(function=work_command)
+
+    resume = commands.add_parser('resume', help='Continue cut jobs that were interrupted')
+    resume.add_argument('--progress', choices=list(progress_types), default='text', help='Progress output')
+    resume.set_defaults(function=resume_command)
+
+    history = commands.add_parser('history', help='List recorded jobs')
+    history.add_argument('--state', choices=[pending_state, running_state, done_state, failed_state])
+    history.add_argument('--limit', type=int, default=50)
+    history.add_argument('--json', action='store_true', help='Print json lines')
+    history.set_defaults(function=history_command)
+
+    index = commands.add_parser('index', help='Update the file name index used to find the original of a cut')
+    index.add_argument('roots', nargs='+', help='Search directories')
+    index.add_argument('--rebuild', action='store_true', help='List all directories again')
+    index.add_argument('--find', help='Print indexed files ending with this text')
+    index.set_defaults(function=index_command)
+
+    capabilities = commands.add_parser('capabilities', help='Show the ffmpeg build and the encoder of each format')
+    capabilities.add_argument('--tier', choices=list(encoder_tiers), default=balanced_text, help='Encoder speed')
+    capabilities.add_argument('--json', action='store_true', help='Print json')
+    capabilities.set_defaults(function=capabilities_command)
+    return parser
+
+
+def cut_command(args) -> int:
+    """
+    Run one task per input group and wait for all of them
+    :return: Exit code
+    """
+    groups = group_inputs(expand_inputs(args.inputs))
+    if not groups:
+        logging.error('No input files found')
+        return 2
+    if not check_options(args):
+        return 2
+    if args.jobs > 0:
+        get_scheduler().set_item_limit(args.jobs)
+
+    store = JobStore()
+    jobs = []
+    for path, files in groups:
+        parameters = dict(cut_parameters(args), path=str(path), files=files)
+        jobs.append((parameters, store.add(parameters, cli_owner)))
+    return run_jobs(store, jobs, args.progress)
+
+
+def cut_parameters(args) -> dict:
+    """
+    :return: Task arguments of the cut options without path and files
+    """
+    return dict(input_framerate=args.framerate, start_time=args.start, end_time=args.end, hardsub=args.hardsub,
+                webm_input=args.crf, scale_input=f'{args.width or -1}:{args.height or -1}',
+                audio_selection=args.audio, video_selection=args.video, priority=args.priority, show_result=False,
+                segments=args.segments, tier=args.tier, ranges=args.ranges, scene_threshold=args.scene_threshold,
+                min_clip=args.min_clip, max_clip=args.max_clip, frame_sampling=args.frame_sampling,
+                frame_format=args.frame_format, job_class=args.job_class)
+
+
+def check_options(args) -> bool:
+    """
+    Check that ffmpeg has the encoders and filters of the cut options before any job starts
+    :return: False if a job would fail
+    """
+    try:
+        capabilities = get_capabilities()
+        check_job(capabilities, tuple(args.video), args.audio, args.tier, args.frame_sampling, args.scene_threshold)
+        ffprobe_path()
+    except (ValueError, OSError) as e:
+        logging.error(e)
+        return False
+    for suggestion in suggestions(capabilities, args.tier):
+        logging.info(suggestion)
+    return True
+
+
+def watch_command(args) -> int:
+    """
+    Convert new files of the folders until interrupted. At most --queue tasks are active, the watcher waits for a
+    free slot, so a burst of files is converted in order while the scheduler keeps the cores busy.
+    :return: Exit code
+    """
+    if not check_options(args):
+        return 2
+    if args.jobs > 0:
+        get_scheduler().set_item_limit(args.jobs)
+    store = JobStore()
+    slots = BoundedSemaphore(args.queue or cpu_count() or 1)
+    tasks = set()
+    finishers = []
+
+    def finish(task, progress):
+        task.join()
+        progress.finish(task.error)
+        tasks.discard(task)
+        slots.release()
+
+    def submit(parameters: dict, job_id: int):
+        slots.acquire()
+        progress = progress_types[args.progress](str(Path(parameters['path'], parameters['files'][0])))
+        task = Task(**parameters, remove_task=lambda _: None, bar=progress, job_store=store, job_id=job_id)
+        tasks.add(task)
+        finisher = Thread(target=finish, args=(task, progress), daemon=True)
+        finisher.start()
+        finishers[:] = [thread for thread in finishers if thread.is_alive()] + [finisher]
+
+    try:
+        watcher = FolderWatcher(args.folders, args.interval, args.settle, args.existing)
+        for job in store.unfinished(watch_owner):  # Interrupted by the last run
+            submit(job.parameters, job.id)
+        for file in watcher.files():
+            try:
+                parameters = dict(cut_parameters(args), **load_preset(file.parent), path=str(file.parent),
+                                  files=[file.name])
+            except ValueError as e:  # Invalid preset json or keys
+                logging.error(e)
+                continue
+            submit(parameters, store.add(parameters, watch_owner))
+        for finisher in finishers:  # The watcher ended, the started tasks are finished
+            finisher.join()
+    except KeyboardInterrupt:
+        for task in list(tasks):
+            task.stop()
+        return 130
+    return 0
+
+
+def serve_command(args) -> int:
+    """
+    Queue the inputs and hand them out to workers, jobs of an interrupted server are queued again
+    :return: Exit code
+    """
+    from src.model.job_server import JobServer, token_variable  # Only loaded by the server and worker commands
+    bars = {}  # Job id -> progress output
+
+    def bar(job_id: int, parameters: dict):
+        if job_id not in bars:
+            bars[job_id] = progress_types[args.progress](str(Path(parameters['path'], parameters['files'][0])))
+        return bars[job_id]
+
+    def finish(job_id: int, parameters: dict, error):
+        bar(job_id, parameters).finish(error)
+        del bars[job_id]
+
+    token = args.token or getenv(token_variable)
+    server = JobServer(JobStore(), args.host, args.port, args.lease, token,
+                       on_progress=lambda job_id, parameters, progress: bar(job_id, parameters).set_progress(progress),
+                       on_finish=finish)
+    try:
+        for path, files in group_inputs(expand_inputs(args.inputs)):
+            server.add(dict(cut_parameters(args), path=str(path), files=files))
+    except ValueError as e:
+        logging.error(e)
+        server.shutdown()
+        return 2
+    server.start()
+    _write(f'Serving on http://{args.host}:{server.address[1]}')
+    if not token:
+        _write(f'Workers need --token {server.token}')
+    try:
+        while not args.until_done or server.remaining:
+            sleep(1)
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        server.shutdown()
+    return 0
+
+
+def work_command(args) -> int:
+    """
+    Lease jobs from a job server and run them, each slot runs one job at a time
+    :return: Exit code
+    """
+    from src.model.job_server import JobClient, run_worker, token_variable
+    token = args.token or getenv(token_variable)
+    if not token:
+        logging.error(f'The token of the server is required, --token or {token_variable}')
+        return 2
+    client = JobClient(args.server, token)
+    stop = Event()
+
+    def run_task(parameters: dict, progress):
+        progress.bar = progress_types[args.progress](str(Path(parameters['path'], parameters['files'][0])))
+        return Task(**parameters, remove_task=lambda _: None, bar=progress, job_store=None)
+
+    workers = [Thread(target=run_worker, args=(client, f'{args.name}-{slot}', run_task, stop))
+               for slot in range(max(1, args.slots))]
+    for worker in workers:
+        worker.start()
+    try:
+        while any(worker.is_alive() for worker in workers):
+            for worker in workers:
+                worker.join(1)
+    except KeyboardInterrupt:
+        stop.set()  # Running jobs are stopped, their leases expire on the server
+        for worker in workers:
+            worker.join()
+        return 130
+    return 0
+
+
+def resume_command(args) -> int:
+    """
+    Run the jobs of the command line that were interrupted
+    :return: Exit code
+    """
+    store = JobStore()
+    jobs = [(job.parameters, job.id) for job in store.unfinished(cli_owner)]
+    if not jobs:
+        _write('No unfinished jobs')
+        return 0
+    return run_jobs(store, jobs, args.progress)
+
+
+def run_jobs(store: JobStore, jobs: list, progress_type: str) -> int:
+    """
+    Run tasks and wait for all of them, the job store records their state. At most one task per core is active,
+    tasks probe their inputs when they start, so a large batch starts them as slots become free.
+    :param store: Job store
+    :param jobs: List of (task parameters, job id)
+    :param progress_type: Key of progress_types
+    :return: Exit code
+    """
+    slots = BoundedSemaphore(cpu_count() or 1)
+    tasks = []
+
+    def release(task):
+        task.join()
+        slots.release()
+
+    try:
+        for parameters, job_id in jobs:
+            slots.acquire()
+            progress = progress_types[progress_type](str(Path(parameters['path'], parameters['files'][0])))
+            task = Task(**parameters, remove_task=lambda _: None, bar=progress, job_store=store, job_id=job_id)
+            tasks.append((task, progress))
+            Thread(target=release, args=(task,), daemon=True).start()
+        for task, _ in tasks:
+            task.join()
+    except KeyboardInterrupt:  # Jobs that did not start stay pending and are resumed
+        for task, _ in tasks:
+            task.stop()
+        return 130
+
+    for task, progress in tasks:
+        progress.finish(task.error)
+    return 1 if any(task.error for task, _ in tasks) else 0
+
+
+def history_command(args) -> int:
+    """
+    Print recorded jobs, newest first
+    :return: Exit code
+    """
+    store = JobStore()
+    try:
+        for job in store.history(args.state, args.limit):
+            if args.json:
+                _write(json.dumps(asdict(job)))
+                continue
+            duration = '' if job.duration is None else f'{job.duration:.1f}s'
+            _write(f'{job.id:5} {job.state:8} {datetime.fromtimestamp(job.created):%Y-%m-%d %H:%M} {duration:>9} '
+                   f'{Path(job.parameters["path"], job.parameters["files"][0])} -> '
+                   f'{", ".join(job.outputs) or "-"}{"  " + job.error if job.error else ""}')
+    finally:
+        store.close()
+    return 0
+
+
+def index_command(args) -> int:
+    """
+    Refresh the file index of the roots
+    :return: Exit code
+    """
+    index = FileIndex()
+    try:
+        index.refresh(args.roots, full=args.rebuild)
+        if args.find:
+            for file in index.find(args.find, args.roots):
+                _write(str(file))
+    finally:
+        index.close()
+    return 0
+
+
+def capabilities_command(args) -> int:
+    """
+    Print the ffmpeg build, the encoder each format uses and faster encoders the build has
+    :return: Exit code
+    """
+    try:
+        capabilities = get_capabilities()
+    except OSError as e:
+        logging.error(e)
+        return 2
+    video, audio = select_encoders(capabilities, args.tier)
+
+    def encoders(options: dict) -> dict:
+        # Stream copies and formats with the default encoder of the container show "-"
+        return {selection: ', '.join(f'{name}{"" if name in capabilities.encoders else " (missing)"}'
+                                     for name in encoder_names(arguments)) or '-'
+                for selection, arguments in options.items()}
+
+    if args.json:
+        _write(json.dumps({'path': capabilities.path, 'version': capabilities.version, 'video': encoders(video),
+                           'audio': encoders(audio), 'suggestions': suggestions(capabilities, args.tier)}))
+        return 0
+    _write(f'{capabilities.path} {capabilities.version}')
+    for title, options in (('video', video), ('audio', audio)):
+        _write(f'{title}: ' + ', '.join(f'{selection} {names}' for selection, names in encoders(options).items()))
+    for suggestion in suggestions(capabilities, args.tier):
+        _write(suggestion)
+    return 0
+
+
+def main(argv: list = None) -> int:
+    """
+    Command line entry point
+    :param argv: Arguments, sys.argv by default
+    :return: Exit code
+    """
+    args = create_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s %(levelname)s %(message)s')
+    configure_telemetry(args.metrics_file, args.profile)
+    return args.function(args)
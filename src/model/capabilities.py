@@ -0,0 +1,183 @@
+from dataclasses import dataclass, asdict
+from logging import info, exception
+from re import match, search, findall
+from subprocess import check_output, DEVNULL
+from threading import Lock
+
+from src.model.frame_export import keyframes_sampling
+from src.model.probe import file_key, read_cache, write_cache
+from src.model.smart_cut import smart_encoders
+from src.resources.commands import video_options, audio_options, video_alternatives, audio_alternatives, \
+    fps_mode_version
+from src.resources.gui_texts import fast_text, frames_text, webp_text, smart_text
+from src.resources.paths import ffmpeg_path
+
+_memory_cache = {}
+_memory_lock = Lock()
+
+
+@dataclass(frozen=True)
+class Capabilities:
+    """
+    Version, encoders and filters of an ffmpeg build
+    """
+    path: str
+    version: str  # Like "6.0" or "N-111234-g1234abcd" for git builds
+    encoders: frozenset
+    filters: frozenset
+
+    @property
+    def version_tuple(self):
+        """
+        :return: (major, minor), None for git builds without a release number
+        """
+        version = match(r'n?(\d+)\.(\d+)', self.version)
+        return (int(version.group(1)), int(version.group(2))) if version else None
+
+    def to_dict(self) -> dict:
+        return dict(asdict(self), encoders=sorted(self.encoders), filters=sorted(self.filters))
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(data['path'], data['version'], frozenset(data['encoders']), frozenset(data['filters']))
+
+
+def parse_version(output: str) -> str:
+    """
+    :param output: ffmpeg -version
+    :return: Version like "6.0"
+    """
+    version = search(r'version (\S+)', output)
+    return version.group(1) if version else ''
+
+
+def parse_encoders(output: str) -> frozenset:
+    """
+    :param output: ffmpeg -encoders, the list follows a " ------" line
+    :return: Encoder names
+    """
+    _, _, encoders = output.partition(' ------')
+    return frozenset(findall(r'(?m)^ [VAS][.\w]{5} (\S+)', encoders))
+
+
+def parse_filters(output: str) -> frozenset:
+    """
+    :param output: ffmpeg -filters, filter lines have flags, a name and inputs->outputs
+    :return: Filter names
+    """
+    return frozenset(findall(r'(?m)^ [.\w]{3} (\S+) +\S+->\S+', output))
+
+
+def get_capabilities() -> Capabilities:
+    """
+    Query ffmpeg once, the result is cached by binary path, size and modification time
+    :return: Capabilities of the ffmpeg that is used
+    """
+    path = ffmpeg_path()
+    key = file_key(path)
+    with _memory_lock:
+        if key in _memory_cache:
+            return _memory_cache[key]
+    result = None
+    cached = read_cache(key + '.capabilities.json')
+    if cached is not None:
+        try:
+            result = Capabilities.from_dict(cached)
+        except (TypeError, KeyError):
+            exception(f'INVALID CAPABILITIES CACHE {key}.capabilities.json')
+    if result is None:
+        info(f'PROBE CAPABILITIES {path}')
+
+        def query(option: str) -> str:
+            return check_output((path, '-hide_banner', option), stdin=DEVNULL).decode('UTF-8', errors='replace')
+
+        result = Capabilities(path, parse_version(query('-version')), parse_encoders(query('-encoders')),
+                              parse_filters(query('-filters')))
+        write_cache(key + '.capabilities.json', result.to_dict())
+    with _memory_lock:
+        _memory_cache[key] = result
+    return result
+
+
+def encoder_names(arguments: str) -> tuple:
+    """
+    :param arguments: Encoder arguments like "-c:v libx264 ..."
+    :return: Encoders the arguments select, stream copies are not encoders
+    """
+    return tuple(name for name in findall(r'-c:[va] (\S+)', arguments) if name != 'copy')
+
+
+def _available(arguments: str, capabilities: Capabilities) -> bool:
+    return all(name in capabilities.encoders for name in encoder_names(arguments))
+
+
+def select_encoders(capabilities: Capabilities, tier: str) -> tuple:
+    """
+    Choose the encoder of each format, an equivalent encoder replaces a missing one.
+    The fast tier uses the faster alternative if ffmpeg has it, like SVT-AV1 for webm.
+    :param capabilities: ffmpeg capabilities
+    :param tier: Encoder speed/quality
+    :return: Format -> video encoder arguments, audio codec -> audio arguments
+    """
+    video = {selection: option[1] for selection, option in video_options.items()}
+    for selection, arguments in video_alternatives.items():
+        if _available(arguments, capabilities) and (tier == fast_text or not _available(video[selection],
+                                                                                          capabilities)):
+            video[selection] = arguments
+    audio = dict(audio_options)
+    for selection, arguments in audio_alternatives.items():
+        if not _available(audio[selection], capabilities) and _available(arguments, capabilities):
+            audio[selection] = arguments
+    return video, audio
+
+
+def check_job(capabilities: Capabilities, video_selections: tuple, audio_selection: str, tier: str,
+              frame_sampling: str = '', scene_threshold: float = 0, source_codecs: tuple = ()) -> tuple:
+    """
+    Check that ffmpeg can run a job before it is started
+    :param capabilities: ffmpeg capabilities
+    :param video_selections: Video formats
+    :param audio_selection: Audio codec
+    :param tier: Encoder speed/quality
+    :param frame_sampling: Frames format sampling
+    :param scene_threshold: Scene split threshold, 0 is off
+    :param source_codecs: Video codecs of the inputs, smart cut re-encodes partial GOPs with the same codec
+    :return: Encoder arguments of select_encoders
+    """
+    video, audio = select_encoders(capabilities, tier)
+    problems = []
+    encoders = [name for selection in video_selections for name in encoder_names(video[selection])]
+    encoders += encoder_names(audio[audio_selection])
+    if smart_text in video_selections:  # Other codecs are copied without re-encoding
+        encoders += [name for codec in source_codecs if codec in smart_encoders
+                     for name in encoder_names(smart_encoders[codec])]
+    filters = ['scale'] if any(video_options[selection][0] for selection in video_selections) else []
+    if len(video_selections) > 1:
+        filters.append('split')
+    if frames_text in video_selections:
+        encoders.append('ppm')  # Raw frames for FrameExport
+        if frame_sampling.strip() not in ('', keyframes_sampling):
+            filters.append('fps' if frame_sampling.strip().endswith('fps') else 'select')
+    if scene_threshold:
+        filters.append('select')
+    if (frames_text in video_selections or webp_text in video_selections or scene_threshold) and \
+            capabilities.version_tuple and capabilities.version_tuple < fps_mode_version:
+        problems.append(f'ffmpeg {".".join(map(str, fps_mode_version))} or newer is required for webp, frames and '
+                        f'scenes, {capabilities.path} is {capabilities.version}')
+    problems += [f'{capabilities.path} has no {name} encoder' for name in dict.fromkeys(encoders)
+                 if name not in capabilities.encoders]
+    problems += [f'{capabilities.path} has no {name} filter' for name in dict.fromkeys(filters)
+                 if name not in capabilities.filters]
+    if problems:
+        raise ValueError(', '.join(problems))
+    return video, audio
+
+
+def suggestions(capabilities: Capabilities, tier: str) -> list:
+    """
+    :return: Faster encoders ffmpeg has that the tier does not use
+    """
+    video, _ = select_encoders(capabilities, tier)
+    return [f'{selection}: {encoder_names(arguments)[0]} is available and faster, use the {fast_text} tier'
+            for selection, arguments in video_alternatives.items()
+            if _available(arguments, capabilities) and video[selection] != arguments]
@@ -0,0 +1,58 @@
+from dataclasses import dataclass
+
+from src.resources.commands import encoder_tiers, resolution_threads, video_threads, profile_formats
+from src.resources.gui_texts import webm_text, balanced_text
+
+
+@dataclass(frozen=True)
+class EncoderProfile:
+    threads: int  # Threads reserved in the scheduler
+    arguments: tuple = ()  # Replaces <profile> in the encoder arguments
+
+
+def scaled_size(width: int, height: int, scale: str) -> tuple:
+    """
+    Get the output size of the scale filter
+    :param width: Source width
+    :param height: Source height
+    :param scale: Scale filter argument "width:height", -1 keeps the aspect ratio
+    :return: Width, height
+    """
+    try:
+        scale_width, scale_height = (int(value) for value in scale.split(':'))
+    except ValueError:
+        return width, height  # Expressions are not evaluated
+    if scale_width > 0 and scale_height > 0:
+        return scale_width, scale_height
+    if scale_width > 0 and width:
+        return scale_width, round(height * scale_width / width)
+    if scale_height > 0 and height:
+        return round(width * scale_height / height), scale_height
+    return width, height
+
+
+def encoder_profile(selection: str, width: int, height: int, scale: str = '-1:-1', tier: str = balanced_text,
+                    budget: int = 4) -> EncoderProfile:
+    """
+    Choose encoder threads and speed for the output resolution, small outputs use fewer threads
+    :param selection: Video format
+    :param width: Source width, 0 if unknown
+    :param height: Source height, 0 if unknown
+    :param scale: Scale filter argument
+    :param tier: Speed/quality tier
+    :param budget: Threads available, the scheduler thread budget
+    :return: Profile
+    """
+    if selection not in profile_formats:
+        return EncoderProfile(video_threads[selection])
+    width, height = scaled_size(width, height, scale)
+    threads, tile_columns = next((threads, tile_columns) for max_height, threads, tile_columns in resolution_threads
+                                 if max_height is None or height <= max_height)
+    threads = max(1, min(threads, budget))
+    vp9_speed, x264_preset = encoder_tiers[tier]
+    if selection == webm_text:
+        # Tile columns are at least 256 pixels wide
+        tile_columns = min(tile_columns, max(0, (width // 256).bit_length() - 1))
+        return EncoderProfile(threads, ('-speed', vp9_speed, '-threads', str(threads),
+                                        '-tile-columns', str(tile_columns), '-row-mt', '1'))
+    return EncoderProfile(threads, ('-preset', x264_preset, '-threads', str(threads)))
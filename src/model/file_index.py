@@ -0,0 +1,140 @@
+import sqlite3
+from logging import info
+from os import scandir, stat, sep
+from pathlib import Path
+from threading import Lock
+
+from src.resources.paths import cache_dir
+
+# Upper bound for prefix range queries
+_max_char = '\U0010ffff'
+
+
+def _reverse(text: str) -> str:
+    return text[::-1]
+
+
+class FileIndex:
+    """
+    Persistent index of file names below search roots. Names are stored reversed,
+    so a suffix lookup is a range query on an index. Directories are only listed again if their mtime changed.
+    """
+
+    def __init__(self, database: Path = Path(cache_dir, 'file_index.sqlite')):
+        """
+        :param database: SQLite file
+        """
+        Path(database).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = Lock()
+        self._connection = sqlite3.connect(str(database), check_same_thread=False)
+        with self._connection:
+            self._connection.executescript('''
+                CREATE TABLE IF NOT EXISTS directories (path TEXT PRIMARY KEY, parent TEXT, mtime REAL);
+                CREATE INDEX IF NOT EXISTS directories_parent ON directories (parent);
+                CREATE TABLE IF NOT EXISTS files (directory TEXT, name TEXT, reversed TEXT);
+                CREATE INDEX IF NOT EXISTS files_reversed ON files (reversed);
+                CREATE INDEX IF NOT EXISTS files_directory ON files (directory);''')
+
+    def close(self):
+        self._connection.close()
+
+    def refresh(self, roots: list, full: bool = False):
+        """
+        Update the index of the roots, unchanged directories are not listed
+        :param roots: Directories to index recursively
+        :param full: List all directories again
+        """
+        with self._lock, self._connection:
+            scanned = 0
+            for root in roots:
+                directories = [(str(Path(root)), None)]
+                while directories:
+                    directory, parent = directories.pop()
+                    subdirectories, listed = self._scan(directory, parent, full)
+                    scanned += listed
+                    directories += [(subdirectory, directory) for subdirectory in subdirectories]
+            info(f'FILE INDEX REFRESHED {roots}, {scanned} directories listed')
+
+    def _scan(self, directory: str, parent, full: bool) -> tuple:
+        """
+        Index the files of a directory if it changed
+        :return: Subdirectories, 1 if the directory was listed else 0
+        """
+        try:
+            mtime = stat(directory).st_mtime
+        except OSError:
+            self._forget(directory)
+            return [], 0
+        known = [row[0] for row in self._connection.execute('SELECT path FROM directories WHERE parent = ?',
+                                                              (directory,))]
+        row = self._connection.execute('SELECT mtime FROM directories WHERE path = ?', (directory,)).fetchone()
+        if row and row[0] == mtime and not full:
+            return known, 0
+
+        files, subdirectories = [], []
+        try:
+            with scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirectories.append(entry.path)
+                        elif entry.is_file():
+                            files.append(entry.name)
+                    except OSError:
+                        pass  # Removed while listing
+        except OSError:
+            self._forget(directory)
+            return [], 1
+        for removed in set(known) - set(subdirectories):
+            self._forget(removed)
+        self._connection.execute('DELETE FROM files WHERE directory = ?', (directory,))
+        self._connection.executemany('INSERT INTO files VALUES (?, ?, ?)',
+                                     ((directory, name, _reverse(name)) for name in files))
+        self._connection.execute('INSERT OR REPLACE INTO directories VALUES (?, ?, ?)', (directory, parent, mtime))
+        return subdirectories, 1
+
+    def _forget(self, directory: str):
+        """
+        Remove a directory and everything below it from the index
+        """
+        below = directory.rstrip(sep) + sep
+        for table, column in (('files', 'directory'), ('directories', 'path')):
+            self._connection.execute(f'DELETE FROM {table} WHERE {column} = ? OR ({column} >= ? AND {column} < ?)',
+                                     (directory, below, below + _max_char))
+
+    def find(self, suffix: str, roots: list) -> list:
+        """
+        Find indexed files ending with suffix
+        :param suffix: End of the file name
+        :param roots: Only return files below these directories, results are in the order of the roots
+        :return: Paths
+        """
+        reversed_suffix = _reverse(suffix)
+        with self._lock:
+            rows = self._connection.execute('SELECT directory, name FROM files WHERE reversed >= ? AND reversed < ? '
+                                            'ORDER BY directory, name',
+                                            (reversed_suffix, reversed_suffix + _max_char)).fetchall()
+        found = []
+        for root in roots:
+            root = str(Path(root))
+            below = root.rstrip(sep) + sep
+            found += [Path(directory, name) for directory, name in rows
+                      if directory == root or directory.startswith(below)]
+        return found
+
+
+def find_original(index: FileIndex, suffix: str, roots: list):
+    """
+    Look up a file in the index, refresh the index if the file is not found or moved
+    :param index: File index
+    :param suffix: End of the file name
+    :param roots: Search directories in order
+    :return: Path or None
+    """
+    for refresh in (False, True):
+        if refresh:
+            index.refresh(roots)
+        found = [file for file in index.find(suffix, roots) if file.is_file()]
+        if found:
+            return found[0]
+    return None
@@ -0,0 +1,25 @@
+def fan_out_graph(video_filters: list) -> tuple:
+    """
+    Build one filter graph that decodes the video once and feeds every output,
+    outputs with the same filter share one filter chain
+    :param video_filters: Filter of each output, empty for outputs without filter
+    :return: Filter graph, video map argument of each output
+    """
+    chains = {}
+    for i, video_filter in enumerate(video_filters):
+        if video_filter:
+            chains.setdefault(video_filter, []).append(i)
+
+    maps = ['0:v:0'] * len(video_filters)
+    graph = []
+    if len(chains) > 1:
+        graph.append('[0:v:0]split=%d' % len(chains) + ''.join(f'[s{j}]' for j in range(len(chains))))
+    for j, (video_filter, indices) in enumerate(chains.items()):
+        labels = [f'[v{i}]' for i in indices]
+        chain = (f'[s{j}]' if len(chains) > 1 else '[0:v:0]') + video_filter
+        if len(labels) > 1:
+            chain += ',split=%d' % len(labels)
+        graph.append(chain + ''.join(labels))
+        for i, label in zip(indices, labels):
+            maps[i] = label
+    return ';'.join(graph), maps
@@ -0,0 +1,87 @@
+from logging import info
+from os import cpu_count
+from re import fullmatch
+
+from src.model.process_pool import ordered_map
+from src.resources.commands import frame_formats
+
+keyframes_sampling = 'keyframes'
+
+
+def sampling_arguments(sampling: str) -> tuple:
+    """
+    Convert a frame sampling to ffmpeg arguments
+    :param sampling: Empty for all frames, "keyframes", "N" for every Nth frame or "Xfps" for a fixed rate
+    :return: Input arguments, video filter
+    """
+    sampling = sampling.strip()
+    if not sampling:
+        return (), ''
+    if sampling == keyframes_sampling:
+        return ('-skip_frame', 'nokey'), ''  # Other frames are not decoded
+    if sampling.isdigit() and int(sampling) > 0:
+        return (), f"select='not(mod(n\\,{int(sampling)}))'"
+    if match := fullmatch(r'(\d+(?:\.\d+)?)fps', sampling):
+        return (), f'fps={match.group(1)}'
+    raise ValueError(f'Invalid frame sampling {sampling}')
+
+
+def read_ppm(stream):
+    """
+    Read one binary ppm image
+    :param stream: ffmpeg image2pipe output
+    :return: Size and raw RGB pixels, None at the end of the stream
+    """
+    magic = stream.readline()
+    if not magic:
+        return None
+    if magic.strip() != b'P6':
+        raise ValueError(f'Invalid ppm frame {magic[:10]}')
+    width, height = map(int, stream.readline().split())
+    maximum = int(stream.readline())
+    if maximum != 255:  # 16 bit frames have 2 bytes per sample, the command has to request rgb24
+        raise ValueError(f'Unsupported ppm maximum value {maximum}')
+    pixels = stream.read(width * height * 3)
+    if len(pixels) != width * height * 3:
+        return None  # Process terminated
+    return (width, height), pixels
+
+
+def write_frame(size: tuple, pixels: bytes, file: str, frame_format: str):
+    """
+    Compress a frame, runs in a worker process
+    """
+    from PIL import Image  # Loaded on first use, most jobs export no frames
+    image_format, _, options = frame_formats[frame_format]
+    Image.frombytes('RGB', size, pixels).save(file, image_format, **options)
+
+
+class FrameExport:
+    """
+    Write the raw frames ffmpeg pipes to stdout as images, the frames are compressed in a process pool
+    """
+
+    def __init__(self, pattern: str, frame_format: str, workers: int = None):
+        """
+        :param pattern: Output path with a %06d frame number
+        :param frame_format: Key of frame_formats
+        :param workers: Compressing processes, core count by default
+        """
+        self.pattern = pattern
+        self.frame_format = frame_format
+        self.workers = workers or cpu_count() or 1
+        self.count = 0
+
+    def drain(self, stdout):
+        """
+        Read all frames from stdout and write them in order
+        :param stdout: ffmpeg stdout
+        """
+        def frames():
+            while frame := read_ppm(stdout):
+                self.count += 1
+                yield *frame, self.pattern % self.count, self.frame_format
+
+        for _ in ordered_map(write_frame, frames(), self.workers):
+            pass
+        info(f'FRAMES WRITTEN {self.count} {self.pattern}')
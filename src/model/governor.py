@@ -0,0 +1,153 @@
+import os
+from dataclasses import dataclass
+from logging import info, exception
+from shutil import which
+from threading import Thread, Lock, Event
+
+from src.model.scheduler import get_scheduler
+
+interactive_class = 'interactive'
+batch_class = 'batch'
+load_interval = 5  # Seconds between load checks
+memory_per_thread = 256 << 20  # Bytes an encoder thread may use, fewer threads run if memory is low
+
+
+@dataclass(frozen=True)
+class ResourcePolicy:
+    """
+    Limits of the ffmpeg processes of a job class
+    """
+    nice: int = 0  # Added niceness, 0 to 19
+    io_class: int = 2  # ionice class, 2 best effort, 3 idle
+    io_level: int = 4  # ionice level of the best effort class, 0 is the highest
+    pin: bool = False  # Pin each process to its own cores
+
+
+# Interactive jobs keep the machine responsive, batch jobs yield to everything else
+policies = {interactive_class: ResourcePolicy(),
+            batch_class: ResourcePolicy(nice=10, io_level=7, pin=True)}
+
+
+def read_available_memory():
+    """
+    :return: Bytes of memory available without swapping, None if unknown
+    """
+    try:
+        with open('/proc/meminfo', encoding='UTF-8') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def load_limit(load: float, reserved: int, cores: int, available_memory) -> int:
+    """
+    Threads the scheduler may run, the load of other programs and the free memory are left alone
+    :param load: One minute load average
+    :param reserved: Threads the scheduler runs now, they are part of the load
+    :param cores: Core count
+    :param available_memory: Bytes or None
+    :return: Thread limit, at least 1
+    """
+    limit = cores - max(0.0, load - reserved)
+    if available_memory is not None:
+        limit = min(limit, (available_memory + reserved * memory_per_thread) // memory_per_thread)
+    return max(1, int(limit))
+
+
+class Governor:
+    """
+    Apply the resource policy of a job to its ffmpeg processes and limit the scheduler while the machine is busy
+    """
+
+    def __init__(self, cores: list = None):
+        """
+        :param cores: Cores processes are pinned to, the cores of this process by default
+        """
+        if cores is None:
+            cores = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else []
+        self._core_use = {core: 0 for core in cores}  # Core -> pinned processes
+        self._lock = Lock()
+        self._stopped = Event()
+        # The policy is set by tools that exec ffmpeg, it applies to all threads ffmpeg starts
+        self._nice = which('nice')
+        self._ionice = which('ionice')
+        self._taskset = which('taskset')
+        self._thread = None
+
+    def command_prefix(self, policy: ResourcePolicy, threads: int) -> tuple:
+        """
+        Run ffmpeg with the niceness, io priority and affinity of a policy, tools the platform does not have are
+        skipped
+        :param policy: Policy of the job
+        :param threads: Threads of the process, as many cores are pinned
+        :return: Arguments before the ffmpeg command, pinned cores to be passed to release()
+        """
+        prefix = []
+        if policy.nice and self._nice:
+            prefix += [self._nice, '-n', str(policy.nice)]
+        if self._ionice and (policy.io_class, policy.io_level) != (2, 4):
+            prefix += [self._ionice, '-c', str(policy.io_class),
+                       *(('-n', str(policy.io_level)) if policy.io_class == 2 else ())]
+        cores = []
+        if policy.pin and self._taskset and len(self._core_use) > threads:
+            cores = self._acquire(threads)
+            prefix += [self._taskset, '-c', ','.join(map(str, cores))]
+        return prefix, cores
+
+    def _acquire(self, threads: int) -> list:
+        """
+        :return: The least used cores, processes started at once get different cores
+        """
+        with self._lock:
+            cores = sorted(self._core_use, key=lambda core: (self._core_use[core], core))[:threads]
+            for core in cores:
+                self._core_use[core] += 1
+            return cores
+
+    def release(self, cores: list):
+        with self._lock:
+            for core in cores:
+                self._core_use[core] -= 1
+
+    def start(self):
+        """
+        Check the load in a background thread, platforms without a load average are not limited
+        """
+        if self._thread is None and hasattr(os, 'getloadavg'):
+            self._thread = Thread(target=self._watch_load, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _watch_load(self):
+        scheduler = get_scheduler()
+        while not self._stopped.wait(load_interval):
+            try:
+                limit = load_limit(os.getloadavg()[0], scheduler.reserved, os.cpu_count() or 1,
+                                   read_available_memory())
+            except OSError as e:
+                exception(e)
+                continue
+            if limit != scheduler.load_limit and (limit < scheduler.capacity or scheduler.load_limit):
+                info(f'GOVERNOR LIMIT {limit}')
+                scheduler.set_load_limit(limit if limit < scheduler.capacity else None)
+
+
+_governor = None
+_governor_lock = Lock()
+
+
+def get_governor() -> Governor:
+    """
+    :return: Governor shared by all tasks, it is started on first use
+    """
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            _governor = Governor()
+            _governor.start()
+        return _governor
@@ -0,0 +1,77 @@
+from logging import info
+from os import cpu_count
+from shutil import copyfileobj
+
+from src.model.process_pool import ordered_map
+
+# Formats ffmpeg parses from a pipe without decoding in python (image2pipe)
+pipe_formats = {'PNG': 'png_pipe', 'JPEG': 'jpeg_pipe', 'BMP': 'bmp_pipe', 'WEBP': 'webp_pipe'}
+
+
+def read_header(file) -> tuple:
+    """
+    Read format and size without decoding the image
+    :param file: Image file
+    :return: Format, size, mode
+    """
+    from PIL import Image  # Loaded on first use, most jobs have no images
+    with Image.open(file) as image:
+        return image.format, image.size, image.mode
+
+
+def decode_frame(file, size: tuple) -> bytes:
+    """
+    Decode an image to raw RGB, runs in a worker process
+    :param file: Image file
+    :param size: Size of the first frame, other sizes are resized
+    :return: Raw pixels
+    """
+    from PIL import Image
+    with Image.open(file) as image:
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        if image.size != size:
+            image = image.resize(size)
+        return image.tobytes()
+
+
+class ImageSequence:
+    """
+    Feed an image sequence to ffmpeg stdin. If all images have the same format and size the files are passed
+    as they are, otherwise they are decoded in a process pool and streamed as raw frames.
+    """
+
+    def __init__(self, files: list, workers: int = None):
+        """
+        :param files: Image files in order
+        :param workers: Decoding processes, core count by default
+        """
+        self.files = files
+        self.workers = workers or cpu_count() or 1
+        headers = {read_header(file) for file in files}
+        self.size = read_header(files[0])[1]
+        self.image_format = headers.pop()[0] if len(headers) == 1 else None
+        self.copy = self.image_format in pipe_formats
+        info(f'IMAGE SEQUENCE {len(files)} {"copy " + self.image_format if self.copy else "decode"}')
+
+    def input_arguments(self) -> list:
+        """
+        :return: ffmpeg arguments describing the stdin input
+        """
+        if self.copy:
+            return ['-f', pipe_formats[self.image_format]]
+        return ['-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', '%dx%d' % self.size]
+
+    def feed(self, stdin):
+        """
+        Write all frames to stdin in order
+        :param stdin: ffmpeg stdin
+        """
+        if self.copy:
+            for file in self.files:
+                with open(file, 'rb') as f:
+                    copyfileobj(f, stdin)
+            return
+
+        for pixels in ordered_map(decode_frame, ((file, self.size) for file in self.files), self.workers):
+            stdin.write(pixels)
@@ -0,0 +1,449 @@
+import json
+from collections import deque
+from hmac import compare_digest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from logging import info, exception
+from numbers import Real
+from pathlib import Path
+from re import fullmatch
+from secrets import token_hex
+from threading import Thread, Lock, Event
+from time import monotonic
+from urllib.error import HTTPError
+from urllib.request import urlopen, Request
+
+from src.model.frame_export import sampling_arguments
+from src.model.governor import policies
+from src.model.job_store import JobStore, server_owner, pending_state, running_state, done_state, failed_state
+from src.model.progress import Progress
+from src.resources.commands import video_options, audio_options, encoder_tiers, frame_formats
+
+default_port = 8765
+lease_seconds = 60  # A worker that did not report for this long is considered dead
+heartbeat_seconds = 5  # Workers report progress and renew their lease this often
+token_header = 'X-Cut-Videos-Token'  # Shared secret of the server and its workers, sent with every request
+token_variable = 'CUT_VIDEOS_TOKEN'
+long_time = r'\d{2,}:\d{2}:\d{2}\.\d{3}'
+
+
+def _is_sampling(value) -> bool:
+    try:
+        sampling_arguments(value)
+    except ValueError:
+        return False
+    return True
+
+
+# Task arguments a job may set: the options of folder presets, the input files and show_result. The values
+# reach the ffmpeg command line and are checked strictly.
+parameter_checks = {
+    'path': lambda value: isinstance(value, str),
+    'files': lambda value: isinstance(value, list) and all(isinstance(file, str) and file and Path(file).name == file
+                                                           for file in value),
+    'input_framerate': lambda value: isinstance(value, str) and fullmatch(r'(\d+(\.\d+)?)?', value),
+    'start_time': lambda value: isinstance(value, str) and fullmatch(long_time, value),
+    'end_time': lambda value: isinstance(value, str) and fullmatch(long_time, value),
+    'hardsub': lambda value: isinstance(value, int),
+    'webm_input': lambda value: isinstance(value, str) and fullmatch(r'\d{1,2}', value),
+    'scale_input': lambda value: isinstance(value, str) and fullmatch(r'-?\d+:-?\d+', value),
+    'audio_selection': lambda value: isinstance(value, str) and value in audio_options,
+    'video_selection': lambda value: all(isinstance(selection, str) and selection in video_options
+                                         for selection in (value if isinstance(value, (list, tuple)) else [value])),
+    'segments': lambda value: isinstance(value, int),
+    'tier': lambda value: isinstance(value, str) and value in encoder_tiers,
+    'ranges': lambda value: value is None or isinstance(value, (list, tuple)) and all(
+        isinstance(time_range, (list, tuple)) and len(time_range) == 2 and
+        all(isinstance(time, str) and fullmatch(long_time, time) for time in time_range) for time_range in value),
+    'scene_threshold': lambda value: isinstance(value, Real),
+    'min_clip': lambda value: isinstance(value, Real),
+    'max_clip': lambda value: isinstance(value, Real),
+    'frame_sampling': lambda value: isinstance(value, str) and _is_sampling(value),
+    'frame_format': lambda value: isinstance(value, str) and value in frame_formats,
+    'priority': lambda value: isinstance(value, int),
+    'job_class': lambda value: isinstance(value, str) and value in policies,
+    'show_result': lambda value: value is False,  # Workers run without a desktop
+}
+
+# Task arguments without default
+required_parameters = ('input_framerate', 'start_time', 'end_time', 'hardsub', 'webm_input', 'scale_input',
+                       'audio_selection', 'video_selection', 'path', 'files')
+
+
+def validate_parameters(parameters: dict) -> dict:
+    """
+    Check the Task arguments of a job, missing and unknown keys and values that are not valid options are rejected
+    :param parameters: Task arguments without callbacks
+    :return: The parameters
+    """
+    if not isinstance(parameters, dict):
+        raise ValueError('Parameters are not an object')
+    missing = [key for key in required_parameters if key not in parameters]
+    if missing:
+        raise ValueError(f'Missing {", ".join(missing)}')
+    for key, value in parameters.items():
+        if key not in parameter_checks:
+            raise ValueError(f'Unknown parameter {key}')
+        if not parameter_checks[key](value):
+            raise ValueError(f'Invalid {key} {value!r}')
+    return parameters
+
+
+class LeaseTable:
+    """
+    Jobs handed out to workers, a lease expires if the worker does not renew it
+    """
+
+    def __init__(self, seconds: float = lease_seconds, clock: callable = monotonic):
+        """
+        :param seconds: Lease duration
+        :param clock: Monotonic time
+        """
+        self.seconds = seconds
+        self._clock = clock
+        self._leases = {}  # Job id -> (worker, token, expiry)
+
+    def grant(self, job_id: int, worker: str) -> str:
+        """
+        :return: Token the worker identifies the lease with
+        """
+        token = token_hex(8)
+        self._leases[job_id] = (worker, token, self._clock() + self.seconds)
+        return token
+
+    def renew(self, job_id: int, token: str) -> bool:
+        """
+        :return: False if the lease expired or was given to another worker
+        """
+        lease = self._leases.get(job_id)
+        if lease is None or lease[1] != token:
+            return False
+        self._leases[job_id] = (lease[0], token, self._clock() + self.seconds)
+        return True
+
+    def release(self, job_id: int, token: str) -> bool:
+        """
+        End a lease when the job is finished
+        :return: False if the lease expired or was given to another worker
+        """
+        if not self.renew(job_id, token):
+            return False
+        del self._leases[job_id]
+        return True
+
+    def expired(self) -> list:
+        """
+        Remove expired leases
+        :return: Job ids of the expired leases
+        """
+        now = self._clock()
+        job_ids = [job_id for job_id, (_, _, expiry) in self._leases.items() if expiry <= now]
+        for job_id in job_ids:
+            info(f'LEASE EXPIRED job {job_id} worker {self._leases.pop(job_id)[0]}')
+        return job_ids
+
+    def workers(self) -> dict:
+        """
+        :return: Job id -> worker
+        """
+        return {job_id: worker for job_id, (worker, _, _) in self._leases.items()}
+
+
+class JobServer:
+    """
+    Coordinator that hands out the jobs of the job store to workers over HTTP.
+    Workers need the same paths to the input files, like a shared network drive.
+    """
+
+    def __init__(self, store: JobStore, host: str = '127.0.0.1', port: int = default_port,
+                 lease: float = lease_seconds, token: str = None, on_progress: callable = None,
+                 on_finish: callable = None):
+        """
+        :param store: Job store, unfinished jobs of the server are handed out again
+        :param host: Listening address, 0.0.0.0 for workers on other machines
+        :param port: Listening port, 0 picks a free port
+        :param lease: Seconds until the job of a silent worker is handed out again
+        :param token: Shared secret workers send with every request, a random token by default
+        :param on_progress: Called with job id, parameters and Progress
+        :param on_finish: Called with job id, parameters and error message or None
+        """
+        self._store = store
+        self._leases = LeaseTable(lease)
+        self.token = token or token_hex(16)
+        self._on_progress = on_progress
+        self._on_finish = on_finish
+        self._lock = Lock()
+        self._progress = {}  # Job id -> last Progress
+        self._parameters = {}  # Job id -> Task arguments
+        self._queue = deque()
+        for job in store.unfinished(server_owner):  # Running jobs of a stopped server start again
+            store.set_state(job.id, pending_state)
+            self._parameters[job.id] = job.parameters
+            self._queue.append(job.id)
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.job_server = self
+        self._thread = None
+
+    @property
+    def address(self) -> tuple:
+        return self._server.server_address
+
+    def start(self):
+        """
+        Serve in a background thread
+        """
+        self._thread = Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        info(f'JOB SERVER {self.address}')
+
+    def shutdown(self):
+        if self._thread:
+            self._server.shutdown()
+        self._server.server_close()
+
+    def add(self, parameters: dict) -> int:
+        """
+        :param parameters: Task arguments
+        :return: Job id
+        """
+        validate_parameters(parameters)
+        with self._lock:
+            job_id = self._store.add(parameters, server_owner)
+            self._parameters[job_id] = parameters
+            self._queue.append(job_id)
+            return job_id
+
+    @property
+    def remaining(self) -> int:
+        """
+        :return: Jobs that are queued or running
+        """
+        with self._lock:
+            return len(self._queue) + len(self._leases.workers())
+
+    def _requeue_expired(self):
+        for job_id in self._leases.expired():
+            self._store.set_state(job_id, pending_state)
+            self._queue.appendleft(job_id)
+
+    def lease(self, worker: str):
+        """
+        :param worker: Worker name
+        :return: Dict of job id, token and parameters, None if no job is queued
+        """
+        with self._lock:
+            self._requeue_expired()
+            if not self._queue:
+                return None
+            job_id = self._queue.popleft()
+            self._store.set_state(job_id, running_state)
+            info(f'LEASE job {job_id} to {worker}')
+            return {'job': job_id, 'token': self._leases.grant(job_id, worker),
+                    'parameters': self._parameters[job_id], 'heartbeat': heartbeat_seconds}
+
+    def progress(self, job_id: int, token: str, progress: dict) -> bool:
+        """
+        Renew the lease and record the progress
+        :return: False if the lease was lost, the worker has to stop the job
+        """
+        with self._lock:
+            self._requeue_expired()
+            if not self._leases.renew(job_id, token):
+                return False
+            if progress:
+                self._progress[job_id] = Progress.from_dict(progress)
+        if progress and self._on_progress:
+            self._on_progress(job_id, self._parameters[job_id], self._progress[job_id])
+        return True
+
+    def finish(self, job_id: int, token: str, error: str = None, outputs: list = None) -> bool:
+        """
+        :return: False if the lease was lost, the result is ignored
+        """
+        with self._lock:
+            self._requeue_expired()
+            if not self._leases.release(job_id, token):
+                return False
+            self._store.set_state(job_id, failed_state if error else done_state, outputs or [], error)
+            self._progress.pop(job_id, None)
+        if self._on_finish:
+            self._on_finish(job_id, self._parameters[job_id], error)
+        return True
+
+    def status(self) -> dict:
+        with self._lock:
+            self._requeue_expired()
+            return {'queued': list(self._queue),
+                    'running': [{'job': job_id, 'worker': worker,
+                                 'progress': self._progress[job_id].to_dict() if job_id in self._progress else None}
+                                for job_id, worker in self._leases.workers().items()]}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    JSON over HTTP: POST /lease, /progress, /finish and GET /status. Jobs are only added by the server process.
+    """
+
+    def _authorized(self) -> bool:
+        """
+        :return: True if the request has the token of the server, otherwise 401 is sent
+        """
+        token = self.headers.get(token_header, '').encode('UTF-8', errors='replace')
+        if compare_digest(token, self.server.job_server.token.encode('UTF-8')):
+            return True
+        self._reply(401)
+        return False
+
+    def _reply(self, status: int, data=None):
+        body = json.dumps(data).encode('UTF-8') if data is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        if self.path == '/status':
+            self._reply(200, self.server.job_server.status())
+        else:
+            self._reply(404)
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        server = self.server.job_server
+        try:
+            data = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            if self.path == '/lease':
+                job = server.lease(data['worker'])
+                self._reply(200, job) if job else self._reply(204)
+            elif self.path == '/progress':
+                self._reply(200 if server.progress(data['job'], data['token'], data.get('progress')) else 409)
+            elif self.path == '/finish':
+                self._reply(200 if server.finish(data['job'], data['token'], data.get('error'),
+                                                 data.get('outputs')) else 409)
+            else:
+                self._reply(404)
+        except (ValueError, KeyError, TypeError) as e:
+            self._reply(400, {'error': str(e)})
+
+    def log_message(self, message_format, *args):
+        info(f'JOB SERVER {self.address_string()} {message_format % args}')
+
+
+class JobClient:
+    """
+    Worker side of the job server protocol
+    """
+
+    def __init__(self, url: str, token: str, timeout: float = 30):
+        """
+        :param url: Server url like http://host:8765
+        :param token: Shared secret of the server
+        """
+        self.url = url.rstrip('/')
+        self.token = token
+        self.timeout = timeout
+
+    def _post(self, path: str, data: dict) -> tuple:
+        """
+        :return: HTTP status, json reply or None
+        """
+        request = Request(self.url + path, json.dumps(data).encode('UTF-8'),
+                          {'Content-Type': 'application/json', token_header: self.token})
+        try:
+            with urlopen(request, timeout=self.timeout) as response:
+                body = response.read()
+                return response.status, json.loads(body) if body else None
+        except HTTPError as e:
+            return e.code, None
+
+    def lease(self, worker: str):
+        """
+        :return: Dict of job id, token and parameters, None if no job is queued
+        """
+        status, job = self._post('/lease', {'worker': worker})
+        return job if status == 200 else None
+
+    def progress(self, job: dict, progress) -> bool:
+        """
+        :return: False if the lease was lost
+        """
+        return self._post('/progress', {'job': job['job'], 'token': job['token'],
+                                        'progress': progress.to_dict() if progress else None})[0] == 200
+
+    def finish(self, job: dict, error, outputs: list) -> bool:
+        return self._post('/finish', {'job': job['job'], 'token': job['token'], 'error': str(error) if error else None,
+                                      'outputs': [str(output) for output in outputs]})[0] == 200
+
+
+class RemoteProgress:
+    """
+    Progress bar of a task on a worker, the heartbeat sends the last progress to the server
+    """
+
+    def __init__(self, bar=None):
+        """
+        :param bar: Local progress output
+        """
+        self.progress = None
+        self.bar = bar
+
+    def set_progress(self, progress):
+        self.progress = progress
+        if self.bar:
+            self.bar.set_progress(progress)
+
+    def finish(self, error):
+        if self.bar:
+            self.bar.finish(error)
+
+
+def run_worker(client: JobClient, worker: str, run_task: callable, stop: Event, idle: float = 2.0):
+    """
+    Lease and run jobs until stop is set
+    :param client: Job server client
+    :param worker: Worker name
+    :param run_task: Called with the checked task parameters and a RemoteProgress, returns the started Task
+    :param stop: Ends the loop after the current job
+    :param idle: Seconds to wait if no job is queued or the server is unreachable
+    """
+    while not stop.is_set():
+        try:
+            job = client.lease(worker)
+        except OSError as e:
+            info(f'JOB SERVER UNREACHABLE {e}')
+            job = None
+        if job is None:
+            stop.wait(idle)
+            continue
+        progress = RemoteProgress()
+        try:
+            task = run_task(validate_parameters(job['parameters']), progress)
+        except Exception as e:  # Recorded as failed job, the worker keeps running
+            exception(f'INVALID JOB {job["job"]} {e}')
+            try:
+                client.finish(job, f'{type(e).__name__} {e}', [])
+            except OSError as error:
+                exception(error)
+            continue
+        interrupted = False
+        while task.is_alive():
+            task.join(job['heartbeat'])
+            try:
+                if task.is_alive() and not client.progress(job, progress.progress):
+                    interrupted = True  # The lease expired, the job was handed to another worker
+            except OSError as e:
+                exception(e)  # The heartbeat is sent again, the lease is lost if the server stays unreachable
+            if task.is_alive() and (interrupted or stop.is_set()):
+                interrupted = True
+                task.stop()
+        task.join()
+        if interrupted:
+            continue  # The lease expires and the job is run again
+        progress.finish(task.error)
+        try:
+            client.finish(job, task.error, task.outputs)
+        except OSError as e:
+            exception(e)  # The lease expires and the job is run again
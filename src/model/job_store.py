@@ -0,0 +1,163 @@
+import json
+import os
+import sqlite3
+from dataclasses import dataclass
+from pathlib import Path, PurePath
+from socket import gethostname
+from sys import platform
+from threading import Lock
+from time import time
+
+from src.resources.paths import cache_dir
+
+# Job states, interrupted jobs go back to pending
+pending_state = 'pending'
+running_state = 'running'
+done_state = 'done'
+failed_state = 'failed'
+# Programs that own jobs, the window reloads only its own jobs
+gui_owner = 'gui'
+cli_owner = 'cli'
+watch_owner = 'watch'
+server_owner = 'server'  # Jobs the job server hands out to workers
+
+
+def _encode_parameter(value):
+    """
+    json.dumps fallback, paths of the window are stored as strings
+    """
+    if isinstance(value, PurePath):
+        return str(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+@dataclass
+class Job:
+    id: int
+    parameters: dict  # Arguments of Task.__init__ without callbacks
+    state: str
+    owner: str
+    created: float
+    started: float = None
+    finished: float = None
+    outputs: list = None
+    error: str = None
+    host: str = None  # Machine and process that added or last ran the job
+    pid: int = None
+
+    @property
+    def duration(self):
+        return self.finished - self.started if self.started and self.finished else None
+
+
+def process_alive(pid: int) -> bool:
+    """
+    :param pid: Process id on this machine
+    :return: True if the process is running
+    """
+    if platform == 'win32':  # os.kill would terminate the process
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        exit_code = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+        kernel32.CloseHandle(handle)
+        return exit_code.value == 259  # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # Process of another user
+        return True
+    return True
+
+
+class JobStore:
+    """
+    Durable record of jobs, their parameters, state, timings and outputs
+    """
+
+    def __init__(self, database: Path = Path(cache_dir, 'jobs.sqlite')):
+        """
+        :param database: SQLite file
+        """
+        Path(database).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = Lock()
+        self._connection = sqlite3.connect(str(database), check_same_thread=False)
+        with self._connection:
+            self._connection.executescript('''
+                CREATE TABLE IF NOT EXISTS jobs (id INTEGER PRIMARY KEY, parameters TEXT, state TEXT, owner TEXT,
+                    created REAL, started REAL, finished REAL, outputs TEXT, error TEXT, host TEXT, pid INTEGER);
+                CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, owner);''')
+            columns = {row[1] for row in self._connection.execute('PRAGMA table_info(jobs)')}
+            for column, column_type in (('host', 'TEXT'), ('pid', 'INTEGER')):  # Databases of older versions
+                if column not in columns:
+                    self._connection.execute(f'ALTER TABLE jobs ADD COLUMN {column} {column_type}')
+        self._host = gethostname()
+
+    def close(self):
+        self._connection.close()
+
+    def add(self, parameters: dict, owner: str) -> int:
+        """
+        :param parameters: Task arguments
+        :param owner: Program that runs the job
+        :return: Job id
+        """
+        with self._lock, self._connection:
+            return self._connection.execute(
+                'INSERT INTO jobs (parameters, state, owner, created, host, pid) VALUES (?, ?, ?, ?, ?, ?)',
+                (json.dumps(parameters, default=_encode_parameter), pending_state, owner, time(), self._host, os.getpid())).lastrowid
+
+    def set_state(self, job_id: int, state: str, outputs: list = None, error: str = None):
+        """
+        Update the state, starting sets the start time, done and failed set the finish time.
+        The job belongs to this process from then on.
+        :param job_id: Job id
+        :param state: New state
+        :param outputs: Written files
+        :param error: Error message of a failed job
+        """
+        now = time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                'UPDATE jobs SET state = ?, started = CASE WHEN ? THEN ? ELSE started END, '
+                'finished = CASE WHEN ? THEN ? ELSE NULL END, outputs = COALESCE(?, outputs), error = ?, host = ?, '
+                'pid = ? WHERE id = ?',
+                (state, state == running_state, now, state in (done_state, failed_state), now,
+                 None if outputs is None else json.dumps([str(output) for output in outputs]), error, self._host,
+                 os.getpid(), job_id))
+
+    def _jobs(self, where: str, arguments: tuple) -> list:
+        with self._lock:
+            rows = self._connection.execute(f'SELECT id, parameters, state, owner, created, started, finished, '
+                                            f'outputs, error, host, pid FROM jobs {where}', arguments).fetchall()
+        return [Job(row[0], json.loads(row[1]), *row[2:7], json.loads(row[7]) if row[7] else [], *row[8:11])
+                for row in rows]
+
+    def get(self, job_id: int):
+        jobs = self._jobs('WHERE id = ?', (job_id,))
+        return jobs[0] if jobs else None
+
+    def unfinished(self, owner: str) -> list:
+        """
+        Jobs that were pending or interrupted while running, to be started again. Jobs of another process that
+        still runs, like a second window, and jobs of other machines are left to that process.
+        :param owner: Program that runs the jobs
+        :return: Jobs in the order they were added
+        """
+        jobs = self._jobs('WHERE state IN (?, ?) AND owner = ? ORDER BY id', (pending_state, running_state, owner))
+        return [job for job in jobs if job.pid is None or
+                job.host == self._host and (job.pid == os.getpid() or not process_alive(job.pid))]
+
+    def history(self, state: str = None, limit: int = 50) -> list:
+        """
+        :param state: Only jobs in this state
+        :param limit: Number of jobs
+        :return: Newest jobs first
+        """
+        if state:
+            return self._jobs('WHERE state = ? ORDER BY id DESC LIMIT ?', (state, limit))
+        return self._jobs('ORDER BY id DESC LIMIT ?', (limit,))
@@ -0,0 +1,204 @@
+import json
+from dataclasses import dataclass, asdict
+from hashlib import sha1
+from logging import info, exception
+from os import replace
+from pathlib import Path
+from subprocess import check_output
+from threading import Lock
+
+from src.resources.commands import probe_arguments, keyframe_arguments
+from src.resources.paths import cache_dir, ffprobe_path
+
+probe_cache_dir = Path(cache_dir, 'probe')
+_cache_version = 2
+_memory_cache = {}
+_memory_lock = Lock()
+
+
+@dataclass(frozen=True)
+class AudioStream:
+    """
+    Audio stream of a media file, index counts audio streams only (ffmpeg 0:a:<index>)
+    """
+    index: int
+    codec: str
+    language: str
+
+
+@dataclass(frozen=True)
+class MediaInfo:
+    """
+    Metadata of a media file from a single ffprobe call
+    """
+    duration: float
+    fps: float
+    width: int
+    height: int
+    video_codec: str
+    audio_streams: tuple
+    pix_fmt: str = ''
+    video_profile: str = ''
+    video_level: int = 0
+    start_time: float = 0
+
+    @property
+    def has_video(self) -> bool:
+        return bool(self.video_codec)
+
+    @property
+    def has_audio(self) -> bool:
+        return bool(self.audio_streams)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        data = dict(data)
+        data['audio_streams'] = tuple(AudioStream(**stream) for stream in data['audio_streams'])
+        return cls(**data)
+
+
+def parse_frame_rate(rate: str) -> float:
+    """
+    Parse ffprobe frame rate
+    :param rate: Rate string like "30000/1001" or "25"
+    :return: Frames per second, 0 if unknown
+    """
+    if not rate:
+        return 0
+    if '/' in rate:
+        numerator, denominator = rate.split('/', 1)
+        if float(denominator) == 0:
+            return 0
+        return float(numerator) / float(denominator)
+    return float(rate)
+
+
+def parse_probe(data: dict) -> MediaInfo:
+    """
+    Convert ffprobe json output into MediaInfo
+    :param data: Parsed json of "-show_format -show_streams"
+    :return: Media information
+    """
+    streams = data.get('streams', [])
+    # Cover art is reported as a video stream
+    video = [s for s in streams if s.get('codec_type') == 'video' and
+             not s.get('disposition', {}).get('attached_pic')]
+    audio = [s for s in streams if s.get('codec_type') == 'audio']
+    audio_streams = tuple(AudioStream(index=i,
+                                      codec=stream.get('codec_name', ''),
+                                      language=stream.get('tags', {}).get('language', 'unknown'))
+                          for i, stream in enumerate(audio))
+
+    duration = data.get('format', {}).get('duration')
+    start_time = float(data.get('format', {}).get('start_time', 0))
+    if video:
+        video = video[0]
+        fps = parse_frame_rate(video.get('r_frame_rate')) or parse_frame_rate(video.get('avg_frame_rate'))
+        return MediaInfo(duration=float(duration or video.get('duration') or 0),
+                         fps=fps,
+                         width=int(video.get('width', 0)),
+                         height=int(video.get('height', 0)),
+                         video_codec=video.get('codec_name', ''),
+                         audio_streams=audio_streams,
+                         pix_fmt=video.get('pix_fmt', ''),
+                         video_profile=video.get('profile', ''),
+                         video_level=int(video.get('level', 0)),
+                         start_time=start_time)
+    return MediaInfo(duration=float(duration or 0), fps=0, width=0, height=0, video_codec='',
+                     audio_streams=audio_streams, start_time=start_time)
+
+
+def file_key(file) -> str:
+    """
+    Identify a file by path, size and modification time
+    :param file: File path
+    :return: Hash string, changes when the file changes
+    """
+    file = Path(file).resolve()
+    stat = file.stat()
+    return sha1(f'{_cache_version}|{file}|{stat.st_size}|{stat.st_mtime_ns}'.encode('UTF-8')).hexdigest()
+
+
+def read_cache(name: str):
+    try:
+        with open(Path(probe_cache_dir, name), encoding='UTF-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        exception(f'INVALID PROBE CACHE {name}')
+        return None
+
+
+def write_cache(name: str, data):
+    try:
+        probe_cache_dir.mkdir(parents=True, exist_ok=True)
+        cache_file = Path(probe_cache_dir, name)
+        temp_file = cache_file.with_suffix('.tmp%s' % id(data))
+        with open(temp_file, 'w', encoding='UTF-8') as f:
+            json.dump(data, f)
+        replace(temp_file, cache_file)  # Atomic, parallel writers don't corrupt the entry
+    except OSError as e:
+        exception(e)
+
+
+def probe(file) -> MediaInfo:
+    """
+    Get media information, run ffprobe only if the file is not cached
+    :param file: Media file
+    :return: Media information
+    """
+    key = file_key(file)
+    with _memory_lock:
+        if key in _memory_cache:
+            return _memory_cache[key]
+
+    media_info = None
+    cached = read_cache(key + '.json')
+    if cached is not None:
+        try:
+            media_info = MediaInfo.from_dict(cached)
+        except (TypeError, KeyError):
+            exception(f'INVALID PROBE CACHE {key}.json')
+    if media_info is None:
+        info(f'PROBE {file}')
+        media_info = parse_probe(json.loads(check_output((ffprobe_path(), *probe_arguments, str(file)))))
+        write_cache(key + '.json', media_info.to_dict())
+
+    with _memory_lock:
+        _memory_cache[key] = media_info
+    return media_info
+
+
+def parse_keyframes(output: str, start_time: float = 0) -> tuple:
+    """
+    Parse the csv packet list of ffprobe
+    :param output: Lines of "pts_time,flags"
+    :param start_time: Container start time, positions are relative to it like ffmpeg -ss
+    :return: Sorted keyframe positions in seconds
+    """
+    times = []
+    for line in output.splitlines():
+        pts_time, _, flags = line.strip().partition(',')
+        if 'K' in flags and pts_time not in ('', 'N/A'):
+            times.append(round(float(pts_time) - start_time, 6))
+    return tuple(sorted(times))
+
+
+def keyframes(file) -> tuple:
+    """
+    Get keyframe positions of the first video stream, read from packet flags without decoding
+    :param file: Video file
+    :return: Sorted keyframe positions in seconds
+    """
+    key = file_key(file)
+    times = read_cache(key + '.keyframes.json')
+    if times is None:
+        info(f'PROBE KEYFRAMES {file}')
+        output = check_output((ffprobe_path(), *keyframe_arguments, str(file))).decode('UTF-8', errors='replace')
+        times = parse_keyframes(output, probe(file).start_time)
+        write_cache(key + '.keyframes.json', times)
+    return tuple(times)
@@ -0,0 +1,23 @@
+from collections import deque
+from concurrent import futures  # The process pool module is loaded on first use
+
+
+def ordered_map(function: callable, arguments, workers: int):
+    """
+    Run function in a process pool and yield the results in order. The workers are spawned, a forked child could
+    inherit a lock held by a scheduler or progress thread.
+    :param function: Module level function, called with each tuple of arguments
+    :param arguments: Iterable of argument tuples, read while the workers run
+    :param workers: Processes
+    :return: Generator of the results
+    """
+    from multiprocessing import get_context  # Loaded on first use like the pool
+    with futures.ProcessPoolExecutor(workers, mp_context=get_context('spawn')) as pool:
+        pending = deque()
+        for argument in arguments:
+            pending.append(pool.submit(function, *argument))
+            # Keep a few results per worker in memory
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
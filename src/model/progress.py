@@ -0,0 +1,155 @@
+from dataclasses import dataclass
+from datetime import timedelta
+from re import compile
+from threading import Lock, Timer
+from time import monotonic
+
+# Arguments that make ffmpeg write key=value progress blocks to stdout instead of the stats line
+progress_arguments = ('-progress', 'pipe:1', '-nostats')
+# Progress on stderr, if stdout carries the output
+stderr_progress_arguments = ('-progress', 'pipe:2', '-nostats')
+_progress_line = compile(r'^(\w+)=(.*)$')
+
+
+@dataclass(frozen=True)
+class Progress:
+    """
+    Progress of a job, measured in seconds of output time
+    """
+    done: float
+    total: float
+    fps: float = 0
+    speed: float = 0  # Multiple of realtime
+    bitrate: str = ''
+
+    @property
+    def fraction(self) -> float:
+        return min(1.0, self.done / self.total) if self.total > 0 else 0
+
+    @property
+    def eta(self):
+        """
+        :return: Remaining seconds or None if unknown
+        """
+        if self.speed <= 0 or self.total <= 0:
+            return None
+        return max(0.0, self.total - self.done) / self.speed
+
+    def to_dict(self) -> dict:
+        return {'done': round(self.done, 3), 'total': round(self.total, 3), 'percent': round(self.fraction * 100, 1),
+                'fps': self.fps, 'speed': self.speed, 'bitrate': self.bitrate,
+                'eta': None if self.eta is None else round(self.eta, 1)}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(data['done'], data['total'], data.get('fps', 0), data.get('speed', 0), data.get('bitrate', ''))
+
+    def summary(self) -> str:
+        """
+        :return: Short text like "42% 120 fps 3.1x ETA 0:01:10"
+        """
+        text = f'{int(self.fraction * 100)}%'
+        if self.fps:
+            text += f' {self.fps:.0f} fps'
+        if self.speed:
+            text += f' {self.speed:.2g}x'
+        if self.eta is not None:
+            text += f' ETA {timedelta(seconds=round(self.eta))}'
+        return text
+
+
+class ProgressParser:
+    """
+    Collect the key=value lines of "ffmpeg -progress", one block ends with the progress key
+    """
+
+    def __init__(self):
+        self._block = {}
+
+    def feed(self, line: str):
+        """
+        :param line: Output line of ffmpeg
+        :return: Dict of a finished block, None if the block is not complete or line is not progress output
+        """
+        match = _progress_line.match(line.strip())
+        if not match:
+            return None
+        key, value = match.groups()
+        self._block[key] = value.strip()
+        if key != 'progress':
+            return None
+        block, self._block = self._block, {}
+        return block
+
+
+def is_progress_line(line: str) -> bool:
+    return bool(_progress_line.match(line.strip()))
+
+
+def _number(value: str) -> float:
+    try:
+        return float(value.rstrip('x'))
+    except (AttributeError, ValueError):
+        return 0  # N/A
+
+
+def out_time(block: dict) -> float:
+    """
+    :param block: Progress block
+    :return: Output time in seconds
+    """
+    return max(0.0, _number(block.get('out_time_us')) / 1e6)
+
+
+def block_speed(block: dict) -> float:
+    return _number(block.get('speed'))
+
+
+def block_fps(block: dict) -> float:
+    return _number(block.get('fps'))
+
+
+class ProgressChannel:
+    """
+    Deliver only the latest progress and at most one update per interval,
+    the last update is delivered when the interval has passed
+    """
+
+    def __init__(self, sink: callable, interval: float = 0.1):
+        """
+        :param sink: Receives Progress objects
+        :param interval: Minimum seconds between two updates
+        """
+        self._sink = sink
+        self._interval = interval
+        self._lock = Lock()
+        self._latest = None
+        self._last_delivery = 0
+        self._timer = None
+
+    def publish(self, progress: Progress):
+        with self._lock:
+            self._latest = progress
+            wait = self._last_delivery + self._interval - monotonic()
+            if wait > 0:
+                if self._timer is None:
+                    self._timer = Timer(wait, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+        self.flush()
+
+    def flush(self):
+        """
+        Deliver the pending update now
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            progress, self._latest = self._latest, None
+            if progress is None:
+                return
+            self._last_delivery = monotonic()
+            # Sinks are called in order, the lock is held so a late timer can't overtake a newer update
+            self._sink(progress)
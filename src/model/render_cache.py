@@ -0,0 +1,141 @@
+import json
+import sqlite3
+from hashlib import sha1
+from logging import info
+from os import link, replace
+from pathlib import Path
+from shutil import copyfile
+from threading import Lock
+
+from src.model.probe import file_key
+from src.resources.paths import cache_dir
+
+chunk_size = 1 << 16
+chunk_count = 16
+_fingerprints = {}  # file_key -> fingerprint
+_render_cache = None
+_render_cache_lock = Lock()
+
+
+def fingerprint(file) -> str:
+    """
+    Fast content fingerprint, the size and a hash of chunks spread over the file
+    :param file: Input file
+    :return: Hex digest
+    """
+    key = file_key(file)
+    if key in _fingerprints:
+        return _fingerprints[key]
+    size = Path(file).stat().st_size
+    digest = sha1(str(size).encode('UTF-8'))
+    with open(file, 'rb') as f:
+        if size <= chunk_size * chunk_count:
+            digest.update(f.read())
+        else:
+            for i in range(chunk_count):
+                f.seek(i * (size - chunk_size) // (chunk_count - 1))
+                digest.update(f.read(chunk_size))
+    _fingerprints[key] = digest.hexdigest()
+    return _fingerprints[key]
+
+
+def render_key(source_fingerprint: str, parameters: dict) -> str:
+    """
+    :param source_fingerprint: Fingerprint of the input
+    :param parameters: Normalized parameters that change the output
+    :return: Key of the output
+    """
+    return sha1(json.dumps([source_fingerprint, parameters], sort_keys=True).encode('UTF-8')).hexdigest()
+
+
+def link_or_copy(source: Path, target: Path):
+    """
+    Hardlink, copy if the files are on different drives or the file system has no hardlinks.
+    The copy is renamed when it is complete, an interrupted copy is not mistaken for the output.
+    """
+    try:
+        link(source, target)
+    except OSError:
+        temp_file = target.with_name(target.name + '.part')
+        copyfile(source, temp_file)
+        replace(temp_file, target)
+
+
+class RenderCache:
+    """
+    Remember which file was rendered from which input and parameters. Only the location of outputs is stored,
+    an output that was changed or deleted is not used.
+    """
+
+    def __init__(self, database: Path = Path(cache_dir, 'renders.sqlite')):
+        """
+        :param database: SQLite file
+        """
+        Path(database).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = Lock()
+        self._connection = sqlite3.connect(str(database), check_same_thread=False)
+        with self._connection:
+            self._connection.executescript('''
+                CREATE TABLE IF NOT EXISTS renders (path TEXT PRIMARY KEY, key TEXT, size INTEGER, mtime_ns INTEGER);
+                CREATE INDEX IF NOT EXISTS renders_key ON renders (key);''')
+
+    def add(self, key: str, output: Path):
+        output = Path(output).resolve()  # A relative path names another file in another working directory
+        stat = output.stat()
+        with self._lock, self._connection:
+            self._connection.execute('INSERT OR REPLACE INTO renders VALUES (?, ?, ?, ?)',
+                                     (str(output), key, stat.st_size, stat.st_mtime_ns))
+
+    @staticmethod
+    def _unchanged(path: str, size: int, mtime_ns: int) -> bool:
+        if not Path(path).is_absolute():  # Stored relative to an unknown working directory
+            return False
+        try:
+            stat = Path(path).stat()
+        except OSError:
+            return False
+        return stat.st_size == size and stat.st_mtime_ns == mtime_ns
+
+    def find(self, key: str):
+        """
+        :param key: Render key
+        :return: Unchanged output of the key or None
+        """
+        with self._lock:
+            rows = self._connection.execute('SELECT path, size, mtime_ns FROM renders WHERE key = ?',
+                                            (key,)).fetchall()
+        return next((Path(path) for path, size, mtime_ns in rows if self._unchanged(path, size, mtime_ns)), None)
+
+    def is_stale(self, output: Path, key: str) -> bool:
+        """
+        :return: True if output was rendered with other parameters
+        """
+        with self._lock:
+            row = self._connection.execute('SELECT key FROM renders WHERE path = ?',
+                                           (str(Path(output).resolve()),)).fetchone()
+        return row is not None and row[0] != key
+
+    def reuse(self, key: str, output: Path) -> bool:
+        """
+        Link or copy a previous render of the key to output
+        :return: True on a cache hit
+        """
+        output = Path(output).resolve()
+        found = self.find(key)
+        if found is None or found == output:
+            return False
+        info(f'RENDER CACHE HIT {found} -> {output}')
+        link_or_copy(found, output)
+        self.add(key, output)
+        return True
+
+
+def get_render_cache() -> RenderCache:
+    """
+    :return: Render cache shared by all tasks
+    """
+    global _render_cache
+    with _render_cache_lock:
+        if _render_cache is None:
+            _render_cache = RenderCache()
+        return _render_cache
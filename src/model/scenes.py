@@ -0,0 +1,89 @@
+from math import ceil
+from re import search
+
+from src.model.probe import file_key, read_cache, write_cache
+from src.resources.paths import ffmpeg_path
+
+scene_threshold = 0.3  # Default scene score, 0 is identical and 1 a completely different frame
+scene_height = 144  # Scores are computed on a small copy, detection is cheap and noise is ignored
+scene_threads = 2  # Decoder threads of a detection pass, the scheduler reserves them
+
+
+def scene_command(file, threshold: float) -> list:
+    """
+    Decode the first video stream, score frame differences on a downscaled copy and list the cuts
+    :param file: Video file
+    :param threshold: Minimum scene score of a cut
+    :return: ffmpeg arguments, the timestamps of the cuts are written to stdout as framecrc
+    """
+    return [ffmpeg_path(), '-hide_banner', '-threads', str(scene_threads), '-i', str(file), '-map', '0:v:0', '-an',
+            '-sn', '-dn', '-vf', f"scale=-2:{scene_height},select='gt(scene\\,{threshold})'",
+            '-fps_mode', 'passthrough', '-f', 'framecrc', '-']
+
+
+def parse_framecrc(output: str) -> list:
+    """
+    :param output: ffmpeg framecrc of one stream, "#tb 0: 1/1000" and lines of "stream, dts, pts, duration, size, hash"
+    :return: Timestamps of the frames in seconds
+    """
+    time_base = search(r'(?m)^#tb 0: (\d+)/(\d+)', output)
+    if not time_base:
+        return []
+    numerator, denominator = map(int, time_base.groups())
+    return [int(line.split(',')[2]) * numerator / denominator for line in output.splitlines()
+            if line.strip() and not line.startswith('#')]
+
+
+def _cache_name(file, threshold: float) -> str:
+    return f'{file_key(file)}.scenes2.{threshold}.json'  # scenes2, earlier entries were shifted by the start time
+
+
+def cached_scene_changes(file, threshold: float = scene_threshold):
+    """
+    :param file: Video file
+    :param threshold: Minimum scene score of a cut
+    :return: Sorted cut positions in seconds of an earlier detection, None if the file was not detected yet
+    """
+    times = read_cache(_cache_name(file, threshold))
+    return None if times is None else tuple(times)
+
+
+def remember_scene_changes(file, threshold: float, output: str) -> tuple:
+    """
+    Parse and cache the output of scene_command
+    :param file: Video file
+    :param threshold: Minimum scene score of a cut
+    :param output: framecrc of the detection pass
+    :return: Sorted cut positions in seconds
+    """
+    # Without -copyts ffmpeg already reports positions from the start of the input like ffmpeg -ss
+    times = sorted(round(time, 3) for time in parse_framecrc(output))
+    write_cache(_cache_name(file, threshold), times)
+    return tuple(times)
+
+
+def plan_clips(changes: tuple, start: float, end: float, min_length: float = 0, max_length: float = 0) -> list:
+    """
+    Split a range at scene cuts
+    :param changes: Sorted scene cut positions
+    :param start: Start of the range in seconds
+    :param end: End of the range in seconds
+    :param min_length: Shorter scenes are joined with the following scene, 0 keeps every scene
+    :param max_length: Longer scenes are split in equal parts, 0 keeps every scene
+    :return: List of (start, end) in seconds
+    """
+    if end <= start:
+        raise ValueError(f'Range ends before it starts {start}-{end}')
+    cuts = [start]
+    for change in changes:
+        if start < change < end and change - cuts[-1] >= max(min_length, 0.001):
+            cuts.append(change)
+    if len(cuts) > 1 and end - cuts[-1] < min_length:
+        cuts.pop()  # The last scene is joined with the previous one
+    cuts.append(end)
+    clips = []
+    for clip_start, clip_end in zip(cuts, cuts[1:]):
+        parts = max(1, ceil((clip_end - clip_start) / max_length)) if max_length else 1
+        length = (clip_end - clip_start) / parts
+        clips += [(round(clip_start + i * length, 3), round(clip_start + (i + 1) * length, 3)) for i in range(parts)]
+    return clips
@@ -0,0 +1,174 @@
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from logging import info
+from os import cpu_count
+from threading import Thread, Condition, Lock
+
+
+class _WorkItem:
+    def __init__(self, job, function, threads: int):
+        self.job = job
+        self.function = function
+        self.threads = threads
+        self.future = Future()
+
+
+class Scheduler:
+    """
+    Run work items of all jobs on a bounded pool of worker threads.
+    Each item reserves the number of threads its encoder uses, items start while the reserved total fits
+    into the capacity. Higher priorities run first, jobs of the same priority take turns (FIFO per job).
+    """
+
+    def __init__(self, capacity: int = None):
+        """
+        :param capacity: Number of threads that may be busy at once, core count by default
+        """
+        self.capacity = max(1, capacity or cpu_count() or 1)
+        self.load_limit = None  # Lower capacity while the machine is busy, set by the governor
+        self.item_limit = None  # Items that may run at once, like files encoded at once
+        self._queues = {}  # priority -> OrderedDict(job -> deque of work items)
+        self._reserved = 0
+        self._running = 0
+        self._condition = Condition()
+        self._workers = []
+        self._add_workers()
+
+    def _add_workers(self):
+        # At most one worker per thread of capacity or per item of the item limit can be busy at once
+        while len(self._workers) < max(self.capacity, self.item_limit or 0):
+            worker = Thread(target=self._work, daemon=True)
+            self._workers.append(worker)
+            worker.start()
+
+    def set_capacity(self, capacity: int):
+        """
+        Change the number of threads that may be busy at once
+        :param capacity: New capacity
+        """
+        with self._condition:
+            self.capacity = max(1, capacity)
+            self._add_workers()
+            self._condition.notify_all()
+
+    def set_load_limit(self, limit):
+        """
+        Limit the threads below the capacity, running items are not stopped
+        :param limit: Thread limit or None for the full capacity
+        """
+        with self._condition:
+            self.load_limit = limit
+            self._condition.notify_all()
+
+    def set_item_limit(self, limit):
+        """
+        Limit the items that run at once, encoders get an equal share of the capacity
+        :param limit: Item limit or None for no limit
+        """
+        with self._condition:
+            self.item_limit = max(1, limit) if limit else None
+            self._add_workers()
+            self._condition.notify_all()
+
+    @property
+    def thread_budget(self) -> int:
+        """
+        :return: Threads an item may use, the capacity shared by the items of the item limit
+        """
+        return max(1, self.capacity // self.item_limit) if self.item_limit else self.capacity
+
+    @property
+    def reserved(self) -> int:
+        """
+        :return: Threads of the running items
+        """
+        return self._reserved
+
+    def submit(self, job, function: callable, priority: int = 0, threads: int = 1) -> Future:
+        """
+        Queue a work item
+        :param job: Owner of the item, used for fairness and cancellation
+        :param function: Called without arguments in a worker thread
+        :param priority: Higher priorities are started first
+        :param threads: Number of threads the item keeps busy
+        :return: Future of the function result
+        """
+        item = _WorkItem(job, function, max(1, threads))
+        with self._condition:
+            self._queues.setdefault(priority, OrderedDict()).setdefault(job, deque()).append(item)
+            self._condition.notify()
+        return item.future
+
+    def cancel(self, job):
+        """
+        Cancel all queued items of a job, running items are stopped by the job itself
+        :param job: Owner of the items
+        """
+        with self._condition:
+            for jobs in self._queues.values():
+                for item in jobs.pop(job, ()):
+                    item.future.cancel()
+            self._remove_empty()
+
+    def _remove_empty(self):
+        for priority in [p for p, jobs in self._queues.items() if not jobs]:
+            del self._queues[priority]
+
+    def _next_item(self):
+        """
+        Take the next item if it fits into the free capacity
+        :return: Work item or None
+        """
+        if not self._queues:
+            return None
+        jobs = self._queues[max(self._queues)]
+        job, items = next(iter(jobs.items()))
+        if self.item_limit and self._running >= self.item_limit:
+            return None
+        # An oversized item may run alone, otherwise it would never start
+        if self._running and self._reserved + items[0].threads > min(self.capacity, self.load_limit or self.capacity):
+            return None
+        item = items.popleft()
+        if items:
+            jobs.move_to_end(job)  # Next job's turn
+        else:
+            del jobs[job]
+            self._remove_empty()
+        return item
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while (item := self._next_item()) is None:
+                    self._condition.wait()
+                self._reserved += item.threads
+                self._running += 1
+
+            try:
+                if item.future.set_running_or_notify_cancel():
+                    try:
+                        item.future.set_result(item.function())
+                    except BaseException as e:
+                        item.future.set_exception(e)
+            finally:
+                with self._condition:
+                    self._reserved -= item.threads
+                    self._running -= 1
+                    self._condition.notify_all()
+
+
+_scheduler = None
+_scheduler_lock = Lock()
+
+
+def get_scheduler() -> Scheduler:
+    """
+    Get the global scheduler, create it on first use
+    :return: Scheduler shared by all tasks
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler()
+            info(f'Scheduler capacity {_scheduler.capacity}')
+        return _scheduler
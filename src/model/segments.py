@@ -0,0 +1,121 @@
+import json
+from math import ceil
+from os import replace
+from pathlib import Path
+from shlex import split
+from threading import Lock
+
+min_segment_duration = 2.0
+checkpoint_duration = 300.0  # Longest segment, at most this much encoding is lost when a job is stopped
+manifest_name = 'manifest.json'
+machine_arguments = ('-threads', '-tile-columns')  # Depend on the machine, not on the encoded result
+
+
+def segment_key(command: list) -> list:
+    """
+    :param command: ffmpeg arguments of a segment
+    :return: Arguments that identify the result, without the ffmpeg binary and the thread options
+    """
+    key = []
+    arguments = iter(command[1:])
+    for argument in arguments:
+        if argument in machine_arguments:
+            next(arguments, None)  # Value of the option
+        else:
+            key.append(argument)
+    return key
+
+
+def plan_segments(keyframes: tuple, start: float, end: float, count: int) -> list:
+    """
+    Split a range at keyframes into segments of about the same length
+    :param keyframes: Sorted keyframe positions
+    :param start: Start of the range in seconds
+    :param end: End of the range in seconds
+    :param count: Number of segments, raised so no segment is longer than checkpoint_duration
+    :return: List of (start, end)
+    """
+    count = max(count, ceil((end - start) / checkpoint_duration))
+    count = max(1, min(count, int((end - start) / min_segment_duration)))
+    inside = [k for k in keyframes if start + min_segment_duration <= k <= end - min_segment_duration]
+    bounds = [start]
+    for i in range(1, count):
+        target = start + i * (end - start) / count
+        # Without keyframes (intra only or unknown) split anywhere, seeking is exact when encoding
+        split_point = min(inside, key=lambda k: abs(k - target)) if inside else target
+        if split_point - bounds[-1] >= min_segment_duration:
+            bounds.append(split_point)
+    bounds.append(end)
+    return list(zip(bounds, bounds[1:]))
+
+
+class SegmentManifest:
+    """
+    Record finished segments in the parts directory, so a stopped or crashed job continues where it stopped
+    """
+
+    def __init__(self, directory: Path, source_key: str, plan: callable):
+        """
+        :param directory: Parts directory
+        :param source_key: Identity of the source file, a changed source starts over
+        :param plan: Returns the segments if there is no manifest of the source
+        """
+        self._file = Path(directory, manifest_name)
+        self._lock = Lock()
+        self._source_key = source_key
+        try:
+            with open(self._file, encoding='UTF-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        if data.get('source') == source_key:
+            self.plan = [tuple(segment) for segment in data['plan']]
+            self._done = data['done']
+        else:
+            self.plan = plan()
+            self._done = {}
+
+    def is_done(self, output: Path, command: list) -> bool:
+        """
+        :return: True if output was finished with the same command, on any machine
+        """
+        return self._done.get(output.name) == segment_key(command) and output.is_file()
+
+    def finish(self, output: Path, command: list):
+        with self._lock:
+            self._done[output.name] = segment_key(command)
+            temp_file = self._file.with_suffix('.tmp')
+            with open(temp_file, 'w', encoding='UTF-8') as f:
+                json.dump({'source': self._source_key, 'plan': self.plan, 'done': self._done}, f)
+            replace(temp_file, self._file)
+
+
+def write_concat_list(concat_list: Path, files: list):
+    """
+    Write the file list of the concat demuxer
+    :param concat_list: List file
+    :param files: Files to join in order
+    """
+    with open(concat_list, 'w', encoding='UTF-8') as f:
+        for file in files:
+            f.write("file '%s'\n" % Path(file).as_posix().replace("'", "'\\''"))
+
+
+def join_command(ffmpeg_path: str, concat_list: Path, file_input: Path, start: float, end: float,
+                 audio_option: str, file_output: Path) -> list:
+    """
+    Join video pieces without encoding and add the audio of the source range
+    :param ffmpeg_path: ffmpeg binary
+    :param concat_list: List of the pieces
+    :param file_input: Source of the audio
+    :param start: Start of the range in seconds
+    :param end: End of the range in seconds
+    :param audio_option: Audio arguments, input 0 is the source
+    :param file_output: Output file
+    :return: ffmpeg arguments
+    """
+    # Pieces are input 0, audio of the source is input 1
+    return [ffmpeg_path, '-f', 'concat', '-safe', '0', '-i', str(concat_list),
+            '-ss', f'{start:.6f}', '-t', f'{end - start:.6f}', '-i', str(file_input),
+            '-map', '0:v:0', '-c:v', 'copy', *split(audio_option.replace('0:a:', '1:a:')),
+            str(file_output)]
@@ -0,0 +1,107 @@
+from logging import info
+from pathlib import Path
+from shlex import split
+
+from src.model.probe import MediaInfo
+from src.model.segments import write_concat_list, join_command
+
+# Encoders that reproduce the source codec for the re-encoded partial GOPs
+smart_encoders = {'h264': '-c:v libx264 -crf 16 -preset medium',
+                  'hevc': '-c:v libx265 -crf 18 -preset medium',
+                  'vp9': '-c:v libvpx-vp9 -crf 20 -b:v 0 -row-mt 1',
+                  'vp8': '-c:v libvpx -crf 8 -b:v 20M',
+                  'av1': '-c:v libaom-av1 -crf 20 -b:v 0 -cpu-used 6',
+                  'mpeg2video': '-c:v mpeg2video -q:v 2',
+                  'mpeg4': '-c:v mpeg4 -q:v 2'}
+# MPEG-TS keeps parameter sets in band, so pieces from different encoders can be joined
+annexb_codecs = ('h264', 'hevc', 'mpeg2video')
+keyframe_tolerance = 0.001
+
+
+def plan_smart_cut(keyframes: tuple, start: float, end: float) -> list:
+    """
+    Split a range into pieces, only pieces before the first and after the last keyframe are encoded
+    :param keyframes: Sorted keyframe positions
+    :param start: Start of the range in seconds
+    :param end: End of the range in seconds
+    :return: List of (copy, start, end), copy is False for pieces that need to be encoded
+    """
+    inside = [k for k in keyframes if start - keyframe_tolerance <= k <= end + keyframe_tolerance]
+    if len(inside) < 2:
+        return [(False, start, end)]  # Too short for copying
+
+    first, last = inside[0], inside[-1]
+    pieces = []
+    if first - start > keyframe_tolerance:
+        pieces.append((False, start, first))
+    pieces.append((True, max(start, first), last))
+    if end - last > keyframe_tolerance:
+        pieces.append((False, last, end))
+    return pieces
+
+
+def encoder_arguments(media_info: MediaInfo) -> list:
+    """
+    Get encoder arguments matching the source stream
+    :param media_info: Source information
+    :return: ffmpeg arguments or None if the codec is not supported
+    """
+    if media_info.video_codec not in smart_encoders:
+        return None
+    arguments = split(smart_encoders[media_info.video_codec])
+    if media_info.pix_fmt:
+        arguments += ['-pix_fmt', media_info.pix_fmt]
+    if media_info.video_codec == 'h264' and media_info.video_profile:
+        profile = media_info.video_profile.lower().replace('constrained ', '')
+        if profile in ('baseline', 'main', 'high', 'high10', 'high422', 'high444'):
+            arguments += ['-profile:v', profile]
+        if media_info.video_level:
+            arguments += ['-level:v', f'{media_info.video_level / 10:.1f}']
+    return arguments
+
+
+def piece_extension(media_info: MediaInfo) -> str:
+    return '.ts' if media_info.video_codec in annexb_codecs else '.mkv'
+
+
+def smart_cut_commands(ffmpeg_path: str, file_input: Path, media_info: MediaInfo, keyframes: tuple, start: float,
+                       end: float, temp_path: str, audio_option: str, file_output: Path) -> list:
+    """
+    Build the commands of a smart cut, the last command joins the pieces and adds the audio
+    :param ffmpeg_path: ffmpeg binary
+    :param file_input: Source video
+    :param media_info: Source information
+    :param keyframes: Keyframe positions of the source
+    :param start: Start in seconds
+    :param end: End in seconds
+    :param temp_path: Directory for the pieces
+    :param audio_option: Audio arguments, input 0 is the source
+    :param file_output: Output file
+    :return: List of (command, output, duration)
+    """
+    encoder = encoder_arguments(media_info)
+    pieces = plan_smart_cut(keyframes, start, end)
+    if encoder is None:
+        info(f'SMART CUT NOT SUPPORTED FOR {media_info.video_codec}, COPY')
+        pieces = [(True, start, end)]
+    info(f'SMART CUT PIECES {pieces}')
+
+    commands = []
+    concat_list = Path(temp_path, 'pieces.txt')
+    for i, (copy, piece_start, piece_end) in enumerate(pieces):
+        piece_output = Path(temp_path, f'{i:03d}' + piece_extension(media_info))
+        if copy:
+            # -t ends in decode order and drops B-frames shown before the last keyframe, -to with -copyts ends on
+            # the packet timestamps of the source, which include the container start time
+            cut = ['-to', f'{piece_end + media_info.start_time:.6f}', '-copyts', '-avoid_negative_ts', 'make_zero',
+                   '-c:v', 'copy']
+        else:
+            cut = ['-t', f'{piece_end - piece_start:.6f}', *encoder]
+        commands.append(([ffmpeg_path, '-y', '-ss', f'{piece_start:.6f}', '-i', str(file_input), *cut,
+                          '-map', '0:v:0', '-an', '-sn', str(piece_output)],
+                         piece_output, piece_end - piece_start))
+
+    write_concat_list(concat_list, [piece_output for _, piece_output, _ in commands])
+    commands.append((join_command(ffmpeg_path, concat_list, file_input, start, end, audio_option, file_output),
+                     file_output, end - start))
+    return commands
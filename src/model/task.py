@@ -1,23 +1,58 @@
 import io
-import json
-import locale
+import os
+from collections import deque
+from concurrent.futures import wait
+from functools import partial
 from logging import info, exception
-from os import startfile
 from pathlib import Path
 from re import error
-from subprocess import Popen, PIPE, STDOUT, getoutput
+from secrets import token_hex
+from shlex import split
+from shutil import rmtree
+from subprocess import Popen, PIPE, STDOUT, DEVNULL
+from sys import platform
 from tempfile import TemporaryDirectory
-from threading import Thread, Semaphore
-from logger_default import Logger
-from PIL import Image
+from threading import Thread, Semaphore, Lock, Event
+from time import perf_counter
 
+from src.model.capabilities import get_capabilities, check_job
+from src.model.encoder_profile import encoder_profile
+from src.model.filter_graph import fan_out_graph
+from src.model.frame_export import FrameExport, sampling_arguments
+from src.model.governor import get_governor, policies, interactive_class
+from src.model.image_sequence import ImageSequence, read_header
+from src.model.job_store import JobStore, pending_state, running_state, done_state, failed_state
+from src.model.probe import probe, keyframes, file_key
+from src.model.progress import Progress, ProgressChannel, ProgressParser, progress_arguments, out_time, \
+    block_fps, block_speed, is_progress_line, stderr_progress_arguments
+from src.model.render_cache import get_render_cache, fingerprint, render_key
+from src.model.scenes import cached_scene_changes, remember_scene_changes, scene_command, scene_threads, \
+    plan_clips
+from src.model.scheduler import get_scheduler
+from src.model.segments import plan_segments, write_concat_list, join_command, SegmentManifest, \
+    checkpoint_duration
+from src.model.smart_cut import smart_cut_commands
+from src.model.telemetry import JobTelemetry, probe_stage, staging_stage, spawn_stage, first_frame_stage, \
+    encode_stage, finalize_stage
 from src.model.time_format import *
-from src.resources.commands import audio_options, image_types, digits, frame_input_ext, duration_command, \
-    fps_command, audio_codec_command, original_audio, video_options
-from src.resources.gui_texts import frames_text
+from src.resources.commands import audio_options, image_types, original_audio, \
+    video_options, segment_formats, silent_formats, audio_extensions, frame_formats
+from src.resources.gui_texts import frames_text, smart_text, original_text, balanced_text, audio_text
 from src.resources.paths import ffmpeg_path
 
 
+def open_directory(path: str):
+    """
+    Show directory in the file browser of the platform
+    :param path: Directory path
+    """
+    if platform == 'win32':
+        from os import startfile
+        startfile(path)
+    else:
+        Popen(('open' if platform == 'darwin' else 'xdg-open', str(path)))
+
+
 class Task(Thread):
     """
     Run conversion command in thread executor
@@ -30,32 +65,72 @@ class Task(Thread):
                  webm_input: str,
                  scale_input: str,
                  audio_selection: str,
-                 video_selection: str,
+                 video_selection,
                  path: str,
                  files: list,
                  remove_task: callable,
-                 bar):
+                 bar,
+                 priority: int = 0,
+                 show_result: bool = True,
+                 segments: int = 0,
+                 tier: str = balanced_text,
+                 job_store: JobStore = None,
+                 job_id: int = None,
+                 ranges: list = None,
+                 scene_threshold: float = 0,
+                 min_clip: float = 0,
+                 max_clip: float = 0,
+                 frame_sampling: str = '',
+                 frame_format: str = 'png',
+                 job_class: str = interactive_class):
 
         Thread.__init__(self)
-        # GUI
-        self._set_total_frames = bar.set_total_frames
-        self._set_current_frame_nr = bar.set_current_frame_nr
+        # GUI, updates are coalesced so the bar gets at most about 10 per second
+        self._progress_channel = ProgressChannel(bar.set_progress)
         self._remove_task = remove_task
 
         self.input_framerate = input_framerate
-        self.start_time = start_time
-        self.end_time = end_time
+        # Several (start, end) ranges of each file are cut from one decode, start_time and end_time is the first
+        self.ranges = tuple(tuple(time_range) for time_range in ranges) if ranges else ((start_time, end_time),)
+        self.start_time, self.end_time = self.ranges[0]
         self.hardsub = hardsub
         self.webm_input = webm_input
         self.scale_input = scale_input
         self.audio_selection = audio_selection
-        self.video_selection = video_selection
+        # One or several formats, all formats except smart cut are written from one decode
+        self.video_selections = tuple(video_selection) if isinstance(video_selection, (list, tuple)) \
+            else (video_selection,)
+        self.video_selection = self.video_selections[0]
         self.path = path
         self.files = files
-        self._process = None
-        self._current_file = None
+        self.priority = priority
+        self.show_result = show_result
+        self.segments = segments  # Encode long ranges in parallel segments, 0 only splits at checkpoints, 1 is off
+        self.tier = tier  # Encoder speed/quality
+        # Split the ranges into clips at scene changes, 0 is off. Clip lengths in seconds, 0 is unlimited.
+        self.scene_threshold = scene_threshold
+        self.min_clip = min_clip
+        self.max_clip = max_clip
+        # Frames format: all frames, keyframes, every Nth frame or a fixed rate, written as png, jpg or webp
+        self.frame_sampling = frame_sampling
+        self.frame_format = frame_format
+        self.job_class = job_class  # Resource policy of the ffmpeg processes
+        # Encoder arguments of each format and audio codec, equivalents replace encoders ffmpeg does not have
+        self._video_encoders = {selection: option[1] for selection, option in video_options.items()}
+        self._audio_options = audio_options
+        self.job_id = job_id  # Record of the job in job_store
+        self._job_store = job_store
+        self.error = None
+        self.outputs = []  # Written files
+        self._processes = {}  # Output file -> running process, Event set when _execute cleaned it up
+        self._part_token = token_hex(4)  # Temporary outputs of other tasks writing the same output are not touched
+        self._totals = {}  # Output file -> seconds of output
+        self._done = {}
+        self._rates = {}  # Output file -> running progress block
+        self._progress_lock = Lock()
         self._closed = False
         self._closed_semaphore = Semaphore(1)
+        self._telemetry = JobTelemetry(job_id, str(Path(path, files[0])) if files else path)
         self.start()
 
     def run(self):
@@ -65,204 +140,751 @@ class Task(Thread):
         """
         try:
             info('Start Run')
+            self._set_job_state(running_state)
+            with self._telemetry.stage(probe_stage):  # Fail before anything is started
+                source_codecs = ()
+                if smart_text in self.video_selections:  # Partial GOPs are encoded with the codec of the source
+                    source_codecs = tuple(self._probe(Path(self.path, file)).video_codec for file in self.files
+                                          if Path(file).suffix not in image_types)
+                self._video_encoders, self._audio_options = check_job(
+                    get_capabilities(), self.video_selections, self.audio_selection, self.tier, self.frame_sampling,
+                    self.scene_threshold, source_codecs)
+            self._telemetry.count('input_bytes', sum(Path(self.path, file).stat().st_size for file in self.files))
+            scheduler = get_scheduler()
+            futures = []
             # Load frames
-            self._convert_frames()
-            self._convert_videos()
+            frames = [x for x in self.files if Path(x).suffix in image_types]
+            if len(frames) > 1:
+                selections = self._frame_selections()
+                futures.append(scheduler.submit(self, partial(self._convert_frames, frames), self.priority,
+                                                self._threads(Path(self.path, sorted(frames)[0]), selections)))
+            # Load videos, files run in parallel if the scheduler has free threads
+            files = [x for x in self.files if Path(x).suffix not in image_types]
+            info(f'Convert videos: {files}')
+            joins = []
+            for file_input in files:
+                if self._use_segments(Path(self.path, file_input)):
+                    segment_futures, join = self._split_video(file_input)
+                    futures += segment_futures
+                    joins.append(join)
+                    continue
+                ranges = self._file_ranges(Path(self.path, file_input))
+                if self._closed:  # Stopped during scene detection
+                    break
+                for selections in self._selection_groups(Path(self.path, file_input)):
+                    if selections == (audio_text,):  # Single threaded, many files run at once
+                        futures += [scheduler.submit(self, partial(self._convert_audio, file_input, time_range),
+                                                     self.priority, 1) for time_range in ranges]
+                        continue
+                    threads = self._threads(Path(self.path, file_input), selections)
+                    # Stream copies, frames and scene clips are cut separately and run in parallel
+                    if selections in ((smart_text,), (frames_text,)) or self.scene_threshold:
+                        futures += [scheduler.submit(self, partial(self._convert_video, file_input, selections,
+                                                                   (time_range,)), self.priority, threads)
+                                    for time_range in ranges]
+                        continue
+                    futures.append(scheduler.submit(self, partial(self._convert_video, file_input, selections,
+                                                                  ranges), self.priority, threads))
+            wait(futures)
 
             if self._closed:
                 return
+            for future in futures:
+                future.result()  # Raise conversion errors
+            for join in joins:
+                join()
             # Set bar to full
-            self._set_total_frames(10)
-            self._set_current_frame_nr(11)
+            self._progress_channel.publish(Progress(1, 1))
+            self._progress_channel.flush()
+            self._set_job_state(done_state)
             # Open directory when finished
-            startfile(self.path)
+            if self.show_result:
+                open_directory(self.path)
             self._remove_task(self)
         except Exception as e:
+            self.error = e
             exception(e)
+            self._set_job_state(failed_state, str(e))
+
+    def _set_job_state(self, state: str, error: str = None):
+        if state != running_state:
+            self._telemetry.count('output_bytes', sum(self._output_size(output) for output in self.outputs))
+            self._telemetry.finish(state, error)
+        if self._job_store:
+            self._job_store.set_state(self.job_id, state, self.outputs, error)
+
+    @staticmethod
+    def _output_size(output: Path) -> int:
+        """
+        :return: Bytes of an output file or of the images in a frames directory
+        """
+        if '%' in output.name:  # Frame number pattern
+            return sum(file.stat().st_size for file in output.parent.glob('*') if file.is_file())
+        return output.stat().st_size if output.is_file() else 0
 
-    def _convert_frames(self):
+    def _probe(self, file):
+        with self._telemetry.stage(probe_stage):
+            return probe(file)
+
+    def _keyframes(self, file):
+        with self._telemetry.stage(probe_stage):
+            return keyframes(file)
+
+    def _convert_frames(self, frames: list):
         """
         Convert frames to video
+        :param frames: Image files
+        """
+        with self._telemetry.stage(staging_stage):
+            sequence = ImageSequence([Path(self.path, frame) for frame in sorted(frames)])
+        selections = self._frame_selections()
+        duration = len(frames) / float(self.input_framerate or 25)  # ffmpeg default input rate
+        self._run_command(Path(self.path, frames[0]), [(self.ranges[0], frames[0])], duration, selections,
+                          sequence.input_arguments(), sequence.feed)
+
+    def _file_ranges(self, file_input: Path) -> tuple:
+        """
+        :param file_input: Input file
+        :return: Ranges to cut, split into scene clips if scene detection is on
+        """
+        if not self.scene_threshold or not self._probe(file_input).has_video:
+            return self.ranges
+        changes = cached_scene_changes(file_input, self.scene_threshold)
+        if changes is None:
+            # The detection pass decodes the whole file, the scheduler bounds it like an encode
+            future = get_scheduler().submit(self, partial(self._detect_scenes, file_input), self.priority,
+                                            scene_threads)
+            wait([future])
+            if self._closed:
+                return ()
+            changes = future.result()
+        clips = []
+        for start_time, end_time in self.ranges:
+            end = time_to_seconds(end_time) if end_time != zero_time else self._probe(file_input).duration
+            clips += [(seconds_to_time(start), seconds_to_time(end))
+                      for start, end in plan_clips(changes, time_to_seconds(start_time), end,
+                                                   self.min_clip, self.max_clip)]
+        info(f'SCENE CLIPS {file_input} {len(clips)}')
+        return tuple(clips)
+
+    def _detect_scenes(self, file_input: Path) -> tuple:
+        """
+        Run the scene detection pass of a file, governed and stopped like an encode
+        :param file_input: Video file
+        :return: Sorted cut positions in seconds, None if the task was stopped
+        """
+        output = []
+        self._execute(scene_command(file_input, self.scene_threshold), Path(f'{file_input}.scenes'),
+                      self._probe(file_input).duration, outputs=(), threads=scene_threads,
+                      drain=lambda stdout: output.append(stdout.read().decode('UTF-8', errors='replace')))
+        if self._closed:
+            return None
+        info(f'SCENES DETECTED {file_input}')
+        return remember_scene_changes(file_input, self.scene_threshold, ''.join(output))
+
+    def _frame_selections(self) -> tuple:
+        """
+        :return: Formats of image sequences, smart cut is not possible and the input already are frames
+        """
+        return tuple(s for s in self.video_selections if s not in (smart_text, audio_text, frames_text)) or \
+            (original_text,)
+
+    def _selection_groups(self, file_input: Path) -> list:
+        """
+        Group formats that are written by the same ffmpeg process
+        :param file_input: Input file, files without video only get the audio format
+        :return: List of format tuples
         """
-        frames = [x for x in self.files if Path(x).suffix in image_types]
-        if len(frames) > 1:
-            with TemporaryDirectory() as temp_path:
-                self._copy_files(temp_path, frames, frame_input_ext)
-                self._set_total_frames(len(frames))
-                self._run_command(Path(temp_path, '%%%sd' % digits + frame_input_ext), frames[0])
-
-    def _convert_videos(self):
-        """
-        Convert videos
-        """
-        info('Convert videos')
-        files = [x for x in self.files if Path(x).suffix not in image_types]
-        info(f'Convert videos: {files}')
-        # Load videos
-        for file_input in files:
-            info(f'Convert: {file_input}')
-            file_input = Path(self.path, file_input)
-            info(f'Convert File: {file_input}')
-            # Convert the video
-            self._set_total_frames(self._get_duration(file_input) * self._get_video_fps(file_input))
-            info('Frames set')
-            self._run_command(file_input,
-                              f'_{file_input.stem}_[{format_time(self.start_time)}_{format_time(self.end_time)}]')
+        if not self._probe(file_input).has_video:
+            return [(audio_text,)]
+        separate = (smart_text, audio_text, frames_text)  # Stream copy, no video decoding, frames on stdout
+        shared = tuple(selection for selection in self.video_selections if selection not in separate)
+        return ([shared] if shared else []) + \
+            [(selection,) for selection in separate if selection in self.video_selections]
+
+    def _convert_video(self, file_input: str, selections: tuple, ranges: tuple):
+        """
+        Convert a video
+        :param file_input: Video file name
+        :param selections: Video formats
+        :param ranges: (start, end) ranges, each gets an output per format
+        """
+        info(f'Convert: {file_input}')
+        file_input = Path(self.path, file_input)
+        info(f'Convert File: {file_input}')
+        # Outputs start at 0 and run in parallel, the progress is the longest range
+        duration = max(self._get_duration(file_input, time_range) for time_range in ranges)
+        self._run_command(file_input, [(time_range, self._output_name(file_input, time_range))
+                                       for time_range in ranges], duration, selections)
+
+    def _convert_audio(self, file_input: str, time_range: tuple):
+        """
+        Write the selected audio track without demuxing or decoding video
+        :param file_input: File name
+        :param time_range: Start and end time
+        """
+        file_input = Path(self.path, file_input)
+        output = self._output_path(file_input, self._output_name(file_input, time_range), audio_text)
+        with self._closed_semaphore:
+            if self._closed:
+                return
+        # Outside of the semaphore, reusing a render copies it and stop() does not wait for the copy
+        if not self._prepare_output(file_input, audio_text, output, time_range):
+            return
+        if not self._probe(file_input).has_audio:
+            raise RuntimeError(f'NO AUDIO STREAM: {file_input}')
+        duration = self._get_duration(file_input, time_range)
+        command = [ffmpeg_path(), '-vn', '-sn', '-dn', '-ss', f'{time_to_seconds(time_range[0]):.6f}',
+                   '-i', str(file_input), '-t', f'{duration:.6f}', '-vn', '-sn', '-dn',
+                   *split(self.get_audio_option(file_input, audio_only=True)), str(output)]
+        info(f'{command}')
+        self._execute(command, output, duration)
+        if not self._closed:
+            self._remember_render(file_input, audio_text, output, time_range)
+
+    def _use_segments(self, file_input: Path) -> bool:
+        """
+        Ranges longer than checkpoint_duration are encoded in segments by default, even if they run one after
+        another, so a stopped job continues from the finished segments
+        :param file_input: Input file
+        :return: True if the file is encoded in segments, only a single range and format of a video can be split
+        """
+        if self.segments == 1 or len(self.ranges) != 1 or self.scene_threshold or \
+                self.video_selections != (self.video_selection,) or self.video_selection not in segment_formats or \
+                not self._probe(file_input).has_video:
+            return False
+        return self.segments > 1 or self._get_duration(file_input, self.ranges[0]) > checkpoint_duration
+
+    def _split_video(self, file_input: str):
+        """
+        Encode the range of a video in parallel segments split at keyframes, the audio is added when joining.
+        Finished segments are kept in a parts directory until the join, a stopped job continues from them.
+        :param file_input: Video file name
+        :return: Futures of the segments, function that joins the segments
+        """
+        file_input = Path(self.path, file_input)
+        video_filter, _, suffix = video_options[self.video_selection]
+        file_output = Path(self.path, self._output_name(file_input, self.ranges[0]) + suffix)
+        if not self._prepare_output(file_input, self.video_selection, file_output, self.ranges[0]):
+            return [], lambda: None
+
+        media_info = self._probe(file_input)
+        start = time_to_seconds(self.start_time)
+        end = time_to_seconds(self.end_time) if self.end_time != zero_time else media_info.duration
+        parts_directory = Path(self.path, file_output.name + '.parts')  # Same drive as the output
+        parts_directory.mkdir(exist_ok=True)
+        manifest = SegmentManifest(parts_directory, file_key(file_input),
+                                   lambda: plan_segments(self._keyframes(file_input), start, end, self.segments))
+
+        futures = []
+        segment_outputs = []
+        threads = self._threads(file_input, self.video_selections)
+        for i, (segment_start, segment_end) in enumerate(manifest.plan):
+            segment_output = Path(parts_directory, f'{i:03d}{suffix}')
+            segment_command = [ffmpeg_path(), '-y', '-sn', '-ss', f'{segment_start:.6f}', '-i', str(file_input),
+                               '-t', f'{segment_end - segment_start:.6f}', '-an',
+                               '-filter_complex', video_filter.replace('<res>', self.scale_input),
+                               *self._encoder_arguments(self.video_selection, file_input),
+                               *(('-subtitles=' + str(file_input),) if self.hardsub else ()),
+                               str(segment_output)]
+            segment_outputs.append(segment_output)
+            if manifest.is_done(segment_output, segment_command):
+                info(f'SEGMENT DONE: {segment_output}')
+                self._set_total(segment_output, segment_end - segment_start)
+                self._set_current(segment_output, None)
+                continue
+            futures.append(get_scheduler().submit(self, partial(self._encode_segment, manifest, segment_command,
+                                                                segment_output, segment_end - segment_start, threads),
+                                                  self.priority, threads))
+        info(f'SEGMENTS {file_output} {len(segment_outputs)}, {len(futures)} to encode')
+
+        def join():
+            concat_list = Path(parts_directory, 'segments.txt')
+            write_concat_list(concat_list, segment_outputs)
+            self._execute(join_command(ffmpeg_path(), concat_list, file_input, start, end,
+                                       self.get_audio_option(file_input), file_output), file_output, 0)
+            if not self._closed:
+                self._remember_render(file_input, self.video_selection, file_output, self.ranges[0])
+                rmtree(parts_directory, ignore_errors=True)
+
+        return futures, join
+
+    def _encode_segment(self, manifest: SegmentManifest, command: list, segment_output: Path, duration: float,
+                        threads: int):
+        """
+        Encode a segment and record it in the manifest
+        """
+        self._execute(command, segment_output, duration, threads=threads)
+        if not self._closed:  # Terminated segments are deleted by _execute()
+            manifest.finish(segment_output, command)
+
+    @staticmethod
+    def _output_name(file_input: Path, time_range: tuple) -> str:
+        """
+        Output file name without extension
+        :param file_input: Input file
+        :param time_range: Start and end time
+        :return: Name containing the range
+        """
+        start_time, end_time = time_range
+        return f'_{file_input.stem}_[{format_time(start_time)}_{format_time(end_time)}]'
+
+    def _set_total(self, file_output: Path, duration: float):
+        """
+        Add the duration of an output to the progress bar
+        """
+        if not duration:
+            return  # Not counted, like joining segments
+        with self._progress_lock:
+            self._totals[file_output] = duration
+            self._publish_progress()
+
+    def _set_current(self, file_output: Path, block: dict):
+        """
+        Show the progress of all outputs of the task on the progress bar
+        :param file_output: Output file of the process
+        :param block: ffmpeg progress block, None if the process finished
+        """
+        with self._progress_lock:
+            if file_output not in self._totals:
+                return
+            if block is None:
+                self._done[file_output] = self._totals[file_output]
+                self._rates.pop(file_output, None)
+            else:
+                self._done[file_output] = min(out_time(block), self._totals[file_output])
+                self._rates[file_output] = block
+            self._publish_progress()
+
+    def _publish_progress(self):
+        """
+        Sum the outputs, fps and speed add up because the processes run in parallel
+        """
+        blocks = list(self._rates.values())
+        self._progress_channel.publish(Progress(sum(self._done.values()), sum(self._totals.values()),
+                                                sum(block_fps(block) for block in blocks),
+                                                sum(block_speed(block) for block in blocks),
+                                                blocks[-1].get('bitrate', '') if blocks else ''))
 
     # TODO downmix
     # https://superuser.com/questions/852400/properly-downmix-5-1-to-stereo-using-ffmpeg
 
-    def _run_command(self, file_input: Path, file_output: str):
+    def _run_command(self, file_input: Path, file_outputs: list, duration: float, selections: tuple,
+                     input_arguments: list = (), feed: callable = None):
         """
-        Check file paths, and run the command with file_input and file_output
+        Check file paths, and run one command that reads file_input once and writes an output per range and format
         :param file_input: Input file
-        :param command: Conversion command
-        :param file_output: Output file
+        :param file_outputs: List of ((start, end), output file name without extension)
+        :param duration: Expected output duration in seconds for the progress bar
+        :param selections: Video formats
+        :param input_arguments: ffmpeg input format options
+        :param feed: Writes the input to ffmpeg stdin instead of reading file_input
         """
-        info(f'_run_command {file_input} {file_output}')
+        info(f'_run_command {file_input} {file_outputs} {selections}')
+        outputs = []
         with self._closed_semaphore:
             if self._closed:
                 return
-            # Check new file_input
-            command, suffix = video_options[self.video_selection]
-            suffix = suffix.replace('%ext', file_input.suffix)  # COPY keep same ext
-            file_output += suffix
-            info(f'CONVERT {file_input} to {file_output}')
-
-            file_output = Path(self.path, file_output)
-            directory = file_output.parent  # Output directory for frames
-            if file_output.exists() or ((self.video_selection == frames_text) and directory.exists()):
-                info(f'ALREADY EXISTS: {file_output}')
-                return
-            directory.mkdir(exist_ok=True)
-
-            start_s, start_ms = self.start_time.split('.')
-            info(f'{command}')
-            command = [ffmpeg_path,
-                       '-sn' if not self.input_framerate else '',  # '-sn' Automatic stream selection
-                       ' -r ' + self.input_framerate if self.input_framerate else '',
-                       '-ss ' + start_s if self.start_time != zero_time and not self.input_framerate else '',
-                       # Seeking on input file_input is faster https://trac.ffmpeg.org/wiki/Seeking
-                       f'-i "{file_input}"',
-                       '-ss 0.' + start_ms if self.start_time != zero_time and not self.input_framerate else '',
-                       '-to ' + str(strptime(self.end_time, time_format) - strptime(start_s + '.0', time_format))
-                       if self.end_time != zero_time and not self.input_framerate else '',
-                       # Cut to end if no input is given
-                       self.get_audio_option(file_input),
-                       command.replace('<crf>', self.webm_input).replace('<res>', self.scale_input),
-                       f'-subtitles="{file_input}"' if self.hardsub else '',
-                       f'"{file_output}"'
-                       ]
-
-            # Start process
-            self._current_file = file_output
-            self._process = Popen(' '.join(command), shell=False, stdout=PIPE, stderr=STDOUT)
-        self._monitor_process(self._process)
+        # Check new file_input, outside of the semaphore, reusing a render copies it and stop() does not wait for it
+        for time_range, file_output in file_outputs:
+            for selection in selections:
+                output = self._output_path(file_input, file_output, selection)
+                info(f'CONVERT {file_input} to {output}')
+                if self._closed:
+                    return
+                if not self._prepare_output(file_input, selection, output, time_range):
+                    continue
+                outputs.append((selection, output, time_range))
+        if not outputs:
+            return
+
+        if outputs[0][0] == smart_text:
+            for selection, output, time_range in outputs:
+                self._smart_cut(file_input, output, time_range)
+                if not self._closed:
+                    self._remember_render(file_input, selection, output, time_range)
+            return
+
+        if outputs[0][0] == frames_text:
+            for _, output, time_range in outputs:
+                self._export_frames(file_input, output, time_range)
+            return
+
+        # Seeking on the input is faster https://trac.ffmpeg.org/wiki/Seeking
+        # The input is seeked to the earliest range, each output cuts its range relative to that
+        seek = 0 if self.input_framerate else int(min(time_to_seconds(start) for _, _, (start, _) in outputs))
+        audio = split(self.get_audio_option(file_input))
+        graph, video_maps = fan_out_graph([video_options[selection][0].replace('<res>', self.scale_input)
+                                           for selection, _, _ in outputs])
+        command = [ffmpeg_path(),
+                   *(('-r', self.input_framerate) if self.input_framerate else ('-sn',)),
+                   # '-sn' Automatic stream selection
+                   *(('-ss', str(seek)) if seek else ()),
+                   *input_arguments,
+                   '-i', '-' if feed else str(file_input),
+                   *(('-filter_complex', graph) if graph else ())]
+        for (selection, output, (start_time, end_time)), video_map in zip(outputs, video_maps):
+            # Output options apply to each output, no end cuts to the end
+            cut = [*(('-ss', f'{time_to_seconds(start_time) - seek:.3f}')
+                     if start_time != zero_time and not self.input_framerate else ()),
+                   *(('-to', f'{time_to_seconds(end_time) - seek:.3f}')
+                     if end_time != zero_time and not self.input_framerate else ())]
+            command += ['-map', video_map,
+                        *([] if selection in silent_formats else audio),
+                        *self._encoder_arguments(selection, file_input),
+                        *cut,
+                        *(('-subtitles=' + str(file_input),) if self.hardsub else ()),
+                        str(output)]
+        info(f'{command}')
+        self._execute(command, outputs[0][1], duration, [output for _, output, _ in outputs], feed,
+                      threads=self._threads(file_input, tuple(selection for selection, _, _ in outputs)))
+        if not self._closed:
+            for selection, output, time_range in outputs:
+                self._remember_render(file_input, selection, output, time_range)
+
+    def _export_frames(self, file_input: Path, output: Path, time_range: tuple):
+        """
+        Decode the sampled frames once, ffmpeg pipes them raw to FrameExport which compresses them in parallel
+        :param file_input: Input video
+        :param output: Output path with a frame number pattern
+        :param time_range: Start and end time
+        """
+        start_time, end_time = time_range
+        sampling_input, sampling_filter = sampling_arguments(self.frame_sampling)
+        video_filter = ','.join(f for f in (sampling_filter, video_options[frames_text][0]) if f)
+        command = [ffmpeg_path(), '-sn', *sampling_input,
+                   *(('-ss', f'{time_to_seconds(start_time):.3f}') if start_time != zero_time else ()),
+                   '-i', str(file_input),
+                   *(('-t', f'{self._get_duration(file_input, time_range):.3f}') if end_time != zero_time else ()),
+                   '-map', '0:v:0', '-an', '-dn', '-vf', video_filter.replace('<res>', self.scale_input),
+                   '-fps_mode', 'passthrough', '-pix_fmt', 'rgb24', '-f', 'image2pipe', '-c:v', 'ppm', '-']
+        info(f'{command}')
+        export = FrameExport(str(self._part_path(output)), self.frame_format)
+        self._execute(command, output, self._get_duration(file_input, time_range), drain=export.drain)
+        if not self._closed:
+            self._remember_render(file_input, frames_text, output, time_range)
+
+    def _render_key(self, file_input: Path, selection: str, time_range: tuple):
+        """
+        Identify an output by the content of the input and the parameters that change the output
+        :param file_input: Input video
+        :param selection: Video format
+        :param time_range: Start and end time
+        :return: Render key, None for image sequences and frames
+        """
+        if selection == frames_text or file_input.suffix in image_types:
+            return None
+        video_filter, encoder = video_options[selection][0], self._video_encoders[selection]
+        return render_key(fingerprint(file_input), {
+            'format': selection, 'extension': self._extension(file_input, selection),
+            'filter': video_filter.replace('<res>', self.scale_input),
+            'encoder': encoder.replace('<crf>', self.webm_input), 'tier': self.tier if '<profile>' in encoder else '',
+            'audio': '' if selection in silent_formats else self.get_audio_option(file_input, selection == audio_text),
+            'start': time_to_seconds(time_range[0]), 'end': time_to_seconds(time_range[1]),
+            'framerate': self.input_framerate, 'hardsub': bool(self.hardsub)})
+
+    def _prepare_output(self, file_input: Path, selection: str, output: Path, time_range: tuple) -> bool:
+        """
+        Skip existing outputs, reuse earlier renders and delete outputs rendered with other parameters
+        :param file_input: Input file
+        :param selection: Video format
+        :param output: Output path
+        :param time_range: Start and end time
+        :return: True if the output has to be encoded
+        """
+        key = self._render_key(file_input, selection, time_range)
+        if key and output.is_file() and get_render_cache().is_stale(output, key):
+            info(f'RENDERED WITH OTHER PARAMETERS: {output}')
+            output.unlink()
+        if output.exists() or (selection == frames_text and output.parent.exists()):
+            info(f'ALREADY EXISTS: {output}')
+            return False
+        with self._telemetry.stage(staging_stage):
+            reused = key and get_render_cache().reuse(key, output)
+        if reused:
+            self.outputs.append(output)
+            return False
+        return True
+
+    def _remember_render(self, file_input: Path, selection: str, output: Path, time_range: tuple):
+        """
+        Record a written output
+        """
+        self.outputs.append(output)
+        with self._telemetry.stage(finalize_stage):
+            key = self._render_key(file_input, selection, time_range)
+            if key:
+                get_render_cache().add(key, output)
+
+    def _output_path(self, file_input: Path, file_output: str, selection: str) -> Path:
+        """
+        Get the output file of a format, formats with the same extension get the format name appended
+        :param file_input: Input file
+        :param file_output: Output file name without extension
+        :param selection: Video format
+        :return: Output path
+        """
+        suffixes = [self._extension(file_input, s) for s in self.video_selections]
+        suffix = self._extension(file_input, selection)
+        if selection in self.video_selections and \
+                suffix in suffixes[:self.video_selections.index(selection)]:  # Copy of an mp4 and mp4
+            return Path(self.path, f'{file_output}_{selection}{suffix}')
+        return Path(self.path, file_output + suffix)
+
+    def _extension(self, file_input: Path, selection: str) -> str:
+        """
+        :return: Extension of the output, copies keep the extension of the input
+        """
+        return video_options[selection][2].replace('%ext', file_input.suffix) \
+            .replace('%audio', audio_extensions[self.audio_selection]) \
+            .replace('%frame', frame_formats[self.frame_format][1])
+
+    def _encoder_arguments(self, selection: str, file_input: Path) -> list:
+        """
+        Get the encoder arguments of a format
+        :param selection: Video format
+        :param file_input: Input file, threads depend on its resolution
+        :return: ffmpeg arguments
+        """
+        profile = self._profile(selection, file_input)
+        arguments = []
+        for argument in split(self._video_encoders[selection].replace('<crf>', self.webm_input)):
+            arguments += profile.arguments if argument == '<profile>' else (argument,)
+        return arguments
+
+    def _profile(self, selection: str, file_input: Path):
+        """
+        Get the encoder profile of a format for the resolution of the input
+        :param selection: Video format
+        :param file_input: Video or first image of a sequence
+        :return: EncoderProfile
+        """
+        if file_input.suffix in image_types:
+            width, height = read_header(file_input)[1]
+        else:
+            media_info = self._probe(file_input)
+            width, height = media_info.width, media_info.height
+        return encoder_profile(selection, width, height, self.scale_input, self.tier, get_scheduler().thread_budget)
+
+    def _threads(self, file_input: Path, selections: tuple) -> int:
+        """
+        :return: Threads the scheduler reserves for encoding file_input to selections
+        """
+        return sum(self._profile(selection, file_input).threads for selection in selections)
+
+    def _execute(self, command: list, file_output: Path, duration: float, outputs: list = None,
+                 feed: callable = None, drain: callable = None, threads: int = 1):
+        """
+        Start ffmpeg and wait until it is finished, stop() terminates the process
+        :param command: ffmpeg arguments
+        :param file_output: Output file, written to a temporary file that is renamed when ffmpeg succeeds
+        :param duration: Expected output duration in seconds for the progress bar
+        :param outputs: All output files if the process writes more than file_output, empty if it writes no file
+        :param feed: Called with ffmpeg stdin in a separate thread
+        :param drain: Called with ffmpeg stdout in a separate thread, progress and log are read from stderr
+        :param threads: Threads of the encoders, cores are pinned for them if the job class pins processes
+        """
         with self._closed_semaphore:
-            self._current_file = None
+            if self._closed:
+                return
+            self._set_total(file_output, duration)
+            # Outputs are written to temporary files and renamed when finished, a partial output is never skipped
+            parts = {output: self._part_path(output) for output in ([file_output] if outputs is None else outputs)}
+            part_arguments = {str(output): str(part) for output, part in parts.items()}
+            for output, part in parts.items():
+                if '%' in output.name:  # Frames are written to a temporary directory
+                    part.parent.mkdir(exist_ok=True)
+            command = [part_arguments.get(argument, argument) for argument in command]
+            # Progress as key=value lines on stdout, log messages are merged in. stderr if stdout is the output
+            command = [command[0], *(stderr_progress_arguments if drain else progress_arguments), *command[1:]]
+            started = perf_counter()
+            prefix, cores = get_governor().command_prefix(policies[self.job_class], threads)
+            with self._telemetry.stage(spawn_stage):
+                try:
+                    process = Popen([*prefix, *command], stdin=PIPE if feed else DEVNULL, stdout=PIPE,
+                                    stderr=PIPE if drain else STDOUT)
+                except OSError:
+                    get_governor().release(cores)
+                    raise
+            monitored = Event()  # Set when the process was reaped and its outputs renamed or deleted
+            self._processes[file_output] = (process, monitored)
+        drain_errors = []
+        log = ()
+        try:
+            if feed:
+                Thread(target=self._feed, args=(feed, process.stdin), daemon=True).start()
+            if drain:
+                drain_thread = Thread(target=self._drain, args=(drain, process, drain_errors), daemon=True)
+                drain_thread.start()
+            log = self._monitor_process(process, file_output, process.stderr if drain else process.stdout, started)
+            if drain:
+                drain_thread.join()
+        finally:
+            get_governor().release(cores)
+            with self._closed_semaphore:
+                del self._processes[file_output]
+                finished = process.returncode == 0 and not drain_errors and not self._closed
+                for output, part in parts.items():
+                    if '%' in output.name:  # Frame number pattern, the whole directory is renamed
+                        output, part = output.parent, part.parent
+                    if finished:
+                        os.replace(part, output)
+                    elif part.is_dir():
+                        rmtree(part, ignore_errors=True)
+                    elif part.is_file():
+                        part.unlink()
+                closed = self._closed
+            monitored.set()
+        if process.returncode and not closed:
+            raise RuntimeError(f'FFMPEG FAILED {process.returncode}: {file_output} {log[-1] if log else ""}')
+        if drain_errors and not closed:
+            raise RuntimeError(f'OUTPUT FAILED: {file_output} {drain_errors[0]}') from drain_errors[0]
+        self._set_current(file_output, None)
+
+    def _part_path(self, output: Path) -> Path:
+        """
+        :param output: Output file or frame number pattern
+        :return: Temporary file of the output in the same directory, the extension selects the format.
+        Frame patterns are in a temporary directory.
+        """
+        if '%' in output.name:
+            return Path(output.parent.with_name(f'{output.parent.name}.{self._part_token}.part'), output.name)
+        return output.with_name(f'{output.stem}.{self._part_token}.part{output.suffix}')
+
+    @staticmethod
+    def _drain(drain: callable, process, errors: list):
+        """
+        Read the output of ffmpeg, ffmpeg is killed if the output can't be written
+        """
+        try:
+            drain(process.stdout)
+        except Exception as e:
+            errors.append(e)
+            process.kill()
 
-    def get_audio_option(self, file_input):
+    @staticmethod
+    def _feed(feed: callable, stdin):
+        """
+        Write the input of ffmpeg, stops if ffmpeg is terminated
+        """
+        try:
+            feed(stdin)
+        except OSError as e:  # Broken pipe
+            info(f'FEED STOPPED {e}')
+        finally:
+            try:
+                stdin.close()
+            except OSError:
+                pass
+
+    def _smart_cut(self, file_input: Path, file_output: Path, time_range: tuple):
+        """
+        Cut frame accurate, encode only the partial GOPs at start and end and copy everything in between
+        :param file_input: Input file
+        :param file_output: Output file
+        :param time_range: Start and end time
+        """
+        media_info = self._probe(file_input)
+        start_time, end_time = time_range
+        start = time_to_seconds(start_time)
+        end = time_to_seconds(end_time) if end_time != zero_time else media_info.duration
+        with TemporaryDirectory() as temp_path:
+            for command, output, duration in smart_cut_commands(ffmpeg_path(), file_input, media_info,
+                                                                self._keyframes(file_input), start, end, temp_path,
+                                                                self.get_audio_option(file_input), file_output):
+                self._execute(command, output, duration)
+
+    def get_audio_option(self, file_input, audio_only: bool = False):
         """
         Get the audio command, don't convert if original audio matches selected option
         :param file_input:
+        :param audio_only: Audio only outputs copy the track if no audio is selected
         :return:
         """
-        data = getoutput(audio_codec_command % file_input)
-        data = json.loads(data)
-        streams = data.get("streams", [])
-        # Extract codec name and language
-        audio_info = [
-            {
-                "index": stream.get("index"),
-                "codec": stream.get("codec_name"),
-                "language": stream.get("tags", {}).get("language", "unknown")
-            }
-            for stream in streams
-        ]
+        if file_input.suffix in image_types:
+            return self._audio_options['no audio']
+        audio_streams = self._probe(file_input).audio_streams
+        if not audio_streams:
+            return self._audio_options['no audio']
 
         # Default is first stream
-        audio_codec = audio_info[0]["codec"]
+        audio_codec = audio_streams[0].codec
         index = 0
 
-        if len(audio_info) > 1:
-            for i, stream in enumerate(audio_info):
-                if stream["language"] == "jpn":
-                    audio_codec = stream["codec"]
-                    index = i
+        if len(audio_streams) > 1:
+            for stream in audio_streams:
+                if stream.language == "jpn":
+                    audio_codec = stream.codec
+                    index = stream.index
         selection = original_audio if audio_codec == self.audio_selection else self.audio_selection
-        audio_command = audio_options[selection].replace("<audio>", str(index))
+        if audio_only and selection == 'no audio':
+            selection = original_audio
+        audio_command = self._audio_options[selection].replace("<audio>", str(index))
         return audio_command
 
     def stop(self):
         """
-        Stop active converter thread, delete unfinished file
+        Stop active converter thread, unfinished files are deleted by _execute. Finished segments are kept for the
+        next run.
         """
         with self._closed_semaphore:
             if self._closed:
                 return
             self._closed = True
+            get_scheduler().cancel(self)  # Drop files that did not start yet
+            if self.is_alive():
+                self._set_job_state(pending_state)  # Started again with the next run
 
-            if self._process:
-                self._process.terminate()
-                self._process.wait()  # Wait for termination
-                self._current_file.unlink()
+            monitors = []
+            for process, monitored in self._processes.values():
+                process.terminate()  # Reaped by the thread that runs _monitor_process
+                monitors.append(monitored)
+        for monitored in monitors:
+            monitored.wait()
 
-    def _monitor_process(self, process):
+    def _monitor_process(self, process, file_output: Path, stream, started: float) -> deque:
         """
-        Read ffmpeg output
+        Read ffmpeg output, record the timings, frames and cpu time of the process
         :param process: process object
+        :param file_output: Output file of the process
+        :param stream: Pipe with progress and log messages
+        :param started: perf_counter before the process was started
+        :return: Last log lines of ffmpeg
         """
-        reader = io.TextIOWrapper(process.stdout, encoding='UTF-8', newline='\r')
+        parser = ProgressParser()
+        log = deque(maxlen=10)
+        last_block = None
+        reader = io.TextIOWrapper(stream, encoding='UTF-8', errors='replace')
         while line := reader.readline():
-            if data := findall(r'frame=\s*(\d+)\s+', line):
-                self._set_current_frame_nr(data[0])
+            if block := parser.feed(line):
+                if last_block is None:
+                    self._telemetry.add_time(first_frame_stage, perf_counter() - started)
+                last_block = block
+                self._set_current(file_output, block)
+            elif line.strip() and not is_progress_line(line):
+                log.append(line.strip())
 
-        result = process.communicate()
+        if hasattr(os, 'wait4'):  # Resource usage of the process, not on windows
+            try:
+                _, status, usage = os.wait4(process.pid, 0)
+                process.returncode = os.waitstatus_to_exitcode(status)
+                self._telemetry.add_usage(usage)
+            except ChildProcessError:  # Already reaped when terminate() polled the exited process
+                pass
+        result = process.wait()
+        self._telemetry.add_time(encode_stage, perf_counter() - started)
+        if last_block:
+            self._telemetry.count('frames', int(last_block.get('frame', 0) or 0))
         info(f'FFMPEG RETURN: {result}')
+        return log
 
-    def _copy_files(self, temp_path: str, files: list, ext):
-        """
-        Copy files to temporary directory
-        :param temp_path:
-        :param path:
-        :param files:
-        :param ext:
-        :return:
-        """
-        for i, file in enumerate(sorted(files)):  # , key=lambda x: int(splitext(x)[0])
-            file_name = digits * '0' + str(i + 1)
-            with Image.open(Path(self.path, file)) as image:
-                if image.mode != 'RGB':
-                    image = image.convert('RGB')
-                image.save(Path(temp_path, file_name[-digits:] + ext), quality=100)
-
-    def _get_video_fps(self, file):
-        output = getoutput(fps_command % file)
-        info(f'Get FPS {output}')
-        if not output:
-            return 1  # in case of audio
-
-        output = output.strip()
-        if '/' in output:
-            output = output.split('/')
-            if len(output) == 2:
-                return float(output[0]) / float(output[1])
-            elif len(output) == 3:
-                return float(output[0]) / float(output[1].split('\n')[0])
-            else:
-                info(f'GET FPS FAIL {output}')
-
-        info(f'UNKNOWN FRAMERATE VALUE {output}')
-        raise NotImplementedError
-
-    def _get_duration(self, file):
+    def _get_duration(self, file, time_range: tuple):
         """
-        Get video duration in seconds
+        Get the duration of a range in seconds
         :param file: Video file_input
+        :param time_range: Start and end time
         :return: Duration in seconds
         """
-        locale.setlocale(locale.LC_ALL, 'en_US.utf8')
-        result = strptime(self.end_time if self.end_time != zero_time else getoutput(duration_command % file),
-                          time_format) - \
-                 strptime(self.start_time, time_format)
-        return result.total_seconds()
+        start_time, end_time = time_range
+        end = time_to_seconds(end_time) if end_time != zero_time else self._probe(file).duration
+        return end - time_to_seconds(start_time)
@@ -0,0 +1,197 @@
+import json
+from collections import defaultdict
+from contextlib import contextmanager, ExitStack
+from logging import exception
+from os import getenv, replace
+from pathlib import Path
+from threading import Lock, local
+from time import time, perf_counter
+
+from src.resources.paths import cache_dir
+
+# Stages of a job, stages of processes that run in parallel add up
+probe_stage = 'probe'  # ffprobe, keyframe and scene detection
+staging_stage = 'staging'  # Reading image sequence headers, copying cached renders
+spawn_stage = 'spawn'  # Starting ffmpeg
+first_frame_stage = 'first_frame'  # From the start of ffmpeg to its first progress, opening and seeking the input
+encode_stage = 'encode'  # From the start of ffmpeg to its exit
+finalize_stage = 'finalize'  # Recording outputs
+
+telemetry_file = Path(cache_dir, 'telemetry.jsonl')
+_settings = {'prometheus_file': getenv('CUT_VIDEOS_PROMETHEUS_FILE')}
+_hooks = []
+_active = local()  # Stage of the current thread, stages inside it are counted as part of it
+_write_lock = Lock()
+_totals = defaultdict(int)  # Prometheus counters of this process
+
+
+def configure_telemetry(prometheus_file=None, profile_directory=None):
+    """
+    :param prometheus_file: Textfile for the node exporter textfile collector, updated after each job
+    :param profile_directory: Write a cProfile file per job stage
+    """
+    if prometheus_file:
+        _settings['prometheus_file'] = prometheus_file
+    if profile_directory:
+        add_hook(profile_hook(Path(profile_directory)))
+
+
+def add_hook(hook: callable):
+    """
+    Attach a profiler
+    :param hook: Called with the JobTelemetry and the stage name, returns a context manager entered for the stage
+    """
+    _hooks.append(hook)
+
+
+def profile_hook(directory: Path) -> callable:
+    """
+    :param directory: Output directory of the .prof files, they can be opened with pstats or snakeviz
+    :return: Hook that runs cProfile in the thread of the stage. Only one profiler can be active in a process,
+    stages that start while another stage is profiled are not profiled.
+    """
+    from cProfile import Profile  # Only loaded when profiling
+    directory.mkdir(parents=True, exist_ok=True)
+    counter = iter(range(1 << 62))
+    profiling = Lock()
+
+    @contextmanager
+    def hook(telemetry, stage: str):
+        if not profiling.acquire(blocking=False):
+            yield
+            return
+        profile = Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            profiling.release()
+            profile.dump_stats(Path(directory, f'job{telemetry.job_id}_{stage}_{next(counter)}.prof'))
+
+    return hook
+
+
+class JobTelemetry:
+    """
+    Stage timings and resource usage of a job, written as a json line when the job ends
+    """
+
+    def __init__(self, job_id, name: str):
+        """
+        :param job_id: Job store id, None for jobs that are not recorded
+        :param name: Job description
+        """
+        self.job_id = job_id
+        self.name = name
+        self.started = time()
+        self.stages = defaultdict(float)  # Stage -> seconds
+        self.counters = defaultdict(int)  # input_bytes, output_bytes, frames, cpu_seconds
+        self.max_rss_kb = 0
+        self._finished = False
+        self._lock = Lock()
+
+    @contextmanager
+    def stage(self, stage: str):
+        """
+        Time a block, profiling hooks are entered around it. A stage inside another stage of the same thread is
+        not timed separately, the time is counted once.
+        """
+        if getattr(_active, 'stage', None):
+            yield
+            return
+        _active.stage = stage
+        try:
+            with ExitStack() as stack:
+                for hook in _hooks:
+                    stack.enter_context(hook(self, stage))
+                start = perf_counter()
+                try:
+                    yield
+                finally:
+                    self.add_time(stage, perf_counter() - start)
+        finally:
+            _active.stage = None
+
+    def add_time(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages[stage] += seconds
+
+    def count(self, counter: str, value: float):
+        with self._lock:
+            self.counters[counter] += value
+
+    def add_usage(self, usage):
+        """
+        :param usage: resource usage of a child process from os.wait4
+        """
+        with self._lock:
+            self.counters['cpu_seconds'] += usage.ru_utime + usage.ru_stime
+            self.max_rss_kb = max(self.max_rss_kb, usage.ru_maxrss)
+
+    def to_dict(self, state: str, error: str = None) -> dict:
+        with self._lock:
+            encode = self.stages.get(encode_stage, 0)
+            return {'job': self.job_id, 'name': self.name, 'state': state, 'error': error,
+                    'started': round(self.started, 3), 'wall_seconds': round(time() - self.started, 3),
+                    'stages': {stage: round(seconds, 4) for stage, seconds in self.stages.items()},
+                    **{counter: round(value, 3) for counter, value in self.counters.items()},
+                    'fps': round(self.counters.get('frames', 0) / encode, 2) if encode else 0,
+                    'max_rss_kb': self.max_rss_kb}
+
+    def finish(self, state: str, error: str = None):
+        """
+        Write the record of the job once, errors are logged and don't fail the job
+        """
+        with self._lock:
+            if self._finished:
+                return
+            self._finished = True
+        record = self.to_dict(state, error)
+        try:
+            write_record(record)
+            if _settings['prometheus_file']:
+                write_prometheus(record, Path(_settings['prometheus_file']))
+        except OSError as e:
+            exception(e)
+
+
+def write_record(record: dict, file: Path = telemetry_file):
+    """
+    Append a json line
+    """
+    with _write_lock:
+        file.parent.mkdir(parents=True, exist_ok=True)
+        with open(file, 'a', encoding='UTF-8') as f:
+            f.write(json.dumps(record) + '\n')
+
+
+def prometheus_text(totals: dict) -> str:
+    """
+    :param totals: (metric, label) -> value
+    :return: Prometheus text exposition format
+    """
+    lines = []
+    for metric in sorted({metric for metric, _ in totals}):
+        lines.append(f'# TYPE cut_videos_{metric} counter')
+        for (name, label), value in sorted(totals.items()):
+            if name == metric:
+                value = round(value, 6)
+                lines.append(f'cut_videos_{metric}{{{label}}} {value}' if label else f'cut_videos_{metric} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def write_prometheus(record: dict, file: Path):
+    """
+    Add a job to the counters of this process and replace the textfile
+    """
+    with _write_lock:
+        _totals[('jobs_total', f'state="{record["state"]}"')] += 1
+        for stage, seconds in record['stages'].items():
+            _totals[('stage_seconds_total', f'stage="{stage}"')] += seconds
+        for counter in ('input_bytes', 'output_bytes', 'frames', 'cpu_seconds'):
+            _totals[(counter + '_total', '')] += record.get(counter, 0)
+        file.parent.mkdir(parents=True, exist_ok=True)
+        temp_file = file.with_suffix('.tmp')
+        temp_file.write_text(prometheus_text(_totals), encoding='UTF-8')
+        replace(temp_file, file)  # The collector never reads a partial file
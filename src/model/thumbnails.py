@@ -0,0 +1,61 @@
+from logging import info
+from pathlib import Path
+from re import findall
+from shutil import rmtree
+from subprocess import run, PIPE, DEVNULL
+
+from src.model.probe import file_key, probe, read_cache, write_cache
+from src.resources.paths import cache_dir, ffmpeg_path
+
+thumbnail_cache_dir = Path(cache_dir, 'thumbnails')
+thumbnail_height = 90
+max_thumbnails = 400  # Long videos get keyframes with a minimum distance
+
+
+def parse_showinfo(output: str) -> list:
+    """
+    :param output: ffmpeg log of the showinfo filter
+    :return: Timestamps of the shown frames in seconds
+    """
+    return [float(time) for time in findall(r'Parsed_showinfo.*?pts_time:\s*(-?[\d.]+)', output)]
+
+
+def thumbnail_command(file, directory: Path, min_distance: float) -> list:
+    """
+    Decode only keyframes, pick keyframes at least min_distance apart and write small jpgs
+    :param file: Video file
+    :param directory: Output directory
+    :param min_distance: Seconds between thumbnails
+    :return: ffmpeg arguments
+    """
+    select = f"select='isnan(prev_selected_t)+gte(t-prev_selected_t\\,{min_distance:.3f})'," if min_distance else ''
+    return [ffmpeg_path(), '-hide_banner', '-skip_frame', 'nokey', '-i', str(file), '-map', '0:v:0', '-an', '-sn',
+            '-vf', f'{select}scale=-2:{thumbnail_height},showinfo', '-fps_mode', 'passthrough', '-q:v', '5',
+            str(Path(directory, '%06d.jpg'))]
+
+
+def thumbnails(file) -> list:
+    """
+    Get keyframe thumbnails of a video, extracted in one pass and cached by file identity
+    :param file: Video file
+    :return: List of (seconds, jpg path)
+    """
+    key = file_key(file)
+    directory = Path(thumbnail_cache_dir, key)
+    entries = read_cache(key + '.thumbnails.json')
+    if entries is not None and all(Path(directory, name).exists() for _, name in entries):
+        return [(time, Path(directory, name)) for time, name in entries]
+
+    info(f'EXTRACT THUMBNAILS {file}')
+    rmtree(directory, ignore_errors=True)
+    directory.mkdir(parents=True)
+    duration = probe(file).duration
+    result = run(thumbnail_command(file, directory, duration / max_thumbnails if duration else 0),
+                 stdin=DEVNULL, stdout=DEVNULL, stderr=PIPE)
+    if result.returncode:
+        raise RuntimeError(f'THUMBNAILS FAILED {result.returncode}: {file}')
+    images = sorted(directory.glob('*.jpg'))
+    times = parse_showinfo(result.stderr.decode('UTF-8', errors='replace'))
+    entries = [(time, image.name) for time, image in zip(times, images)]
+    write_cache(key + '.thumbnails.json', entries)
+    return [(time, Path(directory, name)) for time, name in entries]
@@ -43,4 +43,62 @@ def format_time(time: str) -> str:
     time = time.lstrip('-')
     milli = milli.rstrip('0')
     milli = milli.rstrip('.')
-    return time + milli
\ No newline at end of file
+    return time + milli
+
+
+def time_to_seconds(time: str) -> float:
+    """
+    Convert time string to seconds
+    :param time: Time string in long form
+    :return: Seconds
+    """
+    return (strptime(time, time_format) - strptime(zero_time, time_format)).total_seconds()
+
+
+def normalize_time(time: str) -> str:
+    """
+    Convert user input like "90", "1:30" or "01:02:03.5" to the long form
+    :param time: Time string [[hours:]minutes:]seconds[.fraction]
+    :return: Time string in long form
+    """
+    seconds, _, fraction = time.strip().partition('.')
+    parts = seconds.split(':')
+    if len(parts) > 3 or not all(part.isdigit() for part in parts) or (fraction and not fraction.isdigit()):
+        raise ValueError(f'Invalid time {time}')
+    parts = [0] * (3 - len(parts)) + [int(part) for part in parts]
+    total = parts[0] * 3600 + parts[1] * 60 + parts[2]
+    return f'{total // 3600:02d}:{total // 60 % 60:02d}:{total % 60:02d}.{(fraction + "000")[:3]}'
+
+
+def seconds_to_time(seconds: float) -> str:
+    """
+    Convert seconds to the long form
+    :param seconds: Non negative seconds
+    :return: Time string in long form
+    """
+    milliseconds = round(seconds * 1000)
+    return f'{milliseconds // 3600000:02d}:{milliseconds // 60000 % 60:02d}:{milliseconds // 1000 % 60:02d}.' \
+           f'{milliseconds % 1000:03d}'
+
+
+def parse_range(text: str) -> tuple:
+    """
+    Convert user input like "1:00-1:30" to a range, an open end like "1:00-" cuts to the end
+    :param text: start-end
+    :return: Start and end time in long form
+    """
+    start, separator, end = text.strip().partition('-')
+    if not separator:
+        raise ValueError(f'Invalid range {text}')
+    start, end = normalize_time(start or '0'), normalize_time(end) if end.strip() else zero_time
+    if end != zero_time and time_to_seconds(end) <= time_to_seconds(start):
+        raise ValueError(f'Range ends before it starts {text}')
+    return start, end
+
+
+def parse_ranges(text: str) -> list:
+    """
+    :param text: Comma separated ranges like "1:00-1:30, 2:00-2:45"
+    :return: List of (start, end) in long form
+    """
+    return [parse_range(part) for part in text.split(',') if part.strip()]
@@ -0,0 +1,124 @@
+import json
+from logging import info
+from os import scandir
+from pathlib import Path
+from time import monotonic, sleep
+
+from src.resources.commands import image_types
+from src.resources.paths import file_exts
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:  # Optional, folders are polled without it
+    INotify = None
+
+preset_name = 'cut_videos.json'  # Task parameters of a folder, override the command line options
+preset_keys = ('input_framerate', 'start_time', 'end_time', 'hardsub', 'webm_input', 'scale_input',
+               'audio_selection', 'video_selection', 'segments', 'tier', 'ranges', 'scene_threshold', 'min_clip',
+               'max_clip', 'frame_sampling', 'frame_format', 'priority', 'job_class')
+# Image sequences are not watched, there is no way to tell when a sequence is complete
+watch_extensions = tuple(pattern[1:] for pattern in file_exts.split(';') if pattern and pattern[1:] not in image_types)
+
+
+def load_preset(folder: Path) -> dict:
+    """
+    :param folder: Watched folder
+    :return: Task parameters of the folder preset, empty if the folder has no preset
+    """
+    try:
+        with open(Path(folder, preset_name), encoding='UTF-8') as f:
+            preset = json.load(f)
+    except FileNotFoundError:
+        return {}
+    unknown = set(preset) - set(preset_keys)
+    if unknown:
+        raise ValueError(f'Unknown preset keys {sorted(unknown)} in {Path(folder, preset_name)}')
+    return preset
+
+
+def is_watched(name: str) -> bool:
+    """
+    :param name: File name
+    :return: True for media files that are not outputs of this program
+    """
+    return not name.startswith(('_', '.')) and name.lower().endswith(watch_extensions)
+
+
+class FolderWatcher:
+    """
+    Report new files of folders once they are completely written, their size and mtime did not change for the
+    settle time. Uses inotify if inotify_simple is installed, otherwise the folders are listed every interval.
+    """
+
+    def __init__(self, folders: list, interval: float = 2.0, settle: float = 5.0, existing: bool = False,
+                 use_inotify: bool = True):
+        """
+        :param folders: Watched directories, subdirectories are not watched
+        :param interval: Seconds between checks
+        :param settle: Seconds a file has to stay unchanged
+        :param existing: Report files that exist already
+        :param use_inotify: Use inotify if available
+        """
+        self.folders = [Path(folder) for folder in folders]
+        self.interval = interval
+        self.settle = settle
+        self._reported = {}  # Path -> (size, mtime) when it was reported
+        self._candidates = {}  # Path -> ((size, mtime), time it was first seen with that state)
+        self._inotify = None
+        if use_inotify and INotify is not None:
+            self._inotify = INotify()
+            self._watches = {self._inotify.add_watch(str(folder), flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE):
+                             folder for folder in self.folders}
+        for path, state in self._scan():
+            if existing:
+                self._candidates[path] = (state, monotonic())
+            else:
+                self._reported[path] = state
+        info(f'WATCH {self.folders} {"inotify" if self._inotify else "polling"}')
+
+    def _scan(self):
+        for folder in self.folders:
+            with scandir(folder) as entries:
+                for entry in entries:
+                    if is_watched(entry.name) and entry.is_file():
+                        stat = entry.stat()
+                        yield Path(entry.path), (stat.st_size, stat.st_mtime_ns)
+
+    def _state(self, path: Path):
+        try:
+            stat = path.stat()
+        except OSError:
+            return None  # Deleted or moved away
+        return stat.st_size, stat.st_mtime_ns
+
+    def _collect(self):
+        """
+        Wait for the interval and add new or changed files to the candidates
+        """
+        if self._inotify:
+            changed = {Path(self._watches[event.wd], event.name) for event in
+                       self._inotify.read(timeout=int(self.interval * 1000)) if is_watched(event.name)}
+            changed = [(path, self._state(path)) for path in changed]
+        else:
+            sleep(self.interval)
+            changed = list(self._scan())
+        for path, state in changed:
+            if state is not None and self._reported.get(path) != state and path not in self._candidates:
+                self._candidates[path] = (state, monotonic())
+
+    def files(self):
+        """
+        Generator of completely written files, runs until it is closed
+        """
+        while True:
+            self._collect()
+            for path, (state, since) in list(self._candidates.items()):
+                current = self._state(path)
+                if current is None:
+                    del self._candidates[path]
+                elif current != state:
+                    self._candidates[path] = (current, monotonic())  # Still written
+                elif monotonic() - since >= self.settle:
+                    del self._candidates[path]
+                    self._reported[path] = state
+                    yield path
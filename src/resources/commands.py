@@ -1,13 +1,35 @@
 from src.resources.gui_texts import *
-from src.resources.paths import ffprobe_path
 
+# Format: (video filter, encoder, extension), the video is decoded and filtered once for all selected formats
 video_options = {
-    webm_text: ('-filter_complex "scale=<res>" -c:v libvpx-vp9 -speed 1 -crf <crf> -b:v 0 -threads 4 -tile-columns 6 -frame-parallel 1 -auto-alt-ref 1 -lag-in-frames 25', ".webm"),
-    mp4_text: ('-filter_complex "scale=<res>" -c:v libx264 -profile:v main -level:v 3.2 -pix_fmt yuv420p', ".mp4"),
-    frames_text: ('', '/%06d.png'),
-    png_text: ('-filter_complex "scale=<res>" -plays 0', '.apng'),
-    webp_text: ('-filter_complex "scale=<res>" -c:v libwebp -lossless 0 -compression_level 3 -q:v 70 -loop 0 -preset picture -vsync 0', '.webp'),
-    original_text: ('-map 0:v:0 -c:v copy', '%ext')}
+    webm_text: ('scale=<res>', '-c:v libvpx-vp9 <profile> -crf <crf> -b:v 0 -auto-alt-ref 1 -lag-in-frames 25', ".webm"),
+    mp4_text: ('scale=<res>', '-c:v libx264 <profile> -profile:v main -level:v 3.2 -pix_fmt yuv420p', ".mp4"),
+    frames_text: ('scale=<res>', '', '/%06d%frame'),  # Exported by FrameExport, %frame is the image extension
+    png_text: ('scale=<res>', '-plays 0', '.apng'),
+    webp_text: ('scale=<res>', '-c:v libwebp -lossless 0 -compression_level 3 -q:v 70 -loop 0 -preset picture -fps_mode:v passthrough', '.webp'),
+    original_text: ('', '-c:v copy', '%ext'),
+    smart_text: ('', '-c:v copy', '%ext'),  # Copy with re-encoded partial GOPs at start and end
+    audio_text: ('', '-vn', '%audio')}  # Audio track only, the extension depends on the audio codec
+# Equivalent encoders, used by the fast tier or when ffmpeg has no encoder of video_options.
+# SVT-AV1 in webm encodes several times faster than libvpx-vp9 at a similar quality.
+video_alternatives = {webm_text: '-c:v libsvtav1 -preset 8 -crf <crf> -pix_fmt yuv420p'}
+# Frame export image formats: (Pillow format, extension, save options)
+frame_formats = {'png': ('PNG', '.png', {}), 'jpg': ('JPEG', '.jpg', {'quality': 90}),
+                 'webp': ('WEBP', '.webp', {'quality': 85, 'method': 4})}
+# Formats without audio
+silent_formats = (frames_text, png_text, webp_text)
+# Threads used by the encoder of each format, the scheduler runs as many files in parallel as there are cores.
+# webm and mp4 are adapted to the resolution by encoder_profile
+video_threads = {webm_text: 4, mp4_text: 4, frames_text: 1, png_text: 1, webp_text: 1, original_text: 1,
+                 smart_text: 2, audio_text: 1}
+# Formats with a <profile> placeholder for threads and speed
+profile_formats = (webm_text, mp4_text)
+# Tier: (libvpx-vp9 -speed, libx264 -preset), balanced keeps the former fixed settings
+encoder_tiers = {fast_text: ('4', 'veryfast'), balanced_text: ('1', 'medium'), archival_text: ('0', 'slower')}
+# (Max output height, encoder threads, VP9 log2 tile columns), from the libvpx VP9 recommendations
+resolution_threads = ((240, 2, 0), (480, 4, 1), (1080, 8, 2), (2160, 16, 3), (None, 24, 4))
+# Formats that can be encoded in segments and joined without encoding
+segment_formats = (webm_text, mp4_text)
 
 audio_options = {'opus': '-map 0:a:<audio> -c:a libopus -vbr on -b:a 100k',
                  'no audio': '-an',
@@ -15,10 +37,14 @@ audio_options = {'opus': '-map 0:a:<audio> -c:a libopus -vbr on -b:a 100k',
                  'mp3': '-map 0:a:<audio> -c:a libmp3lame -qscale:a 3',
                  'aac': '-map 0:a:<audio> -c:a aac -b:a 160k'}
 
+# Native encoders, used when ffmpeg is built without the library
+audio_alternatives = {'opus': '-map 0:a:<audio> -c:a opus -strict -2 -b:a 100k'}
+
+# Extension of audio only outputs, Matroska audio holds any copied codec
+audio_extensions = {'opus': '.opus', 'no audio': '.mka', original_audio: '.mka', 'mp3': '.mp3', 'aac': '.m4a'}
+
 image_types = ('.bmp', '.png', '.jpg', '.webp')
 
-audio_codec_command = f'"{ffprobe_path}" -v error -select_streams a -show_entries stream=index,codec_name:stream_tags=language -of json "%s"' # :0 default=noprint_wrappers=1:nokey=1
-duration_command = f'"{ffprobe_path}" -v error -show_entries format=duration -of default=noprint_wrappers=1:nokey=1 -sexagesimal "%s"'
-fps_command = f'"{ffprobe_path}" -v error -select_streams v -of default=noprint_wrappers=1:nokey=1 -show_entries stream=r_frame_rate "%s"'
-frame_input_ext = '.jpg'
-digits = 6
+fps_mode_version = (5, 1)  # Oldest ffmpeg with -fps_mode, used by webp, frames export and scene detection
+probe_arguments = ('-v', 'error', '-show_format', '-show_streams', '-of', 'json')
+keyframe_arguments = ('-v', 'error', '-select_streams', 'v:0', '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0')
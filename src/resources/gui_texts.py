@@ -1,33 +1,39 @@
-from wx import Font, MODERN, NORMAL
-
 window_title = 'cut videos'
 file_input_button = 'Open File'
 file_input_title = 'Select Video File'
 text_open_file = 'File'
 end_input_text = 'End'
 start_input_text = 'Start'
+ranges_text = 'Ranges (1:00-1:30, 2:00-2:45)'
 frame_rate_text = 'Input frame rate'
 webm_setting_text = 'webm Quality'
 video_width_text = 'Width'
 video_height_text = 'Height'
 clone_time_text = 'Clone time'
+segments_text = 'Parallel segments'
+scenes_text = 'Scene split threshold (0.3)'
+clip_length_text = 'Clip seconds (min-max)'
 video_codec_text = 'File format'
 audio_codec_text = 'Audio codec'
+tier_text = 'Encoder speed'
+frame_format_text = 'Frame format'
+frame_sampling_text = 'Frames (keyframes, every N, Xfps)'
 # Video format selections
 original_text = 'original'
+smart_text = 'smart cut'
 mp4_text = 'mp4'
 webm_text = 'webm'
 webp_text = 'webp'
 png_text = 'apng'
 frames_text = 'frames'
+audio_text = 'audio'
+# Encoder speed/quality tiers
+fast_text = 'fast'
+balanced_text = 'balanced'
+archival_text = 'archival'
 # Audio codec selections
 original_audio = 'original'
 
-# App needs to be started before creation of font
-from wx import App
-app = App(False)
-window_font = Font(20, MODERN, NORMAL, NORMAL, False, 'Consolas')
-h1_font = Font(40, MODERN, NORMAL, NORMAL, False, u'Consolas')
 background_color =  ( 35,  35,  40)  # (50, 50, 50, 255)
 selected_color =    ( 70,  70,  85)
 hover_color =       ( 70,  70,  70)  # TODO Set mouse over color
@@ -1,12 +1,46 @@
+import os
+from functools import cache
 from logging import error
+from os import getenv
 from pathlib import Path
+from shutil import which
 
-ffmpeg_path = Path(Path(__file__).parent, "ffmpeg-6.0-full_build\\bin\\ffmpeg.exe")
-ffprobe_path = Path(Path(__file__).parent, "ffmpeg-6.0-full_build\\bin\\ffprobe.exe")
-if not ffmpeg_path.exists() or not ffprobe_path.exists():
-    error('ffmpeg not found')
-    raise FileNotFoundError
 
-ffmpeg_path = str(ffmpeg_path)
-ffprobe_path = str(ffprobe_path)
-file_exts = "*.mkv;*.mp4;*.mov;*.webm;*.avi;*.bmp;*.wmv;*.m2ts;*.ts;*.gif;*.png;*.jpg;"
\ No newline at end of file
+# Searched after PATH, package managers of macOS and Linux and the usual Windows install locations
+install_dirs = ('/opt/homebrew/bin', '/usr/local/bin', '/opt/local/bin', '/snap/bin', r'C:\ffmpeg\bin',
+                str(Path(getenv('ProgramFiles', r'C:\Program Files'), 'ffmpeg', 'bin')))
+
+
+@cache
+def _find_binary(name: str) -> str:
+    """
+    Find a binary in CUT_VIDEOS_FFMPEG_DIR, a bundled ffmpeg-* build next to this file, PATH or the install
+    directories. Searched on first use, importing never fails.
+    :param name: Binary name without extension
+    :return: Path string
+    """
+    executable = name + ('.exe' if os.name == 'nt' else '')
+    # The newest bundled build first, like ffmpeg-7.1-full_build before ffmpeg-6.0-full_build
+    for directory in (getenv('CUT_VIDEOS_FFMPEG_DIR'), *sorted(Path(__file__).parent.glob('ffmpeg-*/bin'),
+                                                              reverse=True)):
+        if directory and Path(directory, executable).is_file():
+            return str(Path(directory, executable))
+    path = which(name) or which(name, path=os.pathsep.join(install_dirs))
+    if not path:
+        error(f'{name} not found')
+        raise FileNotFoundError(f'{name} not found, install ffmpeg, add it to PATH or set CUT_VIDEOS_FFMPEG_DIR')
+    return path
+
+
+def ffmpeg_path() -> str:
+    return _find_binary('ffmpeg')
+
+
+def ffprobe_path() -> str:
+    return _find_binary('ffprobe')
+
+
+file_exts = "*.mkv;*.mp4;*.mov;*.webm;*.avi;*.bmp;*.wmv;*.m2ts;*.ts;*.gif;*.png;*.jpg;" \
+            "*.mp3;*.flac;*.wav;*.m4a;*.opus;*.ogg;*.mka;"
+# Persistent caches (probe results, ...)
+cache_dir = Path(getenv('LOCALAPPDATA') or Path(Path.home(), '.cache'), 'cut_videos')
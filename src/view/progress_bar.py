@@ -1,13 +1,18 @@
-from wx import Gauge
+from wx import Gauge, CallAfter
 
 
 class ProgressBar(Gauge):
+    """
+    Progress of a task, can be set from any thread
+    """
+    steps = 1000
 
-    def set_current_frame_nr(self, frame_nr):
-        self.SetValue(int(frame_nr))
-        self.Update()
+    def set_progress(self, progress):
+        CallAfter(self._show_progress, progress)
 
-    def set_total_frames(self, total_frames: int):
-        if total_frames <= 0:
-            raise ValueError
-        self.SetRange(int(total_frames * 1.1))  # Set frame count 10% higher
+    def _show_progress(self, progress):
+        if not self:  # Deleted with the window
+            return
+        self.SetRange(self.steps)
+        self.SetValue(int(progress.fraction * self.steps))
+        self.SetToolTip(progress.summary())
@@ -0,0 +1,6 @@
+# App needs to be started before creation of font
+from wx import App, Font, MODERN, NORMAL
+
+app = App(False)
+window_font = Font(20, MODERN, NORMAL, NORMAL, False, 'Consolas')
+h1_font = Font(40, MODERN, NORMAL, NORMAL, False, u'Consolas')
@@ -0,0 +1,66 @@
+from logging import exception
+from threading import Thread
+
+from wx import ScrolledWindow, BoxSizer, HORIZONTAL, HSCROLL, RIGHT, StaticBitmap, Bitmap, BITMAP_TYPE_JPEG, \
+    CallAfter, EVT_LEFT_DOWN, EVT_RIGHT_DOWN, EVT_MOUSEWHEEL
+
+from src.model.thumbnails import thumbnails, thumbnail_height
+from src.model.time_format import seconds_to_time
+
+
+class ThumbnailStrip(ScrolledWindow):
+    """
+    Scrollable keyframe thumbnails of a video, left click sets the start and right click the end
+    """
+
+    def __init__(self, parent, callback):
+        """
+        :param parent: Parent wx element
+        :param callback: Receives the time string and True for the start or False for the end
+        """
+        super().__init__(parent, style=HSCROLL)
+        self._callback = callback
+        self._file = None
+        self._sizer = BoxSizer(HORIZONTAL)
+        self.SetSizer(self._sizer)
+        self.SetScrollRate(20, 0)
+        self.SetMinSize((-1, thumbnail_height + 20))
+        self.Bind(EVT_MOUSEWHEEL, self._scroll)
+
+    def load(self, file):
+        """
+        Show the thumbnails of a video, they are extracted in a background thread
+        :param file: Video file
+        """
+        self._file = file
+        self._sizer.Clear(delete_windows=True)
+        Thread(target=self._extract, args=(file,), daemon=True).start()
+
+    def _extract(self, file):
+        try:
+            entries = thumbnails(file)
+        except Exception as e:
+            exception(e)
+            return
+        CallAfter(self._show, file, entries)
+
+    def _show(self, file, entries: list):
+        if not self or file != self._file:  # Window closed or another file was selected
+            return
+        for time, image in entries:
+            time = seconds_to_time(time)
+            bitmap = StaticBitmap(self, bitmap=Bitmap(str(image), BITMAP_TYPE_JPEG))
+            bitmap.SetToolTip(time)
+            bitmap.Bind(EVT_LEFT_DOWN, lambda _, time=time: self._callback(time, True))
+            bitmap.Bind(EVT_RIGHT_DOWN, lambda _, time=time: self._callback(time, False))
+            bitmap.Bind(EVT_MOUSEWHEEL, self._scroll)
+            self._sizer.Add(bitmap, 0, RIGHT, 2)
+        self.FitInside()
+        self.Layout()
+
+    def _scroll(self, event):
+        """
+        Scrub through the strip with the mouse wheel
+        """
+        x, y = self.GetViewStart()
+        self.Scroll(max(0, x - event.GetWheelRotation() // 20), y)
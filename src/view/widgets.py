@@ -1,10 +1,11 @@
 from logging import info
 
 from wx import ComboBox, CB_DROPDOWN, CB_READONLY, EVT_TEXT, Panel, StaticText, BoxSizer, VERTICAL, Font, EXPAND, \
-    HORIZONTAL, NORMAL, MODERN, TextCtrl, CENTER
+    HORIZONTAL, NORMAL, MODERN, TextCtrl, CENTER, CheckListBox
 from wxwidgets import SimpleSizer, SimpleButton
 
-from src.resources.gui_texts import window_font, text_color, h1_font
+from src.resources.gui_texts import text_color
+from src.view.style import h1_font
 
 
 class StandardSelection(Panel):
@@ -29,6 +30,27 @@ class StandardSelection(Panel):
         return self.selection.GetValue()
 
 
+class MultiSelection(Panel):
+    def __init__(self, parent, title, options, font):
+        super().__init__(parent)
+
+        with SimpleSizer(self, VERTICAL) as sizer:
+            text = StaticText(self, label=title)
+            text.SetFont(font)
+            sizer.Add(text)
+            self.selection = CheckListBox(self, choices=options)
+            self.selection.SetFont(font)
+            self.selection.SetForegroundColour(text_color)
+            self.selection.Check(0)
+            sizer.Add(self.selection, 1, EXPAND)
+
+    def get_selection(self):
+        """
+        :return: Checked options, the first option if nothing is checked
+        """
+        return list(self.selection.GetCheckedStrings()) or [self.selection.GetString(0)]
+
+
 class SimpleInput(Panel):
 
     def __init__(self, parent, label, initial=""):
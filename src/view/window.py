@@ -6,14 +6,20 @@ from wx import Panel, BoxSizer, VERTICAL, Frame, ID_ANY, EXPAND, EVT_CLOSE, Icon
     GA_HORIZONTAL, CheckBox, FileDropTarget
 from wxwidgets import SimpleButton
 
-from src.model.task import Task, unformat_time
-from src.resources.commands import video_options, audio_options
+from src.model.capabilities import get_capabilities, check_job
+from src.model.file_index import FileIndex, find_original
+from src.model.frame_export import sampling_arguments
+from src.model.job_store import JobStore, gui_owner
+from src.model.task import Task, unformat_time, parse_ranges
+from src.resources.commands import video_options, audio_options, encoder_tiers, image_types, frame_formats
 from src.resources.gui_texts import *
 from src.resources.paths import file_exts
 from src.resources.search_paths import search_paths
 from src.view.FileInputModded import FileInputModded
 from src.view.progress_bar import ProgressBar
-from src.view.widgets import StandardSelection, SimpleInput, TimeInput
+from src.view.thumbnail_strip import ThumbnailStrip
+from src.view.style import window_font, h1_font
+from src.view.widgets import StandardSelection, SimpleInput, TimeInput, MultiSelection
 from send2trash import send2trash
 
 class FileInputter(FileDropTarget):
@@ -34,6 +40,8 @@ class Window(Frame):
         self.files = []
         self.path = None
         self._active_tasks = []
+        self._file_index = None  # Opened on the first lookup
+        self._job_store = JobStore()
         # init window
         Frame.__init__(self, None, ID_ANY, window_title, size=(1100, 900))
         self.SetBackgroundColour(background_color)
@@ -50,35 +58,56 @@ class Window(Frame):
         self.SetDropTarget(FileInputter(self.file_input))
         # text_color=text_color, font=window_font) TODO
 
+        self._thumbnail_strip = ThumbnailStrip(self.panel, callback=self._set_thumbnail_time)
+
         # Create Input fields
         self._start_input = TimeInput(self.panel, label=start_input_text)
         self._end_input = TimeInput(self.panel, label=end_input_text)
+        self._ranges_input = SimpleInput(self.panel, label=ranges_text, initial='')
         self._webm_input = SimpleInput(self.panel, label=webm_setting_text, initial='36')
         self._width_input = SimpleInput(self.panel, label=video_width_text, initial='')
         self._height_input = SimpleInput(self.panel, label=video_height_text, initial='')
         self._framerate_input = SimpleInput(self.panel, label=frame_rate_text, initial='')
+        self._segments_input = SimpleInput(self.panel, label=segments_text, initial='')
+        self._scenes_input = SimpleInput(self.panel, label=scenes_text, initial='')
+        self._clip_length_input = SimpleInput(self.panel, label=clip_length_text, initial='')
         self._hard_sub_check = CheckBox(self.panel, label='HARDSUBS')
         self._hard_sub_check.SetFont(font=h1_font)
         button = SimpleButton(self.panel, text_button='CUT', callback=self._submit_task)
         # Create check inputs
         self._audio_select = StandardSelection(parent=self.panel, options=list(audio_options.keys()), callback=None,
                                                title=audio_codec_text, font=window_font)
-        self._video_select = StandardSelection(parent=self.panel, options=list(video_options.keys()), callback=None,
-                                               title=video_codec_text, font=window_font)
+        self._video_select = MultiSelection(parent=self.panel, options=list(video_options.keys()),
+                                            title=video_codec_text, font=window_font)
+        self._tier_select = StandardSelection(parent=self.panel, options=list(encoder_tiers), callback=None,
+                                              title=tier_text, font=window_font)
+        self._tier_select.selection.SetValue(balanced_text)
+        self._frame_format_select = StandardSelection(parent=self.panel, options=list(frame_formats), callback=None,
+                                                      title=frame_format_text, font=window_font)
+        self._frame_format_select.selection.SetValue('png')
+        self._frame_sampling_input = SimpleInput(self.panel, label=frame_sampling_text, initial='')
         clone_time_input = FileInputModded(self.panel, text_button=clone_time_text, callback=self._clone_time,
                                      file_type=file_exts, text_title=file_input_title, text_open_file=text_open_file)
 
         # Add inputs to self._sizer
         self._sizer.Add(self.file_input, 1, EXPAND)
+        self._sizer.Add(self._thumbnail_strip, 0, EXPAND)
         self._sizer.Add(self._video_select, 1, EXPAND)
         self._sizer.Add(self._audio_select, 1, EXPAND)
+        self._sizer.Add(self._tier_select, 1, EXPAND)
+        self._sizer.Add(self._frame_format_select, 1, EXPAND)
+        self._sizer.Add(self._frame_sampling_input, 1, EXPAND)
         self._sizer.Add(clone_time_input, 1, EXPAND)
         self._sizer.Add(self._start_input, 1, EXPAND)
         self._sizer.Add(self._end_input, 1, EXPAND)
+        self._sizer.Add(self._ranges_input, 1, EXPAND)
         self._sizer.Add(self._webm_input, 1, EXPAND)
         self._sizer.Add(self._width_input, 1, EXPAND)
         self._sizer.Add(self._height_input, 1, EXPAND)
         self._sizer.Add(self._framerate_input, 1, EXPAND)
+        self._sizer.Add(self._segments_input, 1, EXPAND)
+        self._sizer.Add(self._scenes_input, 1, EXPAND)
+        self._sizer.Add(self._clip_length_input, 1, EXPAND)
         self._sizer.Add(self._hard_sub_check, 1)
         self._sizer.Add(button, 1, EXPAND)
 
@@ -92,6 +121,11 @@ class Window(Frame):
 
         self.Bind(EVT_CLOSE, self.on_close)
 
+        # Continue jobs that were queued or running when the window was closed
+        for job in self._job_store.unfinished(gui_owner):
+            info(f'RESUME JOB {job.id}')
+            self._start_task(job.parameters, job.id)
+
     def on_close(self, event):
         self.Destroy()
         for task in self._active_tasks:
@@ -105,6 +139,13 @@ class Window(Frame):
     def end_time(self):
         return self._end_input.get_value()
 
+    @property
+    def ranges(self):
+        """
+        :return: List of (start, end), None if the start and end inputs are used
+        """
+        return parse_ranges(self._ranges_input.get_value()) or None
+
     @property
     def video_selection(self):
         return self._video_select.get_selection()
@@ -113,6 +154,20 @@ class Window(Frame):
     def audio_selection(self):
         return self._audio_select.get_selection()
 
+    @property
+    def tier(self):
+        return self._tier_select.get_selection()
+
+    @property
+    def frame_format(self):
+        return self._frame_format_select.get_selection()
+
+    @property
+    def frame_sampling(self):
+        sampling = self._frame_sampling_input.get_value().strip()
+        sampling_arguments(sampling)  # ValueError if invalid
+        return sampling
+
     @property
     def input_framerate(self):
         return self._framerate_input.get_value()
@@ -127,6 +182,24 @@ class Window(Frame):
     def webm_input(self):
         return self._webm_input.get_value()
 
+    @property
+    def segments(self):
+        segments = self._segments_input.get_value()
+        return int(segments) if segments.isdigit() else 0
+
+    @property
+    def scene_threshold(self):
+        threshold = self._scenes_input.get_value()
+        return float(threshold) if threshold else 0
+
+    @property
+    def clip_length(self):
+        """
+        :return: Minimum and maximum clip seconds, 0 is unlimited
+        """
+        minimum, _, maximum = self._clip_length_input.get_value().partition('-')
+        return float(minimum or 0), float(maximum or 0)
+
     @property
     def hardsub(self):
         return self._hard_sub_check.GetValue()
@@ -139,13 +212,13 @@ class Window(Frame):
         """
         file_name = Path(findall('(.+)_', file)[0]).name
 
-        pattern = f"**/*{file_name[-13:] if len(file_name) >= 13 else file_name}"
-
-        for path in search_paths:
-            found_files = list(Path(path).glob(pattern))
-            if len(found_files) > 0:
-                self.file_input._text_input.SetValue(f"{found_files[0].parent}/{found_files[0].name}")
-                return self._set_file(found_files[0].parent, [found_files[0].name])
+        if self._file_index is None:
+            self._file_index = FileIndex()
+        found_file = find_original(self._file_index, file_name[-13:] if len(file_name) >= 13 else file_name,
+                                   search_paths)
+        if found_file:
+            self.file_input._text_input.SetValue(f"{found_file.parent}/{found_file.name}")
+            return self._set_file(found_file.parent, [found_file.name])
 
     def _clone_time(self, path, files):
         if len(files) == 1:  # Clone from video
@@ -170,8 +243,16 @@ class Window(Frame):
         self._end_input.set_value(end)
 
     def _set_file(self, path, files):
-        self.path = path
+        self.path = str(path)  # Stored with the job as json
         self.files = files
+        if len(files) == 1 and Path(files[0]).suffix not in image_types:
+            self._thumbnail_strip.load(Path(path, files[0]))
+
+    def _set_thumbnail_time(self, time: str, start: bool):
+        """
+        Set the start or end input to the time of a thumbnail
+        """
+        (self._start_input if start else self._end_input).set_value(time.replace(':', '').replace('.', ''))
 
     def _add_progress_bar(self):
         progress_bar = ProgressBar(self.panel, style=GA_HORIZONTAL)
@@ -184,17 +265,42 @@ class Window(Frame):
         self._active_tasks.remove(task)
 
     def _submit_task(self, event):
+        try:
+            ranges = self.ranges
+            scene_threshold = self.scene_threshold
+            min_clip, max_clip = self.clip_length
+            frame_sampling = self.frame_sampling
+            check_job(get_capabilities(), tuple(self.video_selection), self.audio_selection, self.tier,
+                      frame_sampling, scene_threshold)
+        except (ValueError, OSError) as e:  # Invalid input, ffmpeg missing or without an encoder of the job
+            error(e)
+            return
+        parameters = dict(input_framerate=self.input_framerate,
+                          start_time=self.start_time,
+                          end_time=self.end_time,
+                          hardsub=self.hardsub,
+                          webm_input=self.webm_input,
+                          scale_input=self.scale_input,
+                          audio_selection=self.audio_selection,
+                          video_selection=self.video_selection,
+                          path=self.path,
+                          files=self.files.copy(),
+                          segments=self.segments,
+                          tier=self.tier,
+                          ranges=ranges,
+                          scene_threshold=scene_threshold,
+                          min_clip=min_clip,
+                          max_clip=max_clip,
+                          frame_sampling=frame_sampling,
+                          frame_format=self.frame_format)
+        self._start_task(parameters, self._job_store.add(parameters, gui_owner))
+
+    def _start_task(self, parameters: dict, job_id: int):
+        """
+        Run a job with a new progress bar
+        :param parameters: Task arguments
+        :param job_id: Record of the job
+        """
         bar = self._add_progress_bar()
-        self._active_tasks.append(
-            Task(self.input_framerate,
-                 self.start_time,
-                 self.end_time,
-                 self.hardsub,
-                 self.webm_input,
-                 self.scale_input,
-                 self.audio_selection,
-                 self.video_selection,
-                 self.path,
-                 self.files.copy(),
-                 self.remove_task,
-                 bar))
+        self._active_tasks.append(Task(**parameters, remove_task=self.remove_task, bar=bar,
+                                       job_store=self._job_store, job_id=job_id))
@@ -0,0 +1,162 @@
+"""
+Encoding benchmark, runs every video/audio option on generated clips through the command line pipeline
+
+python test_src/benchmark.py run results.json
+python test_src/benchmark.py compare old.json new.json
+"""
+import json
+import os
+import sys
+from argparse import ArgumentParser
+from datetime import datetime
+from itertools import product
+from pathlib import Path
+from platform import platform
+from shlex import split
+from shutil import copyfile
+from subprocess import run, Popen, DEVNULL, PIPE
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+root = Path(__file__).parents[1]
+sys.path.insert(0, str(root))
+
+from src.model.governor import interactive_class
+from src.resources.commands import video_options, audio_options
+from src.resources.paths import ffmpeg_path, cache_dir
+
+resolutions = {'360p': '640x360', '720p': '1280x720', '1080p': '1920x1080'}
+durations = (5, 20)
+fixture_rate = 30
+
+
+def fixture(resolution: str, duration: int) -> Path:
+    """
+    Generate a test clip once, the same arguments give the same file
+    :param resolution: Key of resolutions
+    :param duration: Seconds
+    :return: Clip with h264 video and aac audio
+    """
+    file = Path(cache_dir, 'benchmark', f'testsrc2_{resolution}_{duration}s.mp4')
+    if file.exists():
+        return file
+    file.parent.mkdir(parents=True, exist_ok=True)
+    temp = file.with_suffix('.part.mp4')
+    run([ffmpeg_path(), '-y', '-v', 'error',
+         '-f', 'lavfi', '-i', f'testsrc2=size={resolutions[resolution]}:rate={fixture_rate}:duration={duration}',
+         '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=48000:duration={duration}',
+         '-c:v', 'libx264', '-preset', 'ultrafast', '-g', str(2 * fixture_rate), '-pix_fmt', 'yuv420p',
+         '-c:a', 'aac', '-b:a', '128k', '-fflags', '+bitexact', '-flags', '+bitexact', str(temp)], check=True)
+    temp.replace(file)
+    return file
+
+
+def _output_size(directory: Path, source: str) -> int:
+    return sum(file.stat().st_size for file in directory.rglob('*') if file.is_file() and file.name != source)
+
+
+def run_case(source: Path, duration: int, video: str, audio: str, extra: list) -> dict:
+    """
+    Convert source with the command line in a new directory
+    :return: Measurements, cpu time and peak memory are None where os.wait4 is missing (windows)
+    """
+    with TemporaryDirectory() as temp_path, TemporaryDirectory() as home:
+        clip = Path(temp_path, source.name)
+        try:
+            os.link(source, clip)
+        except OSError:
+            copyfile(source, clip)
+        command = [sys.executable, str(Path(root, '__main__.py')), 'cut', str(clip), '--video', video,
+                   '--audio', audio, '--job-class', interactive_class, *extra]
+        # Own job store, render cache and telemetry, a cached render would measure a copy instead of an encode
+        env = dict(os.environ, HOME=home, USERPROFILE=home, LOCALAPPDATA=home)
+        start = perf_counter()
+        process = Popen(command, stdout=DEVNULL, stderr=PIPE, env=env)
+        if hasattr(os, 'wait4'):
+            process.stderr.read()
+            _, status, usage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+            # Usage of the cli process includes the ffmpeg processes it waited for
+            cpu, max_rss = usage.ru_utime + usage.ru_stime, usage.ru_maxrss
+        else:
+            process.communicate()
+            cpu, max_rss = None, None
+        wall = perf_counter() - start
+        frames = duration * fixture_rate
+        return {'fixture': source.stem, 'video': video, 'audio': audio, 'ok': process.returncode == 0,
+                'wall': round(wall, 3), 'fps': round(frames / wall, 1), 'cpu': cpu and round(cpu, 3),
+                'max_rss_kb': max_rss, 'size': _output_size(Path(temp_path), source.name)}
+
+
+def ffmpeg_version() -> str:
+    return run([ffmpeg_path(), '-version'], stdout=PIPE, text=True).stdout.split('\n')[0]
+
+
+def run_command(args) -> int:
+    results = []
+    cases = list(product(args.resolutions, args.durations, args.video, args.audio))
+    for i, (resolution, duration, video, audio) in enumerate(cases):
+        result = run_case(fixture(resolution, duration), duration, video, audio, split(args.extra))
+        results.append(result)
+        print(f'{i + 1}/{len(cases)} {result["fixture"]} {video} {audio}: '
+              f'{"%.2fs %.1f fps" % (result["wall"], result["fps"]) if result["ok"] else "FAILED"}')
+    with open(args.results, 'w', encoding='UTF-8') as f:
+        json.dump({'date': datetime.now().isoformat(timespec='seconds'), 'platform': platform(),
+                   'cpu_count': os.cpu_count(), 'ffmpeg': ffmpeg_version(), 'results': results}, f, indent=1)
+    return 0 if all(result['ok'] for result in results) else 1
+
+
+def compare(old: list, new: list, threshold: float) -> list:
+    """
+    Compare the results of two runs
+    :param old: Results of the baseline
+    :param new: Results of the changed tree
+    :param threshold: Relative change of wall time that counts as regression
+    :return: List of (case, old wall, new wall, relative change, old size, new size, regression)
+    """
+    old = {(result['fixture'], result['video'], result['audio']): result for result in old if result['ok']}
+    rows = []
+    for result in new:
+        case = (result['fixture'], result['video'], result['audio'])
+        if case not in old or not result['ok']:
+            continue
+        change = result['wall'] / old[case]['wall'] - 1 if old[case]['wall'] else 0
+        rows.append((case, old[case]['wall'], result['wall'], change, old[case]['size'], result['size'],
+                     change > threshold))
+    return rows
+
+
+def compare_command(args) -> int:
+    with open(args.old, encoding='UTF-8') as f:
+        old = json.load(f)['results']
+    with open(args.new, encoding='UTF-8') as f:
+        new = json.load(f)['results']
+    rows = compare(old, new, args.threshold)
+    for case, old_wall, new_wall, change, old_size, new_size, regression in rows:
+        print(f'{" ".join(case):40} {old_wall:8.2f}s {new_wall:8.2f}s {change:+7.1%} '
+              f'{old_size:>11} {new_size:>11}{"  REGRESSION" if regression else ""}')
+    return 1 if any(row[-1] for row in rows) else 0
+
+
+def main(argv: list = None) -> int:
+    parser = ArgumentParser(description=__doc__.strip().split('\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help='Run the benchmark and write the results')
+    run_parser.add_argument('results', help='Results json file')
+    run_parser.add_argument('--resolutions', nargs='+', choices=list(resolutions), default=['360p', '720p'])
+    run_parser.add_argument('--durations', nargs='+', type=int, default=[durations[0]])
+    run_parser.add_argument('--video', nargs='+', choices=list(video_options), default=list(video_options))
+    run_parser.add_argument('--audio', nargs='+', choices=list(audio_options), default=list(audio_options))
+    run_parser.add_argument('--extra', default='', help='More arguments of the cut command, like "--jobs 1"')
+    run_parser.set_defaults(function=run_command)
+    compare_parser = commands.add_parser('compare', help='Compare two results files')
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=0.1, help='Slower by this fraction fails')
+    compare_parser.set_defaults(function=compare_command)
+    args = parser.parse_args(argv)
+    return args.function(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,49 @@
+from pytest import raises
+
+from src.model.capabilities import Capabilities, parse_encoders, parse_filters, parse_version, select_encoders, \
+    check_job
+from src.resources.gui_texts import webm_text, mp4_text, frames_text, smart_text, balanced_text, fast_text
+
+encoders_output = '''Encoders:
+ V..... = Video
+ A..... = Audio
+ ------
+ V....D libx264              libx264 H.264 / AVC / MPEG-4 AVC / MPEG-4 part 10 (codec h264)
+ V....D libsvtav1            SVT-AV1(Scalable Video Technology for AV1) encoder (codec av1)
+ A..X.D opus                 Opus
+'''
+filters_output = '''Filters:
+  T.. = Timeline support
+  | = Source or sink filter
+ ..C scale             V->V       Scale the input video size and/or convert the image format.
+ ... split             V->N       Pass on the input to N video outputs.
+'''
+build = Capabilities('ffmpeg', '4.4.2-0ubuntu0.22.04.1', parse_encoders(encoders_output),
+                     parse_filters(filters_output))
+
+
+def test_parse():
+    assert build.encoders == {'libx264', 'libsvtav1', 'opus'}
+    assert build.filters == {'scale', 'split'}
+    assert parse_version('ffmpeg version 6.0-static https://johnvansickle.com/ffmpeg/') == '6.0-static'
+    assert build.version_tuple == (4, 4)
+    assert Capabilities('ffmpeg', 'N-111234-g1234abcd', frozenset(), frozenset()).version_tuple is None
+
+
+def test_select_encoders():
+    video, audio = select_encoders(build, balanced_text)
+    assert '-c:v libsvtav1' in video[webm_text]  # libvpx-vp9 is missing
+    assert '-c:v libx264' in video[mp4_text]
+    assert '-c:a opus' in audio['opus']  # libopus is missing
+    assert select_encoders(build, fast_text)[0][webm_text] == video[webm_text]
+
+
+def test_check_job():
+    check_job(build, (webm_text, mp4_text), 'opus', balanced_text)
+    with raises(ValueError, match='libmp3lame encoder'):
+        check_job(build, (mp4_text,), 'mp3', balanced_text)
+    with raises(ValueError, match='5.1 or newer'):
+        check_job(build, (frames_text,), 'no audio', balanced_text)
+    check_job(build, (smart_text,), 'no audio', balanced_text, source_codecs=('h264', 'prores'))
+    with raises(ValueError, match='libx265 encoder'):
+        check_job(build, (smart_text,), 'no audio', balanced_text, source_codecs=('h264', 'hevc'))
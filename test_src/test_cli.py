@@ -0,0 +1,92 @@
+from pathlib import Path
+from threading import Lock
+from time import sleep
+from types import SimpleNamespace
+
+from pytest import raises
+
+from src.cli import create_parser, group_inputs, run_jobs
+from src.model.time_format import normalize_time, parse_ranges
+
+
+def test_normalize_time():
+    assert normalize_time('90') == '00:01:30.000'
+    assert normalize_time('1:02:03.5') == '01:02:03.500'
+    assert normalize_time('0') == '00:00:00.000'
+
+
+def test_parse_ranges():
+    assert parse_ranges('1:00-1:30, 2:00-') == [('00:01:00.000', '00:01:30.000'), ('00:02:00.000', '00:00:00.000')]
+    assert parse_ranges(' ') == []
+    with raises(ValueError, match='ends before it starts'):
+        parse_ranges('1:30-1:00')
+
+
+def test_group_inputs():
+    groups = group_inputs([Path('a', '1.mkv'), Path('a', '1.png'), Path('a', '2.png'), Path('b', '2.mp4')])
+    assert groups == [(Path('a'), ['1.mkv']), (Path('b'), ['2.mp4']), (Path('a'), ['1.png', '2.png'])]
+
+
+def test_parser():
+    args = create_parser().parse_args(['cut', 'a.mkv', '--start', '1:30', '--video', 'mp4', '-j', '2'])
+    assert args.start == '00:01:30.000'
+    assert args.video == ['mp4']
+    assert args.jobs == 2
+    args = create_parser().parse_args(['cut', 'a.mkv', '-r', '5-10', '-r', '20-'])
+    assert args.ranges == [('00:00:05.000', '00:00:10.000'), ('00:00:20.000', '00:00:00.000')]
+
+
+def test_watch_waits_for_tasks(monkeypatch, tmp_path):
+    finished = []
+
+    class FakeTask:
+        error = None
+
+        def __init__(self, **parameters):
+            self.files = parameters['files']
+
+        def join(self):
+            sleep(0.1)
+            finished.append(self.files)
+
+    class FakeWatcher:
+        def __init__(self, *args):
+            pass
+
+        def files(self):
+            yield tmp_path / 'a.mkv'  # The watcher ends after one file
+
+    monkeypatch.setattr('src.cli.check_options', lambda args: True)
+    monkeypatch.setattr('src.cli.JobStore', lambda: SimpleNamespace(unfinished=lambda owner: [],
+                                                                    add=lambda parameters, owner: 1))
+    monkeypatch.setattr('src.cli.FolderWatcher', FakeWatcher)
+    monkeypatch.setattr('src.cli.Task', FakeTask)
+    args = create_parser().parse_args(['watch', str(tmp_path), '--progress', 'json'])
+    assert args.function(args) == 0
+    assert finished == [['a.mkv']]
+
+
+def test_run_jobs_bounded(monkeypatch):
+    active, peak = [0], [0]
+    lock = Lock()
+
+    class FakeTask:
+        error = None
+
+        def __init__(self, **parameters):
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+            self.done = False
+
+        def join(self):
+            sleep(0.01)
+            with lock:
+                if not self.done:
+                    self.done = True
+                    active[0] -= 1
+
+    monkeypatch.setattr('src.cli.Task', FakeTask)
+    monkeypatch.setattr('src.cli.cpu_count', lambda: 2)
+    jobs = [({'path': 'a', 'files': [f'{i}.mkv']}, i) for i in range(6)]
+    assert run_jobs(None, jobs, 'json') == 0
+    assert peak[0] <= 2  # Tasks start as slots become free
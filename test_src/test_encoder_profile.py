@@ -0,0 +1,23 @@
+from src.model.encoder_profile import encoder_profile, scaled_size
+from src.resources.gui_texts import webm_text, mp4_text, webp_text, fast_text
+
+
+def test_scaled_size():
+    assert scaled_size(1920, 1080, '-1:-1') == (1920, 1080)
+    assert scaled_size(1920, 1080, '-1:480') == (853, 480)
+    assert scaled_size(1920, 1080, '1280:-1') == (1280, 720)
+    assert scaled_size(1920, 1080, 'iw/2:-1') == (1920, 1080)
+
+
+def test_threads_follow_resolution():
+    small = encoder_profile(webm_text, 1920, 1080, '-1:360', budget=32)
+    large = encoder_profile(webm_text, 3840, 2160, budget=32)
+    assert small.threads == 4
+    assert small.arguments == ('-speed', '1', '-threads', '4', '-tile-columns', '1', '-row-mt', '1')
+    assert large.threads == 16
+    assert encoder_profile(webm_text, 3840, 2160, budget=6).threads == 6
+
+
+def test_tiers_and_other_formats():
+    assert encoder_profile(mp4_text, 1280, 720, tier=fast_text).arguments == ('-preset', 'veryfast', '-threads', '4')
+    assert encoder_profile(webp_text, 1280, 720).arguments == ()
@@ -0,0 +1,21 @@
+from src.model.file_index import FileIndex, find_original
+
+
+def test_refresh_and_find(tmp_path):
+    root = tmp_path / 'videos'
+    (root / 'a' / 'b').mkdir(parents=True)
+    (root / 'a' / 'b' / 'show_episode_01.mkv').write_bytes(b'')
+    (root / 'other.mkv').write_bytes(b'')
+    index = FileIndex(tmp_path / 'index.sqlite')
+    index.refresh([root])
+    assert index.find('episode_01.mkv', [root]) == [root / 'a' / 'b' / 'show_episode_01.mkv']
+    assert index.find('episode_01.mkv', [tmp_path / 'vid']) == []
+
+    (root / 'a' / 'new_episode_02.mkv').write_bytes(b'')
+    assert find_original(index, 'episode_02.mkv', [root]) == root / 'a' / 'new_episode_02.mkv'  # Refreshed on miss
+
+    (root / 'a' / 'b' / 'show_episode_01.mkv').unlink()
+    (root / 'a' / 'b').rmdir()
+    index.refresh([root])
+    assert index.find('.mkv', [root]) == [root / 'other.mkv', root / 'a' / 'new_episode_02.mkv']
+    index.close()
@@ -0,0 +1,12 @@
+from src.model.filter_graph import fan_out_graph
+
+
+def test_fan_out_graph():
+    graph, maps = fan_out_graph(['scale=640:-1', '', 'scale=640:-1', 'scale=320:-1'])
+    assert graph == '[0:v:0]split=2[s0][s1];[s0]scale=640:-1,split=2[v0][v2];[s1]scale=320:-1[v3]'
+    assert maps == ['[v0]', '0:v:0', '[v2]', '[v3]']
+
+
+def test_single_output():
+    assert fan_out_graph(['scale=-1:-1']) == ('[0:v:0]scale=-1:-1[v0]', ['[v0]'])
+    assert fan_out_graph(['']) == ('', ['0:v:0'])
@@ -0,0 +1,31 @@
+from io import BytesIO
+
+from PIL import Image
+from pytest import raises
+
+from src.model.frame_export import FrameExport, read_ppm, sampling_arguments
+
+
+def test_sampling_arguments():
+    assert sampling_arguments('') == ((), '')
+    assert sampling_arguments('keyframes') == (('-skip_frame', 'nokey'), '')
+    assert sampling_arguments('10') == ((), "select='not(mod(n\\,10))'")
+    assert sampling_arguments('2.5fps') == ((), 'fps=2.5')
+    with raises(ValueError):
+        sampling_arguments('0')
+
+
+def test_drain(tmp_path):
+    stream = BytesIO(b''.join(b'P6\n2 1\n255\n' + bytes([value] * 6) for value in (0, 255)))
+    export = FrameExport(str(tmp_path / '%06d.jpg'), 'jpg', workers=2)
+    export.drain(stream)
+    assert read_ppm(stream) is None
+    assert sorted(file.name for file in tmp_path.iterdir()) == ['000001.jpg', '000002.jpg']
+    with Image.open(tmp_path / '000002.jpg') as image:
+        assert image.size == (2, 1)
+
+
+def test_read_ppm_16_bit():
+    stream = BytesIO(b'P6\n2 1\n65535\n' + bytes(12))  # rgb48be of a 10 bit source without -pix_fmt rgb24
+    with raises(ValueError, match='maximum value 65535'):
+        read_ppm(stream)
@@ -0,0 +1,28 @@
+from src.model.governor import Governor, load_limit, memory_per_thread, policies, batch_class, \
+    interactive_class
+
+
+def test_load_limit():
+    assert load_limit(0.5, 0, 8, None) == 7
+    assert load_limit(8, 8, 8, None) == 8  # Only our own encoders
+    assert load_limit(20, 4, 8, None) == 1
+    assert load_limit(0, 2, 8, 2 * memory_per_thread) == 4
+
+
+def test_core_allocation():
+    governor = Governor(cores=[0, 1, 2, 3])
+    first = governor._acquire(2)
+    second = governor._acquire(2)
+    assert sorted(first + second) == [0, 1, 2, 3]
+    governor.release(first)
+    assert governor._acquire(2) == first
+
+
+def test_command_prefix():
+    governor = Governor(cores=[0, 1, 2, 3])
+    governor._nice, governor._ionice, governor._taskset = 'nice', 'ionice', 'taskset'
+    assert governor.command_prefix(policies[interactive_class], 2) == ([], [])
+    assert governor.command_prefix(policies[batch_class], 2) == \
+        (['nice', '-n', '10', 'ionice', '-c', '2', '-n', '7', 'taskset', '-c', '0,1'], [0, 1])
+    governor._taskset = None  # Not pinned without taskset
+    assert governor.command_prefix(policies[batch_class], 2)[1] == []
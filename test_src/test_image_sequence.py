@@ -0,0 +1,30 @@
+from io import BytesIO
+
+from PIL import Image
+
+from src.model.image_sequence import ImageSequence
+
+
+def _save(path, size, mode='RGB'):
+    Image.new(mode, size).save(path)
+    return path
+
+
+def test_copy(tmp_path):
+    files = [_save(tmp_path / f'{i}.png', (4, 2)) for i in range(3)]
+    sequence = ImageSequence(files)
+    assert sequence.copy
+    assert sequence.input_arguments() == ['-f', 'png_pipe']
+    stdin = BytesIO()
+    sequence.feed(stdin)
+    assert stdin.getvalue() == b''.join(file.read_bytes() for file in files)
+
+
+def test_decode(tmp_path):
+    files = [_save(tmp_path / '0.png', (4, 2)), _save(tmp_path / '1.jpg', (8, 4)), _save(tmp_path / '2.png', (4, 2), 'L')]
+    sequence = ImageSequence(files, workers=2)
+    assert not sequence.copy
+    assert sequence.input_arguments() == ['-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', '4x2']
+    stdin = BytesIO()
+    sequence.feed(stdin)
+    assert len(stdin.getvalue()) == 3 * 4 * 2 * 3
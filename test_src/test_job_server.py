@@ -0,0 +1,99 @@
+from threading import Event
+
+from pytest import raises
+
+from src.model.job_server import LeaseTable, JobServer, JobClient, validate_parameters, run_worker
+from src.model.job_store import JobStore, server_owner, done_state, pending_state
+from src.model.progress import Progress
+
+parameters = {'input_framerate': '', 'start_time': '00:00:00.000', 'end_time': '00:00:00.000', 'hardsub': 0,
+              'webm_input': '36', 'scale_input': '-1:-1', 'audio_selection': 'opus', 'video_selection': ['webm'],
+              'path': '/videos', 'files': ['a.mp4']}
+
+
+def test_lease_expiry():
+    now = [0.0]
+    leases = LeaseTable(10, clock=lambda: now[0])
+    token = leases.grant(1, 'a')
+    now[0] = 8
+    assert leases.renew(1, token)
+    assert not leases.renew(1, 'other')
+    now[0] = 17
+    assert leases.expired() == []
+    now[0] = 19
+    assert leases.expired() == [1]
+    assert not leases.release(1, token)
+
+
+def test_server_round_trip(tmp_path):
+    store = JobStore(tmp_path / 'jobs.sqlite')
+    progress = []
+    server = JobServer(store, port=0, token='secret', on_progress=lambda job_id, _, p: progress.append(p))
+    server.start()
+    try:
+        url = f'http://127.0.0.1:{server.address[1]}'
+        job_id = server.add(parameters)
+        assert JobClient(url, 'wrong')._post('/lease', {'worker': 'worker'})[0] == 401
+        assert JobClient(url, 'secret')._post('/jobs', {'parameters': {}})[0] == 404  # Only the server adds jobs
+        client = JobClient(url, 'secret')
+        job = client.lease('worker')
+        assert job['job'] == job_id and job['parameters']['files'] == ['a.mp4']
+        assert client.lease('other') is None
+        assert client.progress(job, Progress(5, 10))
+        assert progress[0].fraction == 0.5
+        assert not client.finish(dict(job, token='lost'), None, [])
+        assert client.finish(job, None, ['/videos/_a.webm'])
+        assert store.get(job_id).state == done_state
+        assert server.remaining == 0
+    finally:
+        server.shutdown()
+
+
+def test_validate_parameters():
+    assert validate_parameters(dict(parameters, ranges=[['00:01:00.000', '00:01:30.000']]))
+    for changed in ({'bar': None}, {'files': ['../a.mp4']}, {'webm_input': '36 -y'},
+                    {'scale_input': '1:1,movie=a'}, {'video_selection': ['gif']}, {'show_result': True}):
+        with raises(ValueError):
+            validate_parameters(dict(parameters, **changed))
+    with raises(ValueError, match='Missing path, files'):
+        validate_parameters({key: value for key, value in parameters.items() if key not in ('path', 'files')})
+
+
+def test_requeue(tmp_path):
+    store = JobStore(tmp_path / 'jobs.sqlite')
+    server = JobServer(store, '127.0.0.1', 0, lease=0)
+    job_id = server.add(parameters)
+    job = server.lease('dead')
+    assert server.lease('alive')['job'] == job_id  # The lease of the dead worker expired
+    assert not server.progress(job_id, job['token'], None)
+    server.shutdown()
+    assert [job.id for job in JobStore(tmp_path / 'jobs.sqlite').unfinished(server_owner)] == [job_id]
+    restarted = JobServer(store, '127.0.0.1', 0)
+    assert restarted.lease('restarted')['job'] == job_id
+    assert store.get(job_id).state != pending_state
+    restarted.shutdown()
+
+
+def test_worker_survives_failed_job():
+    class Client:
+        def __init__(self):
+            self.jobs = [{'job': 1, 'token': 't', 'parameters': parameters, 'heartbeat': 1},
+                         {'job': 2, 'token': 't', 'parameters': parameters, 'heartbeat': 1}]
+            self.errors = []
+
+        def lease(self, worker):
+            if not self.jobs:
+                stop.set()
+                return None
+            return self.jobs.pop(0)
+
+        def finish(self, job, error, outputs):
+            self.errors.append((job['job'], error))
+
+    def run_task(task_parameters, progress):
+        raise TypeError('task failed')
+
+    stop = Event()
+    client = Client()
+    run_worker(client, 'worker', run_task, stop, idle=0)
+    assert client.errors == [(1, 'TypeError task failed'), (2, 'TypeError task failed')]
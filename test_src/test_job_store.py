@@ -0,0 +1,48 @@
+import sqlite3
+import sys
+from subprocess import Popen
+
+from src.model.job_store import JobStore, gui_owner, cli_owner, running_state, done_state
+
+
+def test_job_store(tmp_path):
+    store = JobStore(tmp_path / 'jobs.sqlite')
+    first = store.add({'path': 'a', 'files': ['1.mkv']}, gui_owner)
+    second = store.add({'path': 'b', 'files': ['2.mkv']}, gui_owner)
+    store.add({'path': 'c', 'files': ['3.mkv']}, cli_owner)
+    store.set_state(first, running_state)
+    store.set_state(second, running_state)
+    store.set_state(second, done_state, ['b/_2.webm'])
+    store.close()
+
+    store = JobStore(tmp_path / 'jobs.sqlite')  # Reopened after a restart
+    assert [job.id for job in store.unfinished(gui_owner)] == [first]  # Interrupted while running
+    done = store.history(done_state)
+    assert [(job.id, job.outputs, job.parameters['files']) for job in done] == [(second, ['b/_2.webm'], ['2.mkv'])]
+    assert done[0].duration >= 0
+    assert len(store.history()) == 3
+    store.close()
+
+
+def test_live_owner(tmp_path):
+    store = JobStore(tmp_path / 'jobs.sqlite')
+    job_id = store.add({'path': 'a', 'files': ['1.mkv']}, gui_owner)
+    store.set_state(job_id, running_state)
+    other = Popen([sys.executable, '-c', 'import time; time.sleep(30)'])  # A second window
+    try:
+        with sqlite3.connect(tmp_path / 'jobs.sqlite') as connection:
+            connection.execute('UPDATE jobs SET pid = ?', (other.pid,))
+        assert store.unfinished(gui_owner) == []
+    finally:
+        other.kill()
+        other.wait()
+    assert [job.id for job in store.unfinished(gui_owner)] == [job_id]  # The other window was closed
+    store.close()
+
+
+def test_path_parameters(tmp_path):
+    store = JobStore(tmp_path / 'jobs.sqlite')
+    job_id = store.add({'path': tmp_path / 'videos', 'files': ['1.mkv'], 'ranges': None}, gui_owner)  # Clone time
+    job, = store.unfinished(gui_owner)
+    assert (job.id, job.parameters['path']) == (job_id, str(tmp_path / 'videos'))
+    store.close()
@@ -0,0 +1,51 @@
+import json
+
+from src.model import probe as probe_module
+from src.model.probe import parse_probe, parse_frame_rate, MediaInfo
+
+probe_output = {
+    'streams': [
+        {'index': 0, 'codec_type': 'video', 'codec_name': 'h264', 'width': 1920, 'height': 1080,
+         'r_frame_rate': '30000/1001', 'avg_frame_rate': '30000/1001'},
+        {'index': 1, 'codec_type': 'audio', 'codec_name': 'aac', 'tags': {'language': 'eng'}},
+        {'index': 2, 'codec_type': 'audio', 'codec_name': 'opus', 'tags': {'language': 'jpn'}},
+        {'index': 3, 'codec_type': 'video', 'codec_name': 'mjpeg', 'disposition': {'attached_pic': 1}},
+    ],
+    'format': {'duration': '62.500000'}}
+
+
+def test_parse_frame_rate():
+    assert parse_frame_rate('25/1') == 25
+    assert parse_frame_rate('0/0') == 0
+    assert parse_frame_rate('') == 0
+    assert parse_frame_rate('24') == 24
+
+
+def test_parse_probe():
+    media_info = parse_probe(probe_output)
+    assert media_info.duration == 62.5
+    assert round(media_info.fps, 2) == 29.97
+    assert (media_info.width, media_info.height) == (1920, 1080)
+    assert media_info.video_codec == 'h264'
+    assert [(s.index, s.codec, s.language) for s in media_info.audio_streams] == [(0, 'aac', 'eng'),
+                                                                                   (1, 'opus', 'jpn')]
+    assert MediaInfo.from_dict(media_info.to_dict()) == media_info
+
+
+def test_parse_probe_audio():
+    media_info = parse_probe({'streams': [{'codec_type': 'audio', 'codec_name': 'mp3'}],
+                              'format': {'duration': '3.0'}})
+    assert not media_info.has_video
+    assert media_info.has_audio
+    assert media_info.duration == 3
+
+
+def test_probe_invalid_cache(monkeypatch, tmp_path):
+    file = tmp_path / 'clip.mp4'
+    file.write_bytes(b'')
+    monkeypatch.setattr(probe_module, 'probe_cache_dir', tmp_path / 'probe')
+    monkeypatch.setattr(probe_module, 'ffprobe_path', lambda: 'ffprobe')
+    monkeypatch.setattr(probe_module, 'check_output', lambda arguments: json.dumps(probe_output).encode())
+    probe_module.write_cache(probe_module.file_key(file) + '.json', {'duration': 1})  # Entry without fields
+    assert probe_module.probe(file).video_codec == 'h264'
+    assert probe_module.read_cache(probe_module.file_key(file) + '.json')['video_codec'] == 'h264'
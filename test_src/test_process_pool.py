@@ -0,0 +1,5 @@
+from src.model.process_pool import ordered_map
+
+
+def test_ordered_map():
+    assert list(ordered_map(pow, ((2, exponent) for exponent in range(10)), workers=2)) == [2 ** i for i in range(10)]
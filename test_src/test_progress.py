@@ -0,0 +1,35 @@
+from time import sleep
+
+from src.model.progress import Progress, ProgressChannel, ProgressParser, out_time, block_speed, is_progress_line
+
+
+def test_parser():
+    parser = ProgressParser()
+    lines = ['frame=48', 'fps=24.00', 'bitrate= 512.3kbits/s', 'out_time_us=2000000', 'speed=1.5x',
+             '[libx264 @ 0x1] frame I:1 Avg QP:20.00']
+    assert [parser.feed(line) for line in lines] == [None] * len(lines)
+    block = parser.feed('progress=continue')
+    assert out_time(block) == 2.0
+    assert block_speed(block) == 1.5
+    assert block['bitrate'] == '512.3kbits/s'
+    assert out_time({'out_time_us': 'N/A'}) == 0
+    assert not is_progress_line('Error opening output file')
+
+
+def test_progress():
+    progress = Progress(30, 120, fps=50, speed=2)
+    assert progress.fraction == 0.25
+    assert progress.eta == 45
+    assert progress.summary() == '25% 50 fps 2x ETA 0:00:45'
+    assert Progress(1, 0).fraction == 0
+    assert Progress(1, 2).eta is None
+
+
+def test_channel_coalesces():
+    received = []
+    channel = ProgressChannel(received.append, interval=0.2)
+    for i in range(100):
+        channel.publish(Progress(i, 100))
+    assert [p.done for p in received] == [0]  # Rate limited
+    sleep(0.4)
+    assert [p.done for p in received] == [0, 99]  # Latest is delivered after the interval
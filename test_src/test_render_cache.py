@@ -0,0 +1,48 @@
+from pathlib import Path
+
+from src.model.render_cache import RenderCache, fingerprint, render_key, chunk_size, chunk_count
+
+
+def test_fingerprint(tmp_path):
+    data = bytes(range(256)) * (chunk_size * chunk_count // 128)
+    first, second = tmp_path / 'a.mkv', tmp_path / 'b.mkv'
+    first.write_bytes(data)
+    second.write_bytes(data)
+    assert fingerprint(first) == fingerprint(second)  # Same content, other name
+    second.write_bytes(data[:-1] + b'x')
+    assert fingerprint(first) != fingerprint(second)
+
+
+def test_render_cache(tmp_path):
+    cache = RenderCache(tmp_path / 'renders.sqlite')
+    key = render_key('source', {'format': 'webm', 'crf': '36'})
+    output = tmp_path / 'a.webm'
+    output.write_bytes(b'video')
+    cache.add(key, output)
+
+    copy = tmp_path / 'b.webm'
+    assert cache.reuse(key, copy)
+    assert copy.read_bytes() == b'video'
+    assert cache.is_stale(output, render_key('source', {'format': 'webm', 'crf': '20'}))
+    assert not cache.is_stale(output, key)
+
+    output.unlink()
+    copy.write_bytes(b'changed')
+    assert cache.find(key) is None  # Deleted and changed outputs are not reused
+
+
+def test_render_cache_relative_path(tmp_path, monkeypatch):
+    cache = RenderCache(tmp_path / 'renders.sqlite')
+    key = render_key('source', {'format': 'webm', 'crf': '36'})
+    (tmp_path / 'first').mkdir()
+    (tmp_path / 'second').mkdir()
+    monkeypatch.chdir(tmp_path / 'first')
+    Path('a.webm').write_bytes(b'video')
+    cache.add(key, Path('a.webm'))
+    assert cache.find(key) == (tmp_path / 'first' / 'a.webm').resolve()
+
+    monkeypatch.chdir(tmp_path / 'second')
+    Path('a.webm').write_bytes(b'other')  # Same name, not rendered by the cache
+    assert not cache.is_stale(Path('a.webm'), render_key('source', {'format': 'webm', 'crf': '20'}))
+    assert cache.reuse(key, Path('b.webm'))
+    assert Path('b.webm').read_bytes() == b'video'
@@ -0,0 +1,25 @@
+from pytest import raises
+
+from src.model.scenes import plan_clips, parse_framecrc
+
+changes = (3.0, 6.0, 10.0)
+
+
+def test_plan_clips():
+    assert plan_clips(changes, 0, 12) == [(0, 3.0), (3.0, 6.0), (6.0, 10.0), (10.0, 12)]
+    assert plan_clips(changes, 4, 11) == [(4, 6.0), (6.0, 10.0), (10.0, 11)]
+    with raises(ValueError):
+        plan_clips((), 5, 3)
+
+
+def test_plan_clips_length():
+    assert plan_clips(changes, 0, 12, min_length=4) == [(0, 6.0), (6.0, 12)]
+    assert plan_clips(changes, 0, 12, max_length=3) == [(0, 3.0), (3.0, 6.0), (6.0, 8.0), (8.0, 10.0),
+                                                        (10.0, 12)]
+
+
+def test_parse_framecrc():
+    output = ('#tb 0: 1/90000\n#media_type 0: video\n#stream#, dts,        pts, duration,     size, hash\n'
+              '0,     450000,     450000,     3600,    55296, 0x1\n')
+    assert parse_framecrc(output) == [5.0]
+    assert parse_framecrc('') == []
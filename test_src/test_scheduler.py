@@ -0,0 +1,78 @@
+from threading import Event
+from time import sleep
+
+from src.model.scheduler import Scheduler
+
+
+def test_capacity():
+    scheduler = Scheduler(capacity=4)
+    release = Event()
+    started = []
+
+    def work(i):
+        started.append(i)
+        release.wait(5)
+        return i
+
+    futures = [scheduler.submit('job', lambda i=i: work(i), threads=2) for i in range(3)]
+    sleep(0.2)
+    assert len(started) == 2  # Third item does not fit
+    release.set()
+    assert [f.result(5) for f in futures] == [0, 1, 2]
+
+
+def test_fairness_and_priority():
+    scheduler = Scheduler(capacity=1)
+    release = Event()
+    order = []
+    blocker = scheduler.submit('blocker', lambda: release.wait(5))
+    futures = [scheduler.submit('a', lambda: order.append('a1')),
+               scheduler.submit('a', lambda: order.append('a2')),
+               scheduler.submit('b', lambda: order.append('b1')),
+               scheduler.submit('c', lambda: order.append('c1'), priority=1)]
+    release.set()
+    blocker.result(5)
+    for future in futures:
+        future.result(5)
+    assert order == ['c1', 'a1', 'b1', 'a2']
+
+
+def test_cancel():
+    scheduler = Scheduler(capacity=1)
+    release = Event()
+    blocker = scheduler.submit('blocker', lambda: release.wait(5))
+    future = scheduler.submit('job', lambda: 1)
+    scheduler.cancel('job')
+    release.set()
+    blocker.result(5)
+    assert future.cancelled()
+
+
+def test_load_limit():
+    scheduler = Scheduler(capacity=4)
+    scheduler.set_load_limit(2)
+    release = Event()
+    started = []
+    futures = [scheduler.submit('job', lambda i=i: started.append(i) or release.wait(5), threads=2) for i in range(2)]
+    sleep(0.2)
+    assert started == [0]
+    scheduler.set_load_limit(None)
+    sleep(0.2)
+    assert started == [0, 1]
+    release.set()
+    for future in futures:
+        future.result(5)
+
+
+def test_item_limit():
+    scheduler = Scheduler(capacity=4)
+    scheduler.set_item_limit(2)
+    assert scheduler.thread_budget == 2
+    release = Event()
+    started = []
+    futures = [scheduler.submit('job', lambda i=i: started.append(i) or release.wait(5)) for i in range(3)]
+    sleep(0.2)
+    assert started == [0, 1]  # Threads are free, the third item waits for the limit
+    release.set()
+    for future in futures:
+        future.result(5)
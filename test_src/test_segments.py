@@ -0,0 +1,31 @@
+from pathlib import Path
+
+from src.model.segments import plan_segments, SegmentManifest, checkpoint_duration
+
+
+def test_plan_segments():
+    keyframes = tuple(float(k) for k in range(0, 100, 5))
+    assert plan_segments(keyframes, 0, 100, 4) == [(0, 25.0), (25.0, 50.0), (50.0, 75.0), (75.0, 100)]
+    assert plan_segments(keyframes, 12, 30, 2) == [(12, 20.0), (20.0, 30)]
+
+
+def test_plan_segments_short():
+    assert plan_segments((0.0,), 0, 3, 8) == [(0, 3)]
+    assert plan_segments((), 0, 10, 2) == [(0, 5.0), (5.0, 10)]
+
+
+def test_plan_segments_checkpoints():
+    assert len(plan_segments((), 0, 3 * checkpoint_duration, 1)) == 3
+
+
+def test_manifest(tmp_path):
+    manifest = SegmentManifest(tmp_path, 'key', lambda: [(0, 5), (5, 10)])
+    output = Path(tmp_path, '000.webm')
+    output.write_bytes(b'1')
+    manifest.finish(output, ['ffmpeg', 'a', '-threads', '8'])
+
+    resumed = SegmentManifest(tmp_path, 'key', lambda: [])
+    assert resumed.plan == [(0, 5), (5, 10)]
+    assert resumed.is_done(output, ['/usr/bin/ffmpeg', 'a', '-threads', '2'])  # Other machine
+    assert not resumed.is_done(output, ['ffmpeg', 'b'])  # Changed settings
+    assert SegmentManifest(tmp_path, 'changed source', lambda: []).plan == []
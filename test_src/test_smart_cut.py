@@ -0,0 +1,36 @@
+from pathlib import Path
+
+from src.model.probe import MediaInfo, parse_keyframes
+from src.model.smart_cut import plan_smart_cut, encoder_arguments, smart_cut_commands
+
+keyframes = (0.0, 2.0, 4.0, 6.0, 8.0)
+
+
+def test_plan_smart_cut():
+    assert plan_smart_cut(keyframes, 1.5, 7.0) == [(False, 1.5, 2.0), (True, 2.0, 6.0), (False, 6.0, 7.0)]
+    assert plan_smart_cut(keyframes, 2.0, 6.0) == [(True, 2.0, 6.0)]
+    assert plan_smart_cut(keyframes, 2.5, 4.5) == [(False, 2.5, 4.5)]
+
+
+def test_encoder_arguments():
+    media_info = MediaInfo(10, 25, 1920, 1080, 'h264', (), pix_fmt='yuv420p', video_profile='High', video_level=41)
+    arguments = encoder_arguments(media_info)
+    assert arguments[:2] == ['-c:v', 'libx264']
+    assert arguments[-6:] == ['-pix_fmt', 'yuv420p', '-profile:v', 'high', '-level:v', '4.1']
+    assert encoder_arguments(MediaInfo(10, 25, 1920, 1080, 'prores', ())) is None
+
+
+def test_parse_keyframes():
+    assert parse_keyframes('1.5,K__\n1.0,___\n0.5,K_\nN/A,K__\n', 0.5) == (0.0, 1.0)
+
+
+def test_smart_cut_copy_end(tmp_path):
+    media_info = MediaInfo(10, 25, 1920, 1080, 'h264', (), pix_fmt='yuv420p', start_time=1.4)
+    commands = smart_cut_commands('ffmpeg', Path('a.ts'), media_info, keyframes, 1.5, 7.0, str(tmp_path), '-an',
+                                  Path('b.ts'))
+    _, copy, tail, _ = [command for command, _, _ in commands]
+    # The copy ends on the packet timestamp of the keyframe at 6 s, B-frames shown before it are kept
+    assert copy[copy.index('-to'):copy.index('-c:v') + 2] == ['-to', '7.400000', '-copyts', '-avoid_negative_ts',
+                                                              'make_zero', '-c:v', 'copy']
+    assert '-t' not in copy
+    assert tail[tail.index('-t') + 1] == '1.000000' and '-copyts' not in tail
@@ -0,0 +1,28 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import_budget = 0.25  # Seconds to import the command line and the model, about 0.05 on a desktop
+lazy_modules = ('wx', 'PIL', 'http.server', 'urllib.request', 'multiprocessing', 'cProfile')
+
+
+def _import_time(module: str) -> dict:
+    """
+    Import a module in a fresh interpreter without ffmpeg on PATH
+    :return: Seconds and the lazy modules that were loaded
+    """
+    code = (f'import sys, time, json; start = time.perf_counter(); import {module}; '
+            f'print(json.dumps([time.perf_counter() - start, [m for m in {lazy_modules!r} if m in sys.modules]]))')
+    output = subprocess.run([sys.executable, '-c', code], cwd=Path(__file__).parent.parent, check=True,
+                            capture_output=True, text=True, env=dict(os.environ, PATH='')).stdout
+    seconds, loaded = json.loads(output)
+    return {'seconds': seconds, 'loaded': loaded}
+
+
+def test_import_budget():
+    for module in ('src.cli', 'src.model.task'):
+        runs = [_import_time(module) for _ in range(3)]  # The fastest run, the first one may compile
+        assert runs[0]['loaded'] == []
+        assert min(run['seconds'] for run in runs) < import_budget
@@ -0,0 +1,121 @@
+from io import BytesIO
+from pathlib import Path
+from types import SimpleNamespace
+
+from pytest import fixture
+
+from src.model.probe import MediaInfo, AudioStream
+from src.model.scenes import scene_threads
+from src.model.task import Task
+from src.model.time_format import zero_time
+from src.resources.gui_texts import mp4_text, audio_text, webp_text, frames_text
+
+video_info = MediaInfo(180, 30, 1920, 1080, 'h264', (AudioStream(0, 'aac', 'eng'),))
+audio_info = MediaInfo(180, 0, 0, 0, '', (AudioStream(0, 'flac', 'eng'), AudioStream(1, 'opus', 'jpn')))
+
+
+@fixture
+def make_task(monkeypatch, tmp_path):
+    """
+    :return: Function that creates a Task with a stubbed probe, the ffmpeg commands are recorded instead of run
+    """
+    monkeypatch.setattr(Task, 'start', lambda self: None)
+    monkeypatch.setattr('src.model.task.ffmpeg_path', lambda: 'ffmpeg')
+
+    def make(media_info: MediaInfo, video_selection, audio_selection: str = 'opus', ranges: list = None) -> Task:
+        task = Task('', zero_time, zero_time, 0, '36', '-1:-1', audio_selection, video_selection, str(tmp_path),
+                    ['a.mkv'], lambda _: None, SimpleNamespace(set_progress=lambda progress: None), ranges=ranges)
+        task.commands = []
+        task._probe = lambda file: media_info
+        task._prepare_output = lambda *args: True
+        task._remember_render = lambda *args: None
+        task._execute = lambda command, *args, **kwargs: task.commands.append(command)
+        return task
+
+    return make
+
+
+def test_multi_range_command(make_task):
+    task = make_task(video_info, mp4_text, ranges=[('00:01:00.000', '00:01:30.000'), ('00:02:00.500', zero_time)])
+    task._convert_video('a.mkv', (mp4_text,), task.ranges)
+    command, = task.commands
+    assert command[command.index('-i') - 2:command.index('-i')] == ['-ss', '60']  # Shared seek to the first range
+    ends = [i for i, argument in enumerate(command) if argument.endswith('.mp4')]
+    first, second = command[command.index('-i'):ends[0]], command[ends[0]:ends[1]]
+    assert first[first.index('-ss') + 1] == '0.000' and first[first.index('-to') + 1] == '30.000'
+    assert second[second.index('-ss') + 1] == '60.500' and '-to' not in second  # Open end
+
+
+def test_audio_only_input(make_task):
+    task = make_task(audio_info, [mp4_text, audio_text], 'mp3')
+    assert task._selection_groups(Path('a.mkv')) == [(audio_text,)]  # No video to encode
+    assert task._extension(Path('a.mkv'), audio_text) == '.mp3'
+    assert make_task(audio_info, audio_text, 'no audio')._extension(Path('a.mkv'), audio_text) == '.mka'
+
+
+def test_audio_only_option(make_task):
+    task = make_task(audio_info, audio_text, 'no audio')
+    assert task.get_audio_option(Path('a.mkv')) == '-an'
+    assert task.get_audio_option(Path('a.mkv'), audio_only=True) == '-map 0:a:1 -c:a copy'  # Japanese track
+    assert make_task(audio_info, audio_text, 'opus').get_audio_option(Path('a.mkv'), audio_only=True) == \
+        '-map 0:a:1 -c:a copy'  # Already opus
+
+
+def test_convert_audio_command(make_task, tmp_path):
+    task = make_task(audio_info, audio_text, 'mp3')
+    task._convert_audio('a.mkv', ('00:00:10.000', '00:00:30.000'))
+    assert task.commands == [['ffmpeg', '-vn', '-sn', '-dn', '-ss', '10.000000', '-i', str(tmp_path / 'a.mkv'),
+                              '-t', '20.000000', '-vn', '-sn', '-dn', '-map', '0:a:1', '-c:a', 'libmp3lame',
+                              '-qscale:a', '3', str(tmp_path / '_a_[10_30].mp3')]]
+
+
+def test_webp_fps_mode_per_output(make_task):
+    task = make_task(video_info, [mp4_text, webp_text])
+    task._convert_video('a.mkv', (mp4_text, webp_text), task.ranges)
+    command, = task.commands
+    mp4_end = next(i for i, argument in enumerate(command) if argument.endswith('.mp4'))
+    assert '-vsync' not in command
+    assert '-fps_mode:v' in command[mp4_end:] and '-fps_mode:v' not in command[:mp4_end]  # Only the webp output
+
+
+def test_frames_command(make_task):
+    task = make_task(video_info, frames_text, 'no audio', ranges=[('00:01:00.000', '00:01:30.000')])
+    task._export_frames(Path('a.mkv'), Path('a_frames', '%06d.png'), task.ranges[0])
+    command, = task.commands
+    assert command[command.index('-pix_fmt'):command.index('-pix_fmt') + 2] == ['-pix_fmt', 'rgb24']  # 8 bit ppm
+
+
+def test_prepare_output_unlocked(make_task):
+    task = make_task(video_info, mp4_text)
+    held = []
+
+    def prepare_output(*args):
+        free = task._closed_semaphore.acquire(blocking=False)  # A cache copy must not block stop()
+        if free:
+            task._closed_semaphore.release()
+        held.append(not free)
+        return True
+
+    task._prepare_output = prepare_output
+    task._convert_video('a.mkv', (mp4_text,), task.ranges)
+    task._convert_audio('a.mkv', task.ranges[0])
+    assert held == [False, False]
+
+
+def test_scene_detection(make_task, monkeypatch, tmp_path):
+    monkeypatch.setattr('src.model.probe.probe_cache_dir', tmp_path / 'cache')
+    monkeypatch.setattr('src.model.scenes.ffmpeg_path', lambda: 'ffmpeg')
+    (tmp_path / 'a.mkv').write_bytes(b'video')
+    task = make_task(video_info, mp4_text)
+    task.scene_threshold = 0.3
+    calls = []
+
+    def execute(command, file_output, duration, outputs=None, drain=None, threads=1):
+        calls.append((outputs, threads))
+        drain(BytesIO(b'#tb 0: 1/1000\n#stream#, dts, pts, duration, size, hash\n0, 60000, 60000, 40, 9, 0x1\n'))
+
+    task._execute = execute
+    ranges = task._file_ranges(tmp_path / 'a.mkv')
+    assert calls == [((), scene_threads)]  # Run by the scheduler like an encode, no output file
+    assert ranges == (('00:00:00.000', '00:01:00.000'), ('00:01:00.000', '00:03:00.000'))
+    assert task._file_ranges(tmp_path / 'a.mkv') == ranges and len(calls) == 1  # Cached
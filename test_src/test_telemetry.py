@@ -0,0 +1,37 @@
+import json
+
+from src.model.telemetry import JobTelemetry, prometheus_text, write_record, encode_stage, probe_stage, \
+    finalize_stage, profile_hook, add_hook, _hooks
+
+
+def test_job_telemetry(tmp_path):
+    telemetry = JobTelemetry(1, 'a.mkv')
+    with telemetry.stage(encode_stage):
+        pass
+    telemetry.add_time(encode_stage, 2)
+    telemetry.count('frames', 50)
+    record = telemetry.to_dict('done')
+    assert record['stages'][encode_stage] >= 2
+    assert record['frames'] == 50
+    assert 24 < record['fps'] <= 25
+    write_record(record, tmp_path / 'telemetry.jsonl')
+    assert json.loads((tmp_path / 'telemetry.jsonl').read_text())['job'] == 1
+
+
+def test_nested_stages(tmp_path):
+    add_hook(profile_hook(tmp_path))
+    try:
+        telemetry = JobTelemetry(2, 'a.mkv')
+        with telemetry.stage(finalize_stage):
+            with telemetry.stage(probe_stage):  # Counted as finalize, cProfile is not started twice
+                pass
+    finally:
+        _hooks.clear()
+    assert list(telemetry.stages) == [finalize_stage]
+    assert [file.name for file in tmp_path.iterdir()] == ['job2_finalize_0.prof']
+
+
+def test_prometheus_text():
+    assert prometheus_text({('jobs_total', 'state="done"'): 2, ('frames_total', ''): 50}) == \
+        '# TYPE cut_videos_frames_total counter\ncut_videos_frames_total 50\n' \
+        '# TYPE cut_videos_jobs_total counter\ncut_videos_jobs_total{state="done"} 2\n'
@@ -0,0 +1,7 @@
+from src.model.thumbnails import parse_showinfo
+
+
+def test_parse_showinfo():
+    output = ('[Parsed_showinfo_2 @ 0x1] n:   0 pts:      0 pts_time:0       duration:512\n'
+              '[Parsed_showinfo_2 @ 0x1] n:   1 pts:  61440 pts_time:4.8     duration:512\n')
+    assert parse_showinfo(output) == [0.0, 4.8]
@@ -0,0 +1,28 @@
+import json
+
+from pytest import raises
+
+from src.model.watch_folder import FolderWatcher, is_watched, load_preset
+
+
+def test_is_watched():
+    assert is_watched('clip.MKV')
+    assert not is_watched('_clip_[1_2].mp4')  # Output
+    assert not is_watched('frame.png')
+    assert not is_watched('cut_videos.json')
+
+
+def test_new_file(tmp_path):
+    (tmp_path / 'old.mp4').write_bytes(b'old')
+    watcher = FolderWatcher([tmp_path], interval=0.05, settle=0.2, use_inotify=False)
+    (tmp_path / 'new.mp4').write_bytes(b'new')
+    assert next(watcher.files()) == tmp_path / 'new.mp4'
+
+
+def test_load_preset(tmp_path):
+    assert load_preset(tmp_path) == {}
+    (tmp_path / 'cut_videos.json').write_text(json.dumps({'video_selection': ['mp4'], 'scale_input': '-1:720'}))
+    assert load_preset(tmp_path)['scale_input'] == '-1:720'
+    (tmp_path / 'cut_videos.json').write_text(json.dumps({'path': '/'}))
+    with raises(ValueError):
+        load_preset(tmp_path)